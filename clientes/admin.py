@@ -1,4 +1,10 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db.models import Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+from core.exportacao import acao_exportacao
+from . import busca, exportacao
 from .models import Cliente, Endereco, ContatoSecundario
 
 
@@ -21,6 +27,24 @@ class ContatoSecundarioInline(admin.TabularInline):
     can_delete = True
 
 
+class EstadoEnderecoFilter(admin.SimpleListFilter):
+    """
+    UF de qualquer endereço do cliente. Filtra com EXISTS (sem JOIN): um cliente com
+    dois endereços na mesma UF aparece uma vez só, sem precisar de DISTINCT.
+    """
+    title = 'UF'
+    parameter_name = 'uf'
+
+    def lookups(self, request, model_admin):
+        estados = Endereco.objects.order_by('estado').values_list('estado', flat=True).distinct()
+        return [(estado, estado) for estado in estados]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        return queryset.filter(Exists(Endereco.objects.filter(cliente=OuterRef('pk'), estado=self.value())))
+
+
 class ClienteAdmin(admin.ModelAdmin):
     """
     Configuração principal do Admin de Clientes.
@@ -28,13 +52,20 @@ class ClienteAdmin(admin.ModelAdmin):
     # Colunas visíveis na lista (Aqui métodos funcionam)
     list_display = ('nome', 'tipo', 'telefone', 'tecnico_responsavel', 'cidade_principal')
 
-    # Filtros laterais (CORREÇÃO: Usando campo direto do relacionamento)
-    # 'enderecos__estado' navega até a tabela Endereco e filtra pelo campo estado
-    list_filter = ('tipo', 'enderecos__estado', 'tecnico_responsavel')
+    # Filtros laterais (UF de qualquer endereço, sem duplicar clientes)
+    list_filter = ('tipo', EstadoEnderecoFilter, 'tecnico_responsavel')
+    # FK opcional: o admin não faz o JOIN sozinho
+    list_select_related = ('tecnico_responsavel',)
 
-    # Campo de busca
+    # Campo de busca (a pesquisa usa o índice de clientes/busca.py, ver get_search_results)
     search_fields = ('nome', 'cpf_cnpj', 'telefone', 'email')
 
+    # Exportação para a contabilidade (com endereços)
+    actions = [
+        acao_exportacao(exportacao.exportar_clientes, 'csv'),
+        acao_exportacao(exportacao.exportar_clientes, 'ndjson'),
+    ]
+
     # Adiciona as tabelas filhas
     inlines = [EnderecoInline, ContatoSecundarioInline]
 
@@ -52,12 +83,33 @@ class ClienteAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Cidade/UF do endereço principal já no SELECT da lista (subconsulta pelo índice parcial)
+        principal = Endereco.objects.filter(cliente=OuterRef('pk'), principal=True)
+        return super().get_queryset(request).annotate(
+            cidade_uf=Subquery(principal.values(texto=Concat('cidade', Value('/'), 'estado'))[:1])
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # CPF/CNPJ ou telefone digitado no balcão: consulta exata pelo índice primeiro
+        if busca.parece_documento_ou_telefone(search_term):
+            exatos = queryset.filter(busca.filtro_documento(search_term) | busca.filtro_telefone(search_term))
+            if exatos.exists():
+                return exatos, False
+        queryset = busca.buscar(queryset, search_term)
+        # Sem ordenação escolhida na coluna: mais relevantes primeiro
+        if ORDER_VAR not in request.GET:
+            queryset = queryset.order_by('-relevancia', 'nome', '-pk')
+        return queryset, False
+
     # Métodos auxiliares para mostrar dados na LISTA (Visual apenas)
     def cidade_principal(self, obj):
-        endereco = obj.enderecos.first()
-        return f"{endereco.cidade}/{endereco.estado}" if endereco else "-"
+        return obj.cidade_uf or "-"
 
     cidade_principal.short_description = 'Cidade/UF'
+    cidade_principal.admin_order_field = 'cidade_uf'
 
 
 # Registro final
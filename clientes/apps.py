@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _preparar_indice_busca(sender, using, **kwargs):
+    from django.db import connections
+    from . import busca
+
+    conexao = connections[using]
+    if busca.TABELA not in conexao.introspection.table_names():
+        return
+    with conexao.cursor() as cursor:
+        colunas = [coluna.name for coluna in conexao.introspection.get_table_description(cursor, busca.TABELA)]
+    if 'busca' in colunas:
+        busca.preparar_indice(conexao)
 
 
 class ClientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clientes'
+
+    def ready(self):
+        # O SQLite perde os triggers da busca quando recria a tabela numa migração
+        post_migrate.connect(_preparar_indice_busca, sender=self, dispatch_uid='clientes_preparar_indice_busca')
@@ -0,0 +1,189 @@
+"""
+Busca de clientes (admin e API).
+
+Cada cliente guarda uma coluna `busca` com nome, nome fantasia, documento, telefone e
+e-mail em minúsculas e sem acentos. Sobre ela fica um índice próprio do banco:
+
+- SQLite: tabela virtual FTS5 (tokenizador trigram) mantida por triggers;
+- PostgreSQL: índice GIN com gin_trgm_ops (extensão pg_trgm).
+
+Os dois aceitam trechos do meio da palavra ("silv" acha "Silva") e devolvem
+uma relevância para ordenar o resultado. Em outros bancos cai num LIKE na coluna `busca`.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from core.texto import normalizar, so_digitos
+
+TABELA = 'clientes_cliente'
+TABELA_FTS = 'clientes_cliente_fts'
+INDICE_TRGM = 'clientes_cliente_busca_trgm'
+
+# O trigram só indexa trechos de 3 caracteres ou mais
+TAMANHO_MINIMO = 3
+
+SQL_SQLITE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        busca, content='{TABELA}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF busca ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca);
+        INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca);
+    END""",
+]
+
+SQL_POSTGRES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS {INDICE_TRGM} ON {TABELA} USING gin (busca gin_trgm_ops)',
+]
+
+
+def parece_documento_ou_telefone(texto):
+    """Só dígitos e máscara (. - / ( ) espaço +), com pelo menos 8 dígitos."""
+    return bool(re.fullmatch(r'[\d.\-/()\s+]+', texto or '')) and len(so_digitos(texto)) >= 8
+
+
+def texto_busca(nome, nome_fantasia, cpf_cnpj, telefone, email):
+    """
+    Conteúdo da coluna `busca`. Documento e telefone entram como digitados e só com
+    os dígitos, para a busca achar "123.456" e "123456".
+    """
+    partes = [nome, nome_fantasia, cpf_cnpj, so_digitos(cpf_cnpj),
+              telefone, so_digitos(telefone), email]
+    return normalizar(' '.join(parte for parte in partes if parte))
+
+
+def preparar_indice(conexao=None):
+    """
+    Cria (se faltar) o índice de busca do banco em uso. Idempotente: roda na migração
+    e após cada migrate, porque o SQLite recria a tabela em algumas alterações de
+    esquema e os triggers somem junto com a tabela antiga.
+    """
+    conexao = conexao or connection
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [TABELA]
+            )
+            triggers_existentes = cursor.fetchone()[0]
+            for sql in SQL_SQLITE:
+                cursor.execute(sql)
+            if triggers_existentes < 3:
+                # Triggers recriados: o conteúdo do índice pode estar defasado
+                cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+        elif conexao.vendor == 'postgresql':
+            for sql in SQL_POSTGRES:
+                cursor.execute(sql)
+
+
+def remover_indice(conexao=None):
+    conexao = conexao or connection
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'sqlite':
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABELA_FTS}_{sufixo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABELA_FTS}')
+        elif conexao.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDICE_TRGM}')
+
+
+def _consulta_fts(termos):
+    # Cada termo vira uma frase entre aspas (aspas internas dobradas); todos precisam aparecer
+    return ' AND '.join('"{}"'.format(termo.replace('"', '""')) for termo in termos)
+
+
+def _separar(termo):
+    termos = normalizar(termo).split()
+    return [t for t in termos if len(t) >= TAMANHO_MINIMO], [t for t in termos if len(t) < TAMANHO_MINIMO]
+
+
+def filtro(termo, prefixo=''):
+    """
+    Q equivalente ao filtro de buscar(), sem relevância, para filtrar outros modelos
+    pelo cliente (ex: filtro(termo, 'cliente__') nas OS).
+    """
+    indexaveis, curtos = _separar(termo)
+    condicao = Q()
+    if connection.vendor == 'sqlite' and indexaveis:
+        condicao &= Q(**{f'{prefixo}pk__in': RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', [_consulta_fts(indexaveis)]
+        )})
+    else:
+        curtos = indexaveis + curtos
+    for trecho in curtos:
+        condicao &= Q(**{f'{prefixo}busca__contains': trecho})
+    return condicao
+
+
+def filtro_documento(valor):
+    """Consulta exata pelo CPF/CNPJ, com ou sem máscara (índice único)."""
+    digitos = so_digitos(valor)
+    if not digitos:
+        # Sem dígitos não há documento a procurar (e não casa os clientes sem CPF/CNPJ)
+        return Q(pk__in=[])
+    return Q(cpf_cnpj_digitos=digitos)
+
+
+def filtro_telefone(valor):
+    """
+    Consulta exata pelo telefone principal ou de um contato secundário, com ou sem
+    máscara. Duas consultas indexadas; o OR com subconsulta evita o JOIN (e o DISTINCT).
+    """
+    from .models import ContatoSecundario
+
+    digitos = so_digitos(valor)
+    if not digitos:
+        # Sem dígitos não há telefone a procurar (e não casa os clientes sem telefone)
+        return Q(pk__in=[])
+    contatos = ContatoSecundario.objects.filter(telefone_digitos=digitos).values('cliente_id')
+    return Q(telefone_digitos=digitos) | Q(pk__in=contatos)
+
+
+def buscar(queryset, termo):
+    """
+    Filtra o queryset de clientes pelo termo e anota `relevancia` (maior = melhor).
+    Não ordena: quem chama decide (a API e o admin ordenam por -relevancia, nome).
+    Para usar como subconsulta de outro modelo, use filtro().
+    """
+    termo = normalizar(termo)
+    if not termo:
+        return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    termos = termo.split()
+    indexaveis, curtos = _separar(termo)
+
+    vendor = connection.vendor
+    if vendor == 'sqlite' and indexaveis:
+        consulta = _consulta_fts(indexaveis)
+        # Filtro e relevância como expressões comuns: o queryset continua aceitando
+        # os .filter()/.order_by() do admin e do DRF. bm25 é negativo e menor = mais relevante.
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', [consulta]
+        )).annotate(relevancia=RawSQL(
+            f'SELECT -bm25({TABELA_FTS}) FROM {TABELA_FTS} '
+            f'WHERE {TABELA_FTS} MATCH %s AND {TABELA_FTS}.rowid = {TABELA}.id',
+            [consulta], output_field=FloatField(),
+        ))
+    elif vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = queryset.annotate(relevancia=TrigramSimilarity('busca', termo))
+        curtos = termos
+    else:
+        queryset = queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+        curtos = termos
+
+    # Termos curtos (ou bancos sem índice próprio): LIKE na coluna já normalizada.
+    # No PostgreSQL o LIKE '%x%' usa o índice trigram.
+    for trecho in curtos:
+        queryset = queryset.filter(busca__contains=trecho)
+    return queryset
@@ -0,0 +1,43 @@
+"""
+Exportação de clientes (com endereços) para a contabilidade. Ver core/exportacao.py.
+"""
+from django.db.models import Prefetch
+
+from core.exportacao import resposta_exportacao
+from .models import Cliente, Endereco
+
+COLUNAS_CLIENTE = [
+    ('id', 'id'),
+    ('tipo', 'tipo'),
+    ('nome', 'nome'),
+    ('nome_fantasia', 'nome_fantasia'),
+    ('cpf_cnpj', 'cpf_cnpj'),
+    ('rg_ie', 'rg_ie'),
+    ('telefone', 'telefone'),
+    ('email', 'email'),
+    ('tecnico_responsavel', 'tecnico_responsavel.username'),
+    ('observacoes', 'observacoes'),
+    ('criado_em', 'criado_em'),
+    ('atualizado_em', 'atualizado_em'),
+]
+
+COLUNAS_ENDERECO = [
+    ('descricao', 'descricao'),
+    ('logradouro', 'logradouro'),
+    ('numero', 'numero'),
+    ('complemento', 'complemento'),
+    ('bairro', 'bairro'),
+    ('cidade', 'cidade'),
+    ('estado', 'estado'),
+    ('cep', 'cep'),
+    ('referencia', 'referencia'),
+    ('principal', 'principal'),
+]
+
+
+def exportar_clientes(queryset, formato):
+    queryset = Cliente.objects.all() if queryset is None else queryset
+    queryset = queryset.select_related('tecnico_responsavel').prefetch_related(
+        Prefetch('enderecos', queryset=Endereco.objects.order_by('id'))
+    ).order_by('id')
+    return resposta_exportacao(queryset, COLUNAS_CLIENTE, formato, 'clientes', filhos=('enderecos', COLUNAS_ENDERECO))
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:48
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Cópias congeladas de clientes/busca.py e core/texto.py: a migração não pode mudar
+# de comportamento quando o código do app mudar
+TABELA = 'clientes_cliente'
+TABELA_FTS = 'clientes_cliente_fts'
+INDICE_TRGM = 'clientes_cliente_busca_trgm'
+
+SQL_SQLITE = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        busca, content='{TABELA}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF busca ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, busca) VALUES ('delete', old.id, old.busca);
+        INSERT INTO {TABELA_FTS}(rowid, busca) VALUES (new.id, new.busca);
+    END""",
+    f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')",
+]
+
+SQL_POSTGRES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS {INDICE_TRGM} ON {TABELA} USING gin (busca gin_trgm_ops)',
+]
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def so_digitos(texto):
+    return re.sub(r'\D', '', texto or '')
+
+
+def texto_busca(nome, nome_fantasia, cpf_cnpj, telefone, email):
+    partes = [nome, nome_fantasia, cpf_cnpj, so_digitos(cpf_cnpj),
+              telefone, so_digitos(telefone), email]
+    return normalizar(' '.join(parte for parte in partes if parte))
+
+
+def preencher_busca(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    clientes = list(Cliente.objects.only('nome', 'nome_fantasia', 'cpf_cnpj', 'telefone', 'email'))
+    for cliente in clientes:
+        cliente.busca = texto_busca(
+            cliente.nome, cliente.nome_fantasia, cliente.cpf_cnpj, cliente.telefone, cliente.email
+        )
+    Cliente.objects.bulk_update(clientes, ['busca'], batch_size=1000)
+
+
+def criar_indice(apps, schema_editor):
+    conexao = schema_editor.connection
+    comandos = {'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRES}.get(conexao.vendor, [])
+    with conexao.cursor() as cursor:
+        for sql in comandos:
+            cursor.execute(sql)
+
+
+def remover_indice(apps, schema_editor):
+    conexao = schema_editor.connection
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'sqlite':
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABELA_FTS}_{sufixo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABELA_FTS}')
+        elif conexao.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDICE_TRGM}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='busca',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:51
+
+import re
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def so_digitos(texto):
+    # Cópia congelada de core.texto.so_digitos
+    return re.sub(r'\D', '', texto or '')
+
+
+def preencher_digitos(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    ContatoSecundario = apps.get_model('clientes', 'ContatoSecundario')
+
+    clientes = list(Cliente.objects.only('cpf_cnpj', 'telefone'))
+    por_documento = defaultdict(list)
+    for cliente in clientes:
+        cliente.cpf_cnpj_digitos = so_digitos(cliente.cpf_cnpj) or None
+        cliente.telefone_digitos = so_digitos(cliente.telefone)
+        if cliente.cpf_cnpj_digitos:
+            por_documento[cliente.cpf_cnpj_digitos].append(cliente.pk)
+
+    duplicados = {doc: ids for doc, ids in por_documento.items() if len(ids) > 1}
+    if duplicados:
+        # Mesmo documento digitado com máscaras diferentes: o cadastro mais antigo fica com
+        # os dígitos e os outros ficam sem (NULL) até serem unificados à mão
+        sem_digitos = {pk for ids in duplicados.values() for pk in sorted(ids)[1:]}
+        for cliente in clientes:
+            if cliente.pk in sem_digitos:
+                cliente.cpf_cnpj_digitos = None
+        detalhes = '; '.join(f'{doc}: clientes {sorted(ids)}' for doc, ids in sorted(duplicados.items()))
+        print(f'\n  CPF/CNPJ duplicados (só o primeiro de cada ficou indexado), unifique os cadastros: {detalhes}')
+
+    Cliente.objects.bulk_update(clientes, ['cpf_cnpj_digitos', 'telefone_digitos'], batch_size=1000)
+
+    contatos = list(ContatoSecundario.objects.only('telefone'))
+    for contato in contatos:
+        contato.telefone_digitos = so_digitos(contato.telefone)
+    ContatoSecundario.objects.bulk_update(contatos, ['telefone_digitos'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_cliente_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='cpf_cnpj_digitos',
+            field=models.CharField(editable=False, max_length=20, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='telefone_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='contatosecundario',
+            name='telefone_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(preencher_digitos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:15
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def marcar_principais(apps, schema_editor):
+    # O endereço mais antigo de cada cliente (o que a lista mostrava com .first())
+    Endereco = apps.get_model('clientes', 'Endereco')
+    primeiros = Endereco.objects.values('cliente').annotate(primeiro=Min('id')).values('primeiro')
+    Endereco.objects.filter(id__in=primeiros).update(principal=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_digitos_documento_telefone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endereco',
+            name='principal',
+            field=models.BooleanField(default=False, verbose_name='Principal'),
+        ),
+        migrations.RunPython(marcar_principais, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='endereco',
+            index=models.Index(condition=models.Q(('principal', True)), fields=['cliente'], name='endereco_principal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='endereco',
+            index=models.Index(fields=['estado', 'cliente'], name='endereco_estado_cliente_idx'),
+        ),
+    ]
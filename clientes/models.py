@@ -1,6 +1,9 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.conf import settings
 
+from .busca import so_digitos, texto_busca
+
 
 class Cliente(models.Model):
     """
@@ -56,6 +59,13 @@ class Cliente(models.Model):
 
     observacoes = models.TextField(blank=True, verbose_name='Observações Gerais')
 
+    # Texto normalizado para a busca (ver clientes/busca.py), mantido no save()
+    busca = models.TextField(blank=True, default='', editable=False)
+
+    # Só os dígitos do documento e do telefone, mantidos no save(): consulta exata pelo índice
+    cpf_cnpj_digitos = models.CharField(max_length=20, unique=True, null=True, editable=False)
+    telefone_digitos = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
+
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
@@ -67,6 +77,22 @@ class Cliente(models.Model):
     def __str__(self):
         return f"{self.nome} ({self.get_tipo_display()})"
 
+    def clean(self):
+        super().clean()
+        digitos = so_digitos(self.cpf_cnpj)
+        if digitos and Cliente.objects.filter(cpf_cnpj_digitos=digitos).exclude(pk=self.pk).exists():
+            raise ValidationError({'cpf_cnpj': 'Já existe um cliente com este CPF/CNPJ.'})
+
+    def save(self, *args, **kwargs):
+        self.busca = texto_busca(self.nome, self.nome_fantasia, self.cpf_cnpj, self.telefone, self.email)
+        # NULL em vez de '' para documentos vazios não colidirem no índice único
+        self.cpf_cnpj_digitos = so_digitos(self.cpf_cnpj) or None
+        self.telefone_digitos = so_digitos(self.telefone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'busca', 'cpf_cnpj_digitos', 'telefone_digitos'}
+        super().save(*args, **kwargs)
+
 
 class Endereco(models.Model):
     """
@@ -91,13 +117,40 @@ class Endereco(models.Model):
 
     referencia = models.CharField(max_length=255, blank=True, null=True, verbose_name='Ponto de Referência')
 
+    # Um por cliente (mantido no save): é o endereço mostrado na lista de clientes
+    principal = models.BooleanField(default=False, verbose_name='Principal')
+
     class Meta:
         verbose_name = 'Endereço'
         verbose_name_plural = 'Endereços'
+        indexes = [
+            # Endereço principal de cada cliente (coluna Cidade/UF da lista): índice parcial, só os principais
+            models.Index(fields=['cliente'], condition=models.Q(principal=True), name='endereco_principal_idx'),
+            # Filtro por UF da lista de clientes (EXISTS por estado + cliente)
+            models.Index(fields=['estado', 'cliente'], name='endereco_estado_cliente_idx'),
+        ]
 
     def __str__(self):
         return f"{self.descricao} - {self.logradouro}, {self.numero}"
 
+    def save(self, *args, **kwargs):
+        outros = Endereco.objects.filter(cliente_id=self.cliente_id, principal=True).exclude(pk=self.pk)
+        if self.principal:
+            outros.update(principal=False)
+        elif not outros.exists():
+            # Primeiro endereço do cliente (ou nenhum outro marcado): vira o principal
+            self.principal = True
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        if self.principal:
+            # O mais antigo dos que sobraram assume como principal
+            restante = Endereco.objects.filter(cliente_id=self.cliente_id).order_by('id').first()
+            if restante:
+                Endereco.objects.filter(pk=restante.pk).update(principal=True)
+        return resultado
+
 
 class ContatoSecundario(models.Model):
     """
@@ -113,6 +166,7 @@ class ContatoSecundario(models.Model):
         help_text='Ex: Esposa, Gerente, Vizinho'
     )
     telefone = models.CharField(max_length=20, verbose_name='Telefone')
+    telefone_digitos = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
 
     class Meta:
         verbose_name = 'Contato Secundário'
@@ -120,3 +174,10 @@ class ContatoSecundario(models.Model):
 
     def __str__(self):
         return f"{self.nome} ({self.cargo_parentesco})"
+
+    def save(self, *args, **kwargs):
+        self.telefone_digitos = so_digitos(self.telefone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'telefone_digitos'}
+        super().save(*args, **kwargs)
@@ -1,3 +1,180 @@
-from django.test import TestCase
+from django.contrib.admin.sites import site
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import User
+from . import busca
+from .models import Cliente, Endereco
+
+
+class BuscaClientesTests(TestCase):
+    """
+    Busca indexada (FTS5/trigram) usada pelo admin e pela API.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        cls.joao = Cliente.objects.create(nome='João da Silva', cpf_cnpj='123.456.789-00', telefone='(71) 99999-0000')
+        cls.silvana = Cliente.objects.create(nome='Silvana Souza', cpf_cnpj='98765432100', telefone='7133334444',
+                                             email='silvana@exemplo.com')
+        cls.empresa = Cliente.objects.create(tipo='PJ', nome='Mercado Central Ltda', nome_fantasia='Mercadinho Silva',
+                                             cpf_cnpj='11.222.333/0001-44', telefone='7130001111')
+
+    def _ids(self, termo):
+        return list(busca.buscar(Cliente.objects.all(), termo).order_by('-relevancia', 'nome').values_list('id', flat=True))
+
+    def test_normaliza_acentos_e_maiusculas(self):
+        self.assertEqual(busca.normalizar('  JOÃO  da Conceição '), 'joao da conceicao')
+        self.assertEqual(self._ids('joao'), [self.joao.pk])
+        self.assertEqual(self._ids('JOÃO SILVA'), [self.joao.pk])
+
+    def test_trecho_no_meio_da_palavra(self):
+        self.assertCountEqual(self._ids('silv'), [self.joao.pk, self.silvana.pk, self.empresa.pk])
+
+    def test_documento_e_telefone_com_ou_sem_mascara(self):
+        self.assertEqual(self._ids('12345678900'), [self.joao.pk])
+        self.assertEqual(self._ids('123.456'), [self.joao.pk])
+        self.assertEqual(self._ids('99999-0000'), [self.joao.pk])
+
+    def test_alteracao_atualiza_indice(self):
+        self.joao.nome = 'Joaquim Pereira'
+        self.joao.save(update_fields=['nome'])
+        self.assertEqual(self._ids('joao silva'), [])
+        self.assertEqual(self._ids('pereira'), [self.joao.pk])
+
+        self.joao.delete()
+        self.assertEqual(self._ids('pereira'), [])
+
+    def test_termo_curto(self):
+        self.assertEqual(self._ids('jo'), [self.joao.pk])
+
+    def test_queryset_continua_composto(self):
+        resultado = busca.buscar(Cliente.objects.all(), 'silva').filter(tipo='PF').exclude(pk=self.silvana.pk)
+        self.assertEqual(list(resultado.order_by('-relevancia').values_list('id', flat=True)), [self.joao.pk])
+        self.assertEqual(resultado.count(), 1)
+
+    def test_admin_ordena_por_relevancia(self):
+        request = RequestFactory().get('/admin/clientes/cliente/', {'q': 'silva'})
+        request.user = self.admin
+        changelist = site._registry[Cliente].get_changelist_instance(request)
+
+        self.assertEqual(set(changelist.result_list), {self.joao, self.silvana, self.empresa})
+        self.assertEqual(changelist.result_count, 3)
+
+    def test_api_busca(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+
+        resposta = api.get('/servicos/api/clientes/', {'busca': 'silvana'})
+        self.assertEqual([c['id'] for c in resposta.json()['results']], [self.silvana.pk])
+
+        resposta = api.get('/servicos/api/clientes/')
+        self.assertEqual(resposta.json()['count'], 3)
+
+
+class DocumentoTelefoneTests(TestCase):
+    """
+    Colunas só com dígitos: consulta exata e bloqueio de documento duplicado.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        cls.cliente = Cliente.objects.create(nome='Maria Lima', cpf_cnpj='123.456.789-00', telefone='(71) 98888-1234')
+        cls.contato = cls.cliente.contatos_secundarios.create(
+            nome='José', cargo_parentesco='Marido', telefone='71 3222-5555'
+        )
+
+    def test_mantidos_no_save(self):
+        self.assertEqual(self.cliente.cpf_cnpj_digitos, '12345678900')
+        self.assertEqual(self.cliente.telefone_digitos, '71988881234')
+        self.assertEqual(self.contato.telefone_digitos, '7132225555')
+
+    def test_documento_duplicado_com_outra_mascara(self):
+        outro = Cliente(nome='Outra', cpf_cnpj='12345678900', telefone='1')
+        with self.assertRaises(ValidationError):
+            outro.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            outro.save()
+
+    def test_consulta_exata(self):
+        self.assertEqual(Cliente.objects.get(busca.filtro_documento('123456789-00')), self.cliente)
+        self.assertEqual(Cliente.objects.get(busca.filtro_telefone('71988881234')), self.cliente)
+        self.assertEqual(Cliente.objects.get(busca.filtro_telefone('(71) 3222-5555')), self.cliente)
+        self.assertFalse(Cliente.objects.filter(busca.filtro_documento('000')).exists())
+
+    def test_consulta_sem_digitos_nao_casa_cadastro_vazio(self):
+        Cliente.objects.create(nome='Sem Documento', cpf_cnpj='', telefone='')
+        self.assertFalse(Cliente.objects.filter(busca.filtro_documento('abc')).exists())
+        self.assertFalse(Cliente.objects.filter(busca.filtro_telefone('(  ) -')).exists())
+
+    def test_api(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+
+        resposta = api.get('/servicos/api/clientes/', {'cpf_cnpj': '12345678900'})
+        self.assertEqual([c['id'] for c in resposta.json()['results']], [self.cliente.pk])
+        resposta = api.get('/servicos/api/clientes/', {'telefone': '7132225555'})
+        self.assertEqual([c['id'] for c in resposta.json()['results']], [self.cliente.pk])
+
+    def test_admin_busca_exata_pelo_documento(self):
+        request = RequestFactory().get('/admin/clientes/cliente/', {'q': '123.456.789-00'})
+        request.user = self.admin
+        changelist = site._registry[Cliente].get_changelist_instance(request)
+
+        self.assertEqual(list(changelist.result_list), [self.cliente])
+        self.assertNotIn('MATCH', str(changelist.queryset.query))
+
+
+class ExportacaoClientesTests(TestCase):
+
+    def test_csv_com_enderecos(self):
+        admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        cliente = Cliente.objects.create(nome='Ana Costa', cpf_cnpj='11122233344', telefone='71911112222')
+        cliente.enderecos.create(logradouro='Rua A', numero='1', bairro='Centro', cidade='Salvador', cep='40000-000')
+        cliente.enderecos.create(logradouro='Rua B', numero='2', bairro='Pituba', cidade='Salvador', cep='41000-000')
+        self.client.force_login(admin)
+
+        resposta = self.client.get(reverse('exportar_clientes', args=['csv']))
+        linhas = b''.join(resposta.streaming_content).decode('utf-8').splitlines()
+
+        self.assertEqual(len(linhas), 3)
+        self.assertIn('enderecos.logradouro', linhas[0])
+        self.assertIn('Rua B', linhas[2])
+
+
+class EnderecoPrincipalTests(TestCase):
+    """
+    Um endereço principal por cliente, mantido no save/delete.
+    """
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nome='Maria', cpf_cnpj='111', telefone='0')
+
+    def _endereco(self, cidade, **kwargs):
+        return Endereco.objects.create(
+            cliente=self.cliente, logradouro='Rua A', numero='1', bairro='Centro',
+            cidade=cidade, cep='40000-000', **kwargs
+        )
+
+    def _principais(self):
+        return list(self.cliente.enderecos.filter(principal=True).values_list('cidade', flat=True))
+
+    def test_primeiro_vira_principal_e_troca(self):
+        self._endereco('Salvador')
+        self._endereco('Lauro de Freitas')
+        self.assertEqual(self._principais(), ['Salvador'])
+
+        self._endereco('Camaçari', principal=True)
+        self.assertEqual(self._principais(), ['Camaçari'])
+
+    def test_remover_principal_promove_o_mais_antigo(self):
+        primeiro = self._endereco('Salvador')
+        self._endereco('Lauro de Freitas')
+        primeiro.delete()
+        self.assertEqual(self._principais(), ['Lauro de Freitas'])
 
-# Create your tests here.
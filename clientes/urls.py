@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('', views.cliente_list, name='cliente_list'),
+    path('exportar/<str:formato>/', views.exportar_clientes, name='exportar_clientes'),
 ]
\ No newline at end of file
@@ -1,8 +1,16 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from . import exportacao
 from .models import Cliente
 
 @login_required
 def cliente_list(request):
     clientes = Cliente.objects.all()
-    return render(request, 'clientes/cliente_list.html', {'clientes': clientes})
\ No newline at end of file
+    return render(request, 'clientes/cliente_list.html', {'clientes': clientes})
+
+
+@staff_member_required
+def exportar_clientes(request, formato):
+    """Todos os clientes, com endereços, em CSV ou NDJSON (streaming)."""
+    return exportacao.exportar_clientes(None, formato)
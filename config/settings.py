@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     # Third-party Apps (Seção 4.1)
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',  # Logout / rotação de refresh tokens
     'corsheaders',
     'django_filters',
 
@@ -93,6 +94,26 @@ DATABASES = {
     }
 }
 
+# Cache (configuração do sistema, PDFs, indicadores...)
+# O LocMemCache é de cada processo: com vários workers, uma alteração (ex: configuração
+# da empresa, produto) só aparece nos outros quando a entrada expira (todas têm TTL).
+# Em produção com vários processos, defina REDIS_URL para o cache ser compartilhado
+# e a invalidação valer na hora para todos.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'erp-security',
+        }
+    }
+
 # Autenticação (Seção 7 e 9.1)
 # CRÍTICO: Define que usaremos nosso próprio modelo de usuário
 AUTH_USER_MODEL = 'core.User'
@@ -133,7 +154,10 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     # Configuração de Autenticação (Login)
+    # JWT primeiro: o app valida só a assinatura do token a cada chamada, em vez de
+    # refazer o hash PBKDF2 da senha (proposital e caro) como no Basic.
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',  # App/Mobile
         'rest_framework.authentication.SessionAuthentication', # Para testar no navegador
         'rest_framework.authentication.BasicAuthentication',   # Para testes simples
     ],
@@ -162,3 +186,15 @@ print(f"-------------------")
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Cache de PDFs renderizados (servicos.pdf)
+# Os arquivos ficam em disco e os menos usados são removidos ao passar do limite.
+PDF_CACHE_DIR = BASE_DIR / 'cache' / 'pdf'
+PDF_CACHE_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+
+# Processos usados na exportação de PDFs em lote (servicos.lote)
+PDF_LOTE_PROCESSOS = min(4, os.cpu_count() or 1)
+
+# Janela (em segundos) em que o token da sincronização do app não avança sobre registros
+# recentes do log (servicos.sincronizacao). Deve cobrir a transação mais longa que grava no log.
+SINCRONIZACAO_JANELA_SEGUNDOS = 60
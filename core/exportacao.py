@@ -0,0 +1,118 @@
+"""
+Exportação de dados (CSV / NDJSON) em streaming.
+
+Os registros são lidos em lotes com queryset.iterator(chunk_size=...) (os prefetch_related
+do queryset são feitos lote a lote) e cada linha é escrita na resposta assim que fica
+pronta: a memória não cresce com o tamanho da exportação.
+
+Cada app descreve suas colunas como listas de (titulo, caminho), onde caminho é um
+atributo ("cliente.nome") ou uma função que recebe o objeto. Registros com lista filha
+(itens do orçamento, endereços do cliente) saem no CSV como uma linha por filho,
+repetindo as colunas do registro, e no NDJSON como uma lista dentro do objeto.
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.contrib import admin
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+
+TAMANHO_LOTE = 2000
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Eco:
+    """Pseudo-arquivo: o csv.writer escreve e a linha volta direto para o gerador."""
+
+    def write(self, valor):
+        return valor
+
+
+def _ler(obj, caminho):
+    if callable(caminho):
+        return caminho(obj)
+    for atributo in caminho.split('.'):
+        obj = getattr(obj, atributo, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat() if timezone.is_aware(valor) else valor.isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _registros(queryset, colunas, filhos):
+    for obj in queryset.iterator(chunk_size=TAMANHO_LOTE):
+        registro = {titulo: _valor(_ler(obj, caminho)) for titulo, caminho in colunas}
+        if filhos:
+            relacao, colunas_filhos = filhos
+            registro[relacao] = [
+                {titulo: _valor(_ler(filho, caminho)) for titulo, caminho in colunas_filhos}
+                for filho in getattr(obj, relacao).all()
+            ]
+        yield registro
+
+
+def _gerar_csv(registros, colunas, filhos):
+    escritor = csv.writer(_Eco(), delimiter=';')
+    titulos = [titulo for titulo, _caminho in colunas]
+    relacao, colunas_filhos = filhos or (None, [])
+    titulos_filhos = [titulo for titulo, _caminho in colunas_filhos]
+    # BOM: o Excel abre o UTF-8 com acentos corretos
+    yield '\ufeff' + escritor.writerow(titulos + [f'{relacao}.{titulo}' for titulo in titulos_filhos])
+
+    for registro in registros:
+        linha = [registro[titulo] for titulo in titulos]
+        if not relacao:
+            yield escritor.writerow(linha)
+            continue
+        lista = registro[relacao] or [dict.fromkeys(titulos_filhos)]
+        for filho in lista:
+            yield escritor.writerow(linha + [filho[titulo] for titulo in titulos_filhos])
+
+
+def _gerar_ndjson(registros):
+    for registro in registros:
+        yield json.dumps(registro, ensure_ascii=False) + '\n'
+
+
+def resposta_exportacao(queryset, colunas, formato, nome_arquivo, filhos=None):
+    """
+    StreamingHttpResponse com o queryset exportado.
+    filhos = (nome_da_relacao, colunas) para incluir uma lista filha já prefetchada.
+    """
+    if formato not in FORMATOS:
+        raise Http404('Formato de exportação desconhecido.')
+
+    registros = _registros(queryset, colunas, filhos)
+    if formato == 'csv':
+        conteudo = _gerar_csv(registros, colunas, filhos)
+    else:
+        conteudo = _gerar_ndjson(registros)
+
+    response = StreamingHttpResponse(conteudo, content_type=FORMATOS[formato])
+    filename = f'{nome_arquivo}_{timezone.localdate():%Y%m%d}.{formato}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def acao_exportacao(exportar, formato):
+    """Ação do admin que exporta os registros selecionados."""
+    @admin.action(description=f'Exportar selecionados ({formato.upper()})')
+    def acao(modeladmin, request, queryset):
+        return exportar(queryset, formato)
+
+    acao.__name__ = f'exportar_{formato}'
+    return acao
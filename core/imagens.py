@@ -0,0 +1,32 @@
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+# Cabeçalho dos PDFs: no máximo 80px de altura e 20% da largura da A4.
+# Em ~300 dpi isso dá cerca de 480x240 pixels; mais que isso o WeasyPrint só
+# decodifica e embute bytes que nunca aparecem na impressão.
+LOGO_PDF_TAMANHO = (480, 240)
+
+
+def gerar_variante_logo(arquivo, tamanho=LOGO_PDF_TAMANHO):
+    """
+    Reduz e recomprime a logomarca para uso nos PDFs.
+    Retorna (nome do arquivo, bytes). Mantém PNG quando há transparência, senão usa JPEG.
+    """
+    with arquivo.open('rb') as f:
+        imagem = Image.open(f)
+        imagem.load()
+
+    imagem = ImageOps.exif_transpose(imagem)
+    imagem.thumbnail(tamanho, Image.Resampling.LANCZOS)
+
+    buffer = BytesIO()
+    base = Path(arquivo.name).stem
+    if imagem.mode in ('RGBA', 'LA') or 'transparency' in imagem.info:
+        imagem.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        nome = f"{base}_pdf.png"
+    else:
+        imagem.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+        nome = f"{base}_pdf.jpg"
+    return nome, buffer.getvalue()
@@ -0,0 +1,54 @@
+import base64
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import User
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara o custo por requisição da autenticação Basic (hash da senha) com a JWT (assinatura).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteracoes', type=int, default=50)
+
+    def _medir(self, autenticador, request_django, iteracoes):
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            usuario, _auth = autenticador.authenticate(Request(request_django))
+            assert usuario is not None
+        return (time.perf_counter() - inicio) * 1000 / iteracoes
+
+    def handle(self, *args, **options):
+        iteracoes = options['iteracoes']
+        factory = RequestFactory()
+
+        try:
+            # Usuário temporário: tudo é desfeito no final
+            with transaction.atomic():
+                usuario = User.objects.create_user('benchmark_auth', password='senha-benchmark-123')
+
+                credenciais = base64.b64encode(b'benchmark_auth:senha-benchmark-123').decode()
+                basic = factory.get('/', HTTP_AUTHORIZATION=f'Basic {credenciais}')
+                token = RefreshToken.for_user(usuario).access_token
+                jwt = factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+                tempo_basic = self._medir(BasicAuthentication(), basic, iteracoes)
+                tempo_jwt = self._medir(JWTAuthentication(), jwt, iteracoes)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"Basic (PBKDF2 por requisição): {tempo_basic:8.2f} ms/req")
+        self.stdout.write(f"JWT (assinatura + usuário):    {tempo_jwt:8.2f} ms/req")
+        self.stdout.write(self.style.SUCCESS(f"JWT é {tempo_basic / tempo_jwt:.0f}x mais rápido."))
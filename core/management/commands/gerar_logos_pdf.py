@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ConfiguracaoSistema
+
+
+class Command(BaseCommand):
+    help = 'Gera (ou regera) a variante reduzida da logomarca usada nos PDFs.'
+
+    def handle(self, *args, **options):
+        for config in ConfiguracaoSistema.objects.exclude(logo='').exclude(logo__isnull=True):
+            try:
+                config.atualizar_logo_pdf(forcar=True)
+            except OSError as erro:
+                self.stderr.write(f'Logo de "{config}" não pôde ser lida: {erro}')
+                continue
+            config.invalidar_cache()
+            self.stdout.write(f'Variante gerada: {config.logo_pdf.name}')
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+# A variante das logos já cadastradas é gerada pelo comando `gerar_logos_pdf` (ou no
+# próximo save da configuração): a migração não depende do código do app nem do PIL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_configuracaosistema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='configuracaosistema',
+            name='logo_pdf',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='config/logos/pdf/', verbose_name='Logomarca otimizada para PDF'),
+        ),
+    ]
@@ -1,5 +1,12 @@
+import time
+from pathlib import Path
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import models, transaction
+
+from .imagens import gerar_variante_logo
 
 
 class User(AbstractUser):
@@ -39,6 +46,10 @@ class User(AbstractUser):
         return f"{self.username} ({self.get_role_display()})"
 
 
+# Cópia da configuração guardada no próprio processo (evita até a ida ao cache compartilhado)
+_configuracao_memo = {}
+
+
 class ConfiguracaoSistema(models.Model):
     """
     Permite ao admin configurar a aparência dos documentos PDF.
@@ -56,6 +67,15 @@ class ConfiguracaoSistema(models.Model):
         help_text="Idealmente uma imagem retangular ou quadrada de alta resolução."
     )
 
+    # Versão reduzida da logo, gerada automaticamente ao salvar (usada nos PDFs)
+    logo_pdf = models.ImageField(
+        upload_to='config/logos/pdf/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name="Logomarca otimizada para PDF"
+    )
+
     # Dados de Endereço e Contato (Exatamente como no PDF)
     endereco_completo = models.CharField(
         max_length=255,
@@ -79,8 +99,109 @@ class ConfiguracaoSistema(models.Model):
     def __str__(self):
         return "Configuração Geral da Empresa"
 
+    CACHE_KEY = 'core:configuracao_sistema'
+    MEMO_SEGUNDOS = 60  # Com cache compartilhado: tempo máximo que outros processos levam para ver uma alteração
+    # Validade no cache: com o LocMemCache (um por processo) a invalidação não chega
+    # aos outros workers, então a cópia deles expira sozinha (ver CACHES no settings)
+    CACHE_SEGUNDOS = 300
+
     def save(self, *args, **kwargs):
         # Garante que só exista 1 configuração no banco
         if not self.pk and ConfiguracaoSistema.objects.exists():
             return
-        super().save(*args, **kwargs)
\ No newline at end of file
+        logo_trocada = self._logo_trocada()
+        super().save(*args, **kwargs)
+        self.atualizar_logo_pdf(forcar=logo_trocada)
+        self.invalidar_cache()
+
+    def _logo_trocada(self):
+        """
+        Logo enviada agora (mesmo com o nome do arquivo anterior) ou apontando para outro
+        arquivo que o gravado no banco.
+        """
+        if self.logo and not self.logo._committed:
+            return True
+        anterior = None
+        if not self._state.adding:
+            anterior = ConfiguracaoSistema.objects.filter(pk=self.pk).values_list('logo', flat=True).first()
+        return (anterior or '') != (self.logo.name or '')
+
+    def atualizar_logo_pdf(self, forcar=False):
+        """
+        Gera a variante reduzida quando a logo muda (ou quando ainda não existe) e apaga
+        o arquivo da variante anterior.
+        """
+        antiga = self.logo_pdf.name if self.logo_pdf else None
+        if not self.logo:
+            if antiga:
+                self.logo_pdf = None
+                ConfiguracaoSistema.objects.filter(pk=self.pk).update(logo_pdf=None)
+                self._apagar_variante(antiga)
+            return
+        if antiga and not forcar:
+            return
+
+        nome, conteudo = gerar_variante_logo(self.logo)
+        self.logo_pdf.save(nome, ContentFile(conteudo), save=False)
+        ConfiguracaoSistema.objects.filter(pk=self.pk).update(logo_pdf=self.logo_pdf.name)
+        if antiga and antiga != self.logo_pdf.name:
+            self._apagar_variante(antiga)
+
+    def _apagar_variante(self, nome):
+        # Sem referência no banco, o arquivo antigo ficaria órfão no storage
+        self.logo_pdf.storage.delete(nome)
+
+    @property
+    def logo_pdf_uri(self):
+        """
+        Caminho local (file://) da logo para o WeasyPrint ler direto do disco,
+        sem buscar a imagem via HTTP pelo base_url.
+        """
+        arquivo = self.logo_pdf or self.logo
+        if not arquivo:
+            return ''
+        try:
+            return Path(arquivo.path).as_uri()
+        except NotImplementedError:
+            # Storage remoto (S3 etc.) não tem caminho local
+            return arquivo.url
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        self.invalidar_cache()
+        return resultado
+
+    @classmethod
+    def padrao(cls):
+        """
+        Configuração provisória (não salva) usada enquanto o admin não cadastra a empresa.
+        """
+        return cls(nome_empresa='Configure no Admin', endereco_completo='', cnpj='', contato_telefone='')
+
+    @classmethod
+    def carregar(cls):
+        """
+        Devolve a configuração ativa sem consultar o banco a cada documento:
+        primeiro a cópia do processo, depois o cache compartilhado e só então o banco.
+        """
+        agora = time.monotonic()
+        if _configuracao_memo.get('expira', 0) > agora:
+            return _configuracao_memo['config']
+
+        config = cache.get(cls.CACHE_KEY)
+        if config is None:
+            config = cls.objects.first() or cls.padrao()
+            cache.set(cls.CACHE_KEY, config, timeout=cls.CACHE_SEGUNDOS)
+
+        _configuracao_memo.update(config=config, expira=agora + cls.MEMO_SEGUNDOS)
+        return config
+
+    @classmethod
+    def invalidar_cache(cls):
+        def _limpar():
+            _configuracao_memo.clear()
+            cache.delete(cls.CACHE_KEY)
+
+        _limpar()
+        # Limpa de novo após o commit: outro processo pode ter lido o valor antigo nesse meio tempo
+        transaction.on_commit(_limpar)
\ No newline at end of file
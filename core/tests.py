@@ -1,3 +1,268 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from clientes.models import Cliente, Endereco
+from estoque.models import Categoria, Produto
+from servicos.models import ItemOrcamento, Orcamento, OrdemServico
+
+from .imagens import LOGO_PDF_TAMANHO
+from .models import ConfiguracaoSistema, User
+
+
+class ConfiguracaoSistemaCacheTests(TestCase):
+
+    def setUp(self):
+        ConfiguracaoSistema.invalidar_cache()
+        self.addCleanup(ConfiguracaoSistema.invalidar_cache)
+
+    def test_sem_registro_usa_padrao(self):
+        config = ConfiguracaoSistema.carregar()
+
+        self.assertIsNone(config.pk)
+        self.assertEqual(config.nome_empresa, 'Configure no Admin')
+
+    def test_leituras_seguintes_nao_consultam_banco(self):
+        ConfiguracaoSistema.objects.create(nome_empresa='Segurança Total')
+        ConfiguracaoSistema.carregar()
+
+        with self.assertNumQueries(0):
+            config = ConfiguracaoSistema.carregar()
+        self.assertEqual(config.nome_empresa, 'Segurança Total')
+
+    def test_copia_no_cache_expira(self):
+        ConfiguracaoSistema.objects.create(nome_empresa='Antiga')
+        with mock.patch('core.models.cache.set') as gravar:
+            ConfiguracaoSistema.carregar()
+        gravar.assert_called_once_with(
+            ConfiguracaoSistema.CACHE_KEY, mock.ANY, timeout=ConfiguracaoSistema.CACHE_SEGUNDOS
+        )
+
+    def test_salvar_invalida_cache(self):
+        config = ConfiguracaoSistema.objects.create(nome_empresa='Antiga')
+        ConfiguracaoSistema.carregar()
+
+        config.nome_empresa = 'Nova'
+        config.save()
+
+        self.assertEqual(ConfiguracaoSistema.carregar().nome_empresa, 'Nova')
+
+    def test_salvar_pelo_admin_invalida_cache(self):
+        config = ConfiguracaoSistema.objects.create(nome_empresa='Antiga')
+        ConfiguracaoSistema.carregar()
+        admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha123')
+        self.client.force_login(admin)
+
+        resposta = self.client.post(f'/admin/core/configuracaosistema/{config.pk}/change/', {
+            'nome_empresa': 'Pelo Admin',
+            'endereco_completo': 'Rua A, 1',
+            'contato_telefone': '(71) 3333-3333',
+        })
+
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(ConfiguracaoSistema.carregar().nome_empresa, 'Pelo Admin')
+
+
+class LogoPdfTests(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings_patch = override_settings(MEDIA_ROOT=self.media.name)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def _logo_grande(self):
+        # Ruído aleatório não comprime: simula uma foto de alta resolução
+        imagem = Image.frombytes('RGB', (3000, 2000), os.urandom(3000 * 2000 * 3))
+        buffer = io.BytesIO()
+        imagem.save(buffer, 'PNG')
+        return SimpleUploadedFile('logo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_salvar_gera_variante_reduzida(self):
+        config = ConfiguracaoSistema.objects.create(nome_empresa='Empresa', logo=self._logo_grande())
+
+        config.refresh_from_db()
+        with Image.open(config.logo_pdf.path) as variante:
+            self.assertLessEqual(variante.width, LOGO_PDF_TAMANHO[0])
+            self.assertLessEqual(variante.height, LOGO_PDF_TAMANHO[1])
+        self.assertLess(config.logo_pdf.size * 10, config.logo.size)
+        self.assertTrue(config.logo_pdf_uri.startswith('file://'))
+        self.assertTrue(config.logo_pdf_uri.endswith(config.logo_pdf.name))
+
+    def test_variante_nao_e_regerada_sem_troca_de_logo(self):
+        config = ConfiguracaoSistema.objects.create(nome_empresa='Empresa', logo=self._logo_grande())
+        variante = config.logo_pdf.name
+
+        config.nome_empresa = 'Outro Nome'
+        config.save()
+
+        self.assertEqual(config.logo_pdf.name, variante)
+
+    def test_nova_logo_com_mesmo_nome_regera_variante(self):
+        config = ConfiguracaoSistema.objects.create(nome_empresa='Empresa', logo=self._logo_grande())
+        antiga = config.logo_pdf.name
+        storage = config.logo_pdf.storage
+
+        config.logo = self._logo_grande()
+        config.save()
+
+        config.refresh_from_db()
+        self.assertNotEqual(config.logo_pdf.name, antiga)
+        self.assertTrue(storage.exists(config.logo_pdf.name))
+        self.assertFalse(storage.exists(antiga))
+
+    def test_remover_logo_limpa_variante(self):
+        config = ConfiguracaoSistema.objects.create(nome_empresa='Empresa', logo=self._logo_grande())
+        antiga = config.logo_pdf.name
+
+        config.logo = None
+        config.save()
+
+        config.refresh_from_db()
+        self.assertFalse(config.logo_pdf)
+        self.assertEqual(config.logo_pdf_uri, '')
+        self.assertFalse(config.logo_pdf.storage.exists(antiga))
+
+    def test_comando_gera_variantes(self):
+        config = ConfiguracaoSistema.objects.create(nome_empresa='Empresa', logo=self._logo_grande())
+        ConfiguracaoSistema.objects.filter(pk=config.pk).update(logo_pdf=None)
+
+        call_command('gerar_logos_pdf', stdout=io.StringIO())
+
+        config.refresh_from_db()
+        self.assertTrue(config.logo_pdf)
+        self.assertTrue(config.logo_pdf.storage.exists(config.logo_pdf.name))
+
+
+class AutenticacaoJwtTests(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('tecnico', password='senha-forte-123')
+        self.api = APIClient()
+
+    def _tokens(self):
+        resposta = self.api.post('/api/token/', {'username': 'tecnico', 'password': 'senha-forte-123'})
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_token_autentica_api(self):
+        tokens = self._tokens()
+
+        self.api.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.api.get('/servicos/api/ordens/').status_code, 200)
+
+    def test_sem_token_nao_autentica(self):
+        self.assertEqual(self.api.get('/servicos/api/ordens/').status_code, 401)
+
+    def test_refresh_e_blacklist(self):
+        tokens = self._tokens()
+
+        resposta = self.api.post('/api/token/refresh/', {'refresh': tokens['refresh']})
+        self.assertEqual(resposta.status_code, 200)
+        novo_refresh = resposta.json()['refresh']
+
+        # Rotação: o refresh antigo foi para a blacklist
+        self.assertEqual(self.api.post('/api/token/refresh/', {'refresh': tokens['refresh']}).status_code, 401)
+
+        self.assertEqual(self.api.post('/api/token/blacklist/', {'refresh': novo_refresh}).status_code, 200)
+        self.assertEqual(self.api.post('/api/token/refresh/', {'refresh': novo_refresh}).status_code, 401)
+
+    def test_benchmark(self):
+        saida = io.StringIO()
+        call_command('benchmark_autenticacao', iteracoes=1, stdout=saida)
+
+        self.assertIn('JWT', saida.getvalue())
+        self.assertFalse(User.objects.filter(username='benchmark_auth').exists())
+
+
+class ConsultasChangelistTests(TestCase):
+    """
+    Orçamento de consultas das listas do admin: uma página cheia (100 linhas) faz
+    o mesmo número de consultas que uma página com poucas linhas.
+    """
+    LISTAS = [
+        'admin:clientes_cliente_changelist',
+        'admin:estoque_produto_changelist',
+        'admin:servicos_orcamento_changelist',
+        'admin:servicos_ordemservico_changelist',
+    ]
+    # Sessão, usuário, contagens da paginação, filtros laterais, a página...
+    LIMITE_CONSULTAS = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        cls.tecnico = User.objects.create_user('tecnico', password='senha', role=User.Role.TECNICO)
+        cls.categoria = Categoria.objects.create(nome='Câmeras')
+        cls.produto = Produto.objects.create(categoria=cls.categoria, nome='Câmera IP', quantidade=10)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.criados = 0
+
+    def _criar(self, quantidade):
+        inicio, self.criados = self.criados, self.criados + quantidade
+        faixa = range(inicio, self.criados)
+        clientes = Cliente.objects.bulk_create([
+            Cliente(nome=f'Cliente {i:03d}', cpf_cnpj=f'doc-{i}', telefone='0', tecnico_responsavel=self.tecnico)
+            for i in faixa
+        ])
+        Endereco.objects.bulk_create([
+            Endereco(cliente=cliente, logradouro='Rua A', numero=str(n), bairro='Centro', cidade='Salvador',
+                     estado='BA', cep='40000-000', principal=(n == 0))
+            for cliente in clientes for n in range(2)
+        ])
+        Produto.objects.bulk_create([
+            Produto(categoria=self.categoria, nome=f'Produto {i:03d}', quantidade=i % 10) for i in faixa
+        ])
+        orcamentos = Orcamento.objects.bulk_create([
+            Orcamento(cliente=cliente, validade=date(2030, 1, 1)) for cliente in clientes
+        ])
+        ItemOrcamento.objects.bulk_create([
+            ItemOrcamento(orcamento=orcamento, produto=self.produto, quantidade=1,
+                          preco_unitario=Decimal('10.00'), subtotal=Decimal('10.00'))
+            for orcamento in orcamentos
+        ])
+        OrdemServico.objects.bulk_create([
+            OrdemServico(cliente=cliente, tecnico=self.tecnico, descricao_problema='Teste') for cliente in clientes
+        ])
+
+    def _consultas(self, nome, parametros=None):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse(nome), parametros or {})
+        self.assertEqual(resposta.status_code, 200)
+        return consultas
+
+    def test_pagina_cheia_com_consultas_constantes(self):
+        self._criar(5)
+        poucas = {nome: len(self._consultas(nome)) for nome in self.LISTAS}
+        self._criar(95)
+
+        for nome in self.LISTAS:
+            with self.subTest(lista=nome):
+                consultas = self._consultas(nome)
+                self.assertEqual(len(consultas), poucas[nome])
+                self.assertLessEqual(len(consultas), self.LIMITE_CONSULTAS)
+
+    def test_filtro_por_uf_sem_distinct(self):
+        self._criar(3)
+        consultas = self._consultas('admin:clientes_cliente_changelist', {'uf': 'BA'})
+
+        resposta = self.client.get(reverse('admin:clientes_cliente_changelist'), {'uf': 'BA'})
+        self.assertEqual(resposta.context['cl'].result_count, 3)
+        self.assertContains(resposta, 'Salvador/BA', count=3)
+        self.assertFalse([q['sql'] for q in consultas if 'DISTINCT' in q['sql'] and 'clientes_cliente' in q['sql']])
 
-# Create your tests here.
@@ -0,0 +1,17 @@
+"""
+Normalização de texto para buscas (clientes, produtos).
+"""
+import re
+import unicodedata
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com espaços simples."""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def so_digitos(texto):
+    """'(71) 99999-0000' -> '71999990000'"""
+    return re.sub(r'\D', '', texto or '')
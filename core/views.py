@@ -1,8 +1,14 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 
-# Mantenha as outras imports se houver
+from servicos import indicadores
+
 
 @login_required
 def dashboard(request):
-    return render(request, 'dashboard.html')
\ No newline at end of file
+    # Lido das tabelas de resumo (com cache curto), sem contar a tabela de OS
+    kpis = indicadores.resumo()
+    return render(request, 'dashboard.html', {
+        'kpis': kpis,
+        'caixa_dia': indicadores.formatar_moeda(kpis['caixa_dia']),
+    })
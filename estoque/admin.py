@@ -1,6 +1,13 @@
+from django import forms
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models import F
+from django.http import HttpResponseRedirect, JsonResponse
+from django.urls import path
 from django.utils.html import format_html
-from .models import Categoria, Produto
+from core.exportacao import acao_exportacao
+from . import autocomplete, codigos, exportacao, movimentos
+from .models import Categoria, MovimentoEstoque, Produto, corte_estoque_antigo
 
 
 class CategoriaAdmin(admin.ModelAdmin):
@@ -8,6 +15,36 @@ class CategoriaAdmin(admin.ModelAdmin):
     search_fields = ('nome',)
 
 
+class NivelEstoqueFilter(admin.SimpleListFilter):
+    title = 'Nível de estoque'
+    parameter_name = 'nivel_estoque'
+
+    def lookups(self, request, model_admin):
+        return (('baixo', 'Abaixo do mínimo'), ('ok', 'OK'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'baixo':
+            return queryset.estoque_baixo()
+        if self.value() == 'ok':
+            return queryset.filter(tipo=Produto.Tipo.PRODUTO, quantidade__gt=F('estoque_minimo'))
+        return queryset
+
+
+class IdadeEstoqueFilter(admin.SimpleListFilter):
+    title = 'Idade do estoque'
+    parameter_name = 'idade_estoque'
+
+    def lookups(self, request, model_admin):
+        return (('antigo', 'Mais de 2 anos (promoção)'), ('recente', 'Normal'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'antigo':
+            return queryset.antigos()
+        if self.value() == 'recente':
+            return queryset.filter(tipo=Produto.Tipo.PRODUTO, data_cadastro__gte=corte_estoque_antigo())
+        return queryset
+
+
 class ProdutoAdmin(admin.ModelAdmin):
     """
     Gestão de Estoque com indicadores visuais.
@@ -19,13 +56,18 @@ class ProdutoAdmin(admin.ModelAdmin):
         'categoria',
         'preco_venda',
         'quantidade',
+        'reservado',
         'garantia_meses',  # <--- NOVO
         'status_estoque',
         'alerta_validade_visual'
     )
 
-    list_filter = ('tipo', 'categoria', 'local_fisico')
+    list_filter = ('tipo', NivelEstoqueFilter, IdadeEstoqueFilter, 'categoria', 'local_fisico')
     search_fields = ('nome', 'codigo_barras', 'referencia_fabricante')
+    actions = [
+        acao_exportacao(exportacao.exportar_produtos, 'csv'),
+        acao_exportacao(exportacao.exportar_produtos, 'ndjson'),
+    ]
 
     # Organização do Formulário
     fieldsets = (
@@ -33,7 +75,7 @@ class ProdutoAdmin(admin.ModelAdmin):
             'fields': ('tipo', 'categoria', 'nome', 'codigo_barras', 'referencia_fabricante')
         }),
         ('Valores e Estoque', {
-            'fields': ('preco_custo', 'preco_venda', 'quantidade', 'estoque_minimo', 'local_fisico')
+            'fields': ('preco_custo', 'preco_venda', 'quantidade', 'reservado', 'estoque_minimo', 'local_fisico')
         }),
         ('Controle e Garantia', {  # <--- Renomeei o título da seção
             # Adicionei 'garantia_meses' aqui para poder editar
@@ -41,7 +83,56 @@ class ProdutoAdmin(admin.ModelAdmin):
         }),
     )
 
-    readonly_fields = ('data_cadastro',)
+    readonly_fields = ('data_cadastro', 'reservado')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Depois do cadastro, a quantidade só muda por Movimentos de Estoque
+        if obj is not None:
+            return self.readonly_fields + ('quantidade',)
+        return self.readonly_fields
+
+    def get_queryset(self, request):
+        # Alertas calculados no SELECT: a lista filtra e ordena por eles no banco
+        return super().get_queryset(request).com_alertas()
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Código lido pelo leitor (lista e autocomplete dos itens do orçamento):
+        consulta exata pelo índice antes de cair nas buscas por trecho.
+        """
+        termo = codigos.normalizar(search_term)
+        if termo and ' ' not in termo:
+            encontrados = codigos.consultar(termo)
+            if encontrados:
+                return queryset.filter(pk__in=[produto['id'] for produto in encontrados]), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def get_urls(self):
+        urls = [
+            path(
+                'autocomplete/',
+                self.admin_site.admin_view(self.autocomplete_produtos),
+                name='estoque_produto_autocomplete',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def autocomplete_produtos(self, request):
+        """
+        Autocomplete dos itens do orçamento (ver estoque/widgets.py): mesmo formato de
+        resposta da view padrão do admin (Select2), só com id e texto.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            pagina = max(int(request.GET.get('page') or 1), 1)
+        except ValueError:
+            pagina = 1
+        resultado = autocomplete.buscar(request.GET.get('term', ''), pagina)
+        return JsonResponse({
+            'results': [{'id': str(pk), 'text': texto} for pk, texto, _palavras in resultado['itens']],
+            'pagination': {'more': resultado['mais']},
+        })
 
     def status_estoque(self, obj):
         """
@@ -52,7 +143,7 @@ class ProdutoAdmin(admin.ModelAdmin):
         if obj.tipo == Produto.Tipo.SERVICO:
             return "-"
 
-        if obj.quantidade <= obj.estoque_minimo:
+        if obj.em_estoque_baixo:
             color = 'red'
             msg = 'BAIXO'
             weight = 'bold'
@@ -67,19 +158,79 @@ class ProdutoAdmin(admin.ModelAdmin):
         )
 
     status_estoque.short_description = 'Status Estoque'
+    status_estoque.admin_order_field = 'folga_estoque'
 
     def alerta_validade_visual(self, obj):
         """
         Exibe um alerta visual se o produto for antigo (> 2 anos).
         """
-        if obj.alerta_promocao:
+        if obj.em_estoque_antigo:
             return format_html(
                 '<span style="color: orange; font-weight: bold;">⚠️ PROMOÇÃO</span>'
             )
         return "Normal"
 
     alerta_validade_visual.short_description = 'Idade do Estoque'
+    alerta_validade_visual.admin_order_field = 'data_cadastro'
+
+
+class MovimentoEstoqueForm(forms.ModelForm):
+    """Lançamento manual: só entrada ou saída (reservas e baixas vêm dos orçamentos/OS)."""
+    tipo = forms.ChoiceField(choices=[
+        (MovimentoEstoque.Tipo.ENTRADA.value, MovimentoEstoque.Tipo.ENTRADA.label),
+        (MovimentoEstoque.Tipo.SAIDA.value, MovimentoEstoque.Tipo.SAIDA.label),
+    ])
+
+    class Meta:
+        model = MovimentoEstoque
+        fields = ('produto', 'tipo', 'quantidade', 'observacao')
+
+    def clean(self):
+        dados = super().clean()
+        produto = dados.get('produto')
+        # Aviso antecipado; a garantia contra saldo negativo é o UPDATE condicional em movimentar()
+        if dados.get('tipo') == MovimentoEstoque.Tipo.SAIDA and produto and dados.get('quantidade'):
+            if dados['quantidade'] > produto.disponivel:
+                raise forms.ValidationError(f'Estoque disponível de {produto.nome}: {produto.disponivel}.')
+        return dados
+
+
+class MovimentoEstoqueAdmin(admin.ModelAdmin):
+    """
+    Razão do estoque. Lançamentos manuais (compra, perda, inventário) entram por aqui;
+    um movimento gravado não é editado nem apagado: corrige-se com outro movimento.
+    """
+    form = MovimentoEstoqueForm
+    list_display = ('criado_em', 'produto', 'tipo', 'quantidade', 'item_orcamento', 'ordem_servico', 'usuario')
+    list_filter = ('tipo',)
+    list_select_related = ('produto', 'item_orcamento__produto', 'ordem_servico__cliente', 'usuario')
+    autocomplete_fields = ['produto']
+    search_fields = ('produto__nome', 'observacao')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        obj.usuario = request.user
+        try:
+            movimentos.movimentar([obj])
+        except movimentos.EstoqueInsuficiente as erro:
+            # O saldo mudou entre a validação do formulário e a gravação: nada foi gravado
+            self.message_user(request, erro.messages[0], level='error')
+
+    def log_addition(self, request, obj, message):
+        if obj.pk:
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if obj.pk is None:
+            return HttpResponseRedirect(request.get_full_path())
+        return super().response_add(request, obj, post_url_continue)
 
 
 admin.site.register(Categoria, CategoriaAdmin)
-admin.site.register(Produto, ProdutoAdmin)
\ No newline at end of file
+admin.site.register(Produto, ProdutoAdmin)
+admin.site.register(MovimentoEstoque, MovimentoEstoqueAdmin)
@@ -0,0 +1,45 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import codigos
+from .models import Produto
+
+# Máximo de produtos por resposta do relatório de estoque baixo
+LIMITE_RELATORIO = 500
+
+
+class ProdutoPorCodigoView(APIView):
+    """
+    Leitura do código de barras no balcão: GET /estoque/api/codigo/<codigo>/.
+    Procura pelo GTIN/código de barras e, se não achar, pelo código do fabricante.
+    Devolve {"codigo": ..., "produtos": [...]} ou 404 se nenhum produto tiver o código.
+    """
+
+    def get(self, request, codigo):
+        produtos = codigos.consultar(codigo)
+        if not produtos:
+            return Response({'codigo': codigo, 'detail': 'Nenhum produto com este código.'}, status=404)
+        # Preço como texto, igual aos serializers da API (DecimalField)
+        produtos = [{**produto, 'preco_venda': str(produto['preco_venda'])} for produto in produtos]
+        return Response({'codigo': codigo, 'produtos': produtos})
+
+
+class EstoqueBaixoView(APIView):
+    """
+    Relatório de reposição: GET /estoque/api/estoque-baixo/ (?limite=, padrão e máximo 500).
+    Produtos físicos com quantidade no mínimo ou abaixo, em ordem de nome. Uma única
+    consulta, servida pelo índice parcial produto_estoque_baixo_idx (que só contém esses
+    produtos), sem percorrer o catálogo.
+    """
+
+    def get(self, request):
+        try:
+            limite = min(max(int(request.query_params.get('limite') or LIMITE_RELATORIO), 1), LIMITE_RELATORIO)
+        except ValueError:
+            limite = LIMITE_RELATORIO
+        produtos = list(
+            Produto.objects.estoque_baixo()
+            .order_by('nome', 'id')
+            .values('id', 'nome', 'quantidade', 'reservado', 'estoque_minimo', 'local_fisico')[:limite + 1]
+        )
+        return Response({'produtos': produtos[:limite], 'mais': len(produtos) > limite})
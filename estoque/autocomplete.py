@@ -0,0 +1,117 @@
+"""
+Autocomplete de produtos para os itens do orçamento no admin.
+
+Em vez do autocomplete padrão (icontains em nome/código de barras/código do fabricante
+a cada tecla), cada palavra digitada vira uma busca por prefixo (faixa >= / <) no índice
+de PalavraProduto. O resultado de cada consulta fica no cache por alguns segundos; se uma
+consulta mais curta (ex: "cam") já trouxe a lista completa, "camer" é filtrado dela sem ir
+ao banco. A chave inclui o contador de geração de estoque/codigos.py, então salvar um
+produto descarta tudo o que estava no cache.
+"""
+import hashlib
+import re
+
+from django.core.cache import cache
+
+from core.texto import normalizar
+from . import codigos
+
+CAMPOS_INDEXADOS = ('nome', 'codigo_barras', 'referencia_fabricante')
+POR_PAGINA = 20
+CACHE_SEGUNDOS = 60
+TAMANHO_PALAVRA = 50
+
+
+def _partes(texto):
+    return re.findall(r'\w+', normalizar(texto))
+
+
+def _chave(base, consulta):
+    # A consulta vai como hash: texto livre na chave passa do limite de 250 caracteres
+    # e pode ter caracteres que o memcached não aceita
+    return base + hashlib.md5(consulta.encode('utf-8')).hexdigest()
+
+
+def palavras(nome, codigo_barras, referencia_fabricante):
+    """Palavras do nome e dos códigos, normalizadas ("CAM-100" -> cam, 100)."""
+    resultado = set()
+    for texto in (nome, codigo_barras, referencia_fabricante):
+        resultado.update(_partes(texto))
+    return {palavra[:TAMANHO_PALAVRA] for palavra in resultado}
+
+
+def indexar(produto):
+    """Atualiza as palavras do produto, só se mudaram."""
+    from .models import PalavraProduto
+
+    novas = palavras(produto.nome, produto.codigo_barras, produto.referencia_fabricante)
+    atuais = set(PalavraProduto.objects.filter(produto=produto).values_list('palavra', flat=True))
+    if novas == atuais:
+        return
+    if atuais - novas:
+        PalavraProduto.objects.filter(produto=produto, palavra__in=atuais - novas).delete()
+    PalavraProduto.objects.bulk_create([PalavraProduto(produto=produto, palavra=p) for p in novas - atuais])
+
+
+def _casa(termos, palavras_item):
+    return all(any(palavra.startswith(termo) for palavra in palavras_item) for termo in termos)
+
+
+def _consultar_banco(termos, pagina):
+    from .models import PalavraProduto, Produto
+
+    queryset = Produto.objects.all()
+    for termo in termos:
+        # Faixa em vez de LIKE 'x%': usa o índice (palavra, produto) em qualquer banco
+        prefixo = PalavraProduto.objects.filter(palavra__gte=termo, palavra__lt=termo + '\uffff')
+        queryset = queryset.filter(pk__in=prefixo.values('produto_id'))
+
+    inicio = (pagina - 1) * POR_PAGINA
+    linhas = list(
+        queryset.order_by('nome', 'id')
+        .values_list('id', 'nome', 'tipo', 'codigo_barras', 'referencia_fabricante')[inicio:inicio + POR_PAGINA + 1]
+    )
+    tipos = dict(Produto.Tipo.choices)
+    itens = [
+        # Mesmo texto de Produto.__str__
+        (pk, f'{nome} ({tipos.get(tipo, tipo)})', sorted(palavras(nome, codigo_barras, referencia)))
+        for pk, nome, tipo, codigo_barras, referencia in linhas[:POR_PAGINA]
+    ]
+    return {'itens': itens, 'mais': len(linhas) > POR_PAGINA}
+
+
+def buscar(termo, pagina=1):
+    """
+    {'itens': [(id, texto, palavras)], 'mais': bool} para a página pedida.
+    """
+    termos = _partes(termo)
+    consulta = ' '.join(termos)
+    base = f'estoque:autocomplete:{codigos.geracao()}:{pagina}:'
+
+    if pagina == 1 and consulta:
+        # A própria consulta ou uma mais curta que ela, com a lista completa (sem "mais")
+        prefixos = [consulta[:tamanho] for tamanho in range(len(consulta), 0, -1)]
+        chaves = {prefixo: _chave(base, prefixo) for prefixo in prefixos}
+        guardados = cache.get_many(list(chaves.values()))
+        for prefixo in prefixos:
+            resultado = guardados.get(chaves[prefixo])
+            if resultado is None:
+                continue
+            if prefixo == consulta:
+                return resultado
+            if not resultado['mais']:
+                resultado = {
+                    'itens': [item for item in resultado['itens'] if _casa(termos, item[2])],
+                    'mais': False,
+                }
+                cache.set(chaves[consulta], resultado, CACHE_SEGUNDOS)
+                return resultado
+            break
+    else:
+        resultado = cache.get(_chave(base, consulta))
+        if resultado is not None:
+            return resultado
+
+    resultado = _consultar_banco(termos, pagina)
+    cache.set(_chave(base, consulta), resultado, CACHE_SEGUNDOS)
+    return resultado
@@ -0,0 +1,85 @@
+"""
+Consulta de produto pelo código lido no balcão (GTIN / código de barras ou código do fabricante).
+
+As consultas usam só igualdade em colunas indexadas (codigo_barras é único,
+referencia_fabricante tem índice) e o resultado fica guardado no próprio processo,
+num LRU limitado. Salvar ou apagar um produto limpa esse cache aqui e avisa os
+outros processos por um contador de geração no cache compartilhado. Com o
+LocMemCache (um por processo) o aviso não chega: lá a entrada vale no máximo
+VALIDADE_SEGUNDOS.
+"""
+import functools
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+GERACAO_KEY = 'estoque:codigos:geracao'
+VERIFICAR_SEGUNDOS = 5  # Com cache compartilhado: tempo máximo que outros processos levam para ver uma alteração
+VALIDADE_SEGUNDOS = 60  # Sem cache compartilhado: idade máxima de uma leitura guardada
+MAXIMO_CODIGOS = 2048  # Códigos guardados por processo (os menos usados saem primeiro)
+
+# Campos devolvidos na leitura. Sem a quantidade em estoque: ela muda a cada venda
+# (por UPDATE direto, sem save) e deixaria o resumo velho.
+CAMPOS_RESUMO = ('id', 'nome', 'tipo', 'codigo_barras', 'referencia_fabricante', 'preco_venda', 'local_fisico')
+
+_estado = {'geracao': None, 'verificar_em': 0}
+
+
+def normalizar(codigo):
+    return (codigo or '').strip()
+
+
+def geracao():
+    """Contador compartilhado entre processos; muda a cada produto salvo ou apagado."""
+    return cache.get_or_set(GERACAO_KEY, 1, timeout=None)
+
+
+def _geracao_atual():
+    agora = time.monotonic()
+    if _estado['verificar_em'] <= agora:
+        _estado['geracao'] = geracao()
+        _estado['verificar_em'] = agora + VERIFICAR_SEGUNDOS
+    return _estado['geracao']
+
+
+@functools.lru_cache(maxsize=MAXIMO_CODIGOS)
+def _buscar(geracao, janela, codigo):
+    """
+    Resumos dos produtos do código. A chave leva a geração e a janela de tempo: quando
+    uma das duas muda, a leitura antiga deixa de ser usada e sai do LRU com o tempo.
+    """
+    from .models import Produto
+
+    resultados = list(Produto.objects.filter(codigo_barras=codigo).values(*CAMPOS_RESUMO))
+    if not resultados:
+        resultados = list(
+            Produto.objects.filter(referencia_fabricante=codigo).order_by('nome', 'id').values(*CAMPOS_RESUMO)
+        )
+    return tuple(resultados)
+
+
+def consultar(codigo):
+    """
+    Lista de resumos (dicts) dos produtos com este código de barras ou, se não houver,
+    com este código do fabricante. Repetições do mesmo código não vão ao banco.
+    """
+    codigo = normalizar(codigo)
+    if not codigo:
+        return []
+    return list(_buscar(_geracao_atual(), int(time.monotonic() // VALIDADE_SEGUNDOS), codigo))
+
+
+def invalidar():
+    def _limpar():
+        _buscar.cache_clear()
+        try:
+            _estado['geracao'] = cache.incr(GERACAO_KEY)
+        except ValueError:
+            # Chave ainda não existe (ou expirou no cache compartilhado)
+            cache.set(GERACAO_KEY, 2, timeout=None)
+            _estado['geracao'] = 2
+
+    _limpar()
+    # De novo após o commit: outro processo pode ter lido o valor antigo nesse meio tempo
+    transaction.on_commit(_limpar)
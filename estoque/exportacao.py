@@ -0,0 +1,28 @@
+"""
+Exportação de produtos para a contabilidade. Ver core/exportacao.py.
+"""
+from core.exportacao import resposta_exportacao
+from .models import Produto
+
+COLUNAS_PRODUTO = [
+    ('id', 'id'),
+    ('tipo', 'tipo'),
+    ('categoria', 'categoria.nome'),
+    ('nome', 'nome'),
+    ('codigo_barras', 'codigo_barras'),
+    ('referencia_fabricante', 'referencia_fabricante'),
+    ('preco_custo', 'preco_custo'),
+    ('preco_venda', 'preco_venda'),
+    ('quantidade', 'quantidade'),
+    ('estoque_minimo', 'estoque_minimo'),
+    ('local_fisico', 'local_fisico'),
+    ('garantia_meses', 'garantia_meses'),
+    ('validade', 'validade'),
+    ('data_cadastro', 'data_cadastro'),
+]
+
+
+def exportar_produtos(queryset, formato):
+    queryset = Produto.objects.all() if queryset is None else queryset
+    queryset = queryset.select_related('categoria').order_by('id')
+    return resposta_exportacao(queryset, COLUNAS_PRODUTO, formato, 'produtos')
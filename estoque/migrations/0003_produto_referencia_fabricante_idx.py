@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0002_produto_garantia_meses'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='produto',
+            name='referencia_fabricante',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True, verbose_name='Cód. Fabricante'),
+        ),
+    ]
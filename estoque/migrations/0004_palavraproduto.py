@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from estoque.autocomplete import palavras
+
+
+def indexar_produtos(apps, schema_editor):
+    Produto = apps.get_model('estoque', 'Produto')
+    PalavraProduto = apps.get_model('estoque', 'PalavraProduto')
+    linhas = Produto.objects.values_list('id', 'nome', 'codigo_barras', 'referencia_fabricante')
+    PalavraProduto.objects.bulk_create(
+        [
+            PalavraProduto(produto_id=pk, palavra=palavra)
+            for pk, nome, codigo_barras, referencia in linhas
+            for palavra in palavras(nome, codigo_barras, referencia)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0003_produto_referencia_fabricante_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PalavraProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('palavra', models.CharField(max_length=50)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='palavras', to='estoque.produto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['palavra', 'produto'], name='palavra_produto_idx')],
+            },
+        ),
+        migrations.RunPython(indexar_produtos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0004_palavraproduto'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['categoria', 'tipo'], name='produto_categoria_tipo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['local_fisico'], name='produto_local_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0005_indices_consultas'),
+        ('servicos', '0007_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='reservado',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Reservado (Orçamentos Aprovados)'),
+        ),
+        migrations.CreateModel(
+            name='MovimentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('E', 'Entrada'), ('S', 'Saída'), ('R', 'Reserva (Orçamento Aprovado)'), ('L', 'Liberação de Reserva'), ('B', 'Baixa de Reserva (OS Finalizada)')], max_length=1, verbose_name='Tipo')),
+                ('quantidade', models.PositiveIntegerField(verbose_name='Quantidade')),
+                ('observacao', models.CharField(blank=True, max_length=255, verbose_name='Observação')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('item_orcamento', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentos_estoque', to='servicos.itemorcamento', verbose_name='Item do Orçamento')),
+                ('ordem_servico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimentos_estoque', to='servicos.ordemservico', verbose_name='Ordem de Serviço')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='movimentos', to='estoque.produto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimento de Estoque',
+                'verbose_name_plural': 'Movimentos de Estoque',
+                'ordering': ['-criado_em', '-id'],
+                'indexes': [models.Index(fields=['produto', '-criado_em'], name='movimento_produto_idx')],
+            },
+        ),
+    ]
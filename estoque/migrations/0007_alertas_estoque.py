@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0006_movimentoestoque'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('quantidade__lte', models.F('estoque_minimo')), ('tipo', 'P')), fields=['nome', 'id'], name='produto_estoque_baixo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['tipo', 'data_cadastro'], name='produto_tipo_cadastro_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0007_alertas_estoque'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['atualizado_em'], name='produto_atualizado_idx'),
+        ),
+    ]
@@ -1,8 +1,13 @@
+from django.conf import settings
 from django.db import models
-from datetime import date
+from django.db.models import ExpressionWrapper, F, Q
+from django.utils import timezone
+from datetime import datetime, time, timedelta
 from dateutil.relativedelta import \
     relativedelta  # Precisaremos instalar se não tiver, mas usaremos lógica simples primeiro
 
+from . import autocomplete, codigos
+
 
 class Categoria(models.Model):
     """
@@ -19,6 +24,56 @@ class Categoria(models.Model):
     def __str__(self):
         return self.nome
 
+    def save(self, *args, **kwargs):
+        adicionando = self._state.adding
+        super().save(*args, **kwargs)
+        if not adicionando:
+            # O nome da categoria sai nos documentos dos produtos: a alteração muda o marcador deles
+            self.produto_set.update(atualizado_em=timezone.now())
+
+
+# Campos de saldo: não entram no save() de um produto já cadastrado
+CAMPOS_SALDO = ('quantidade', 'reservado')
+
+# Produto parado há mais tempo que isto entra no alerta de promoção
+IDADE_ESTOQUE_ANTIGO = relativedelta(years=2)
+
+
+def corte_estoque_antigo():
+    """
+    Produtos cadastrados antes deste instante são antigos (2 anos completos até hoje).
+    Comparar a coluna direto com um datetime deixa o banco usar o índice.
+    """
+    dia_seguinte = timezone.localdate() - IDADE_ESTOQUE_ANTIGO + timedelta(days=1)
+    return timezone.make_aware(datetime.combine(dia_seguinte, time.min))
+
+
+class ProdutoQuerySet(models.QuerySet):
+    """
+    Alertas de estoque calculados no banco (filtro e ordenação no SQL, sem
+    percorrer os produtos em Python). Serviços nunca entram nos alertas.
+    """
+
+    def estoque_baixo(self):
+        # Mesmas condições do índice parcial produto_estoque_baixo_idx
+        return self.filter(tipo=Produto.Tipo.PRODUTO, quantidade__lte=F('estoque_minimo'))
+
+    def antigos(self):
+        return self.filter(tipo=Produto.Tipo.PRODUTO, data_cadastro__lt=corte_estoque_antigo())
+
+    def com_alertas(self):
+        """Anota `folga_estoque` (quantidade - mínimo), `em_estoque_baixo` e `em_estoque_antigo`."""
+        produto_fisico = Q(tipo=Produto.Tipo.PRODUTO)
+        return self.annotate(
+            folga_estoque=F('quantidade') - F('estoque_minimo'),
+            em_estoque_baixo=ExpressionWrapper(
+                produto_fisico & Q(quantidade__lte=F('estoque_minimo')), output_field=models.BooleanField()
+            ),
+            em_estoque_antigo=ExpressionWrapper(
+                produto_fisico & Q(data_cadastro__lt=corte_estoque_antigo()), output_field=models.BooleanField()
+            ),
+        )
+
 
 class Produto(models.Model):
     """
@@ -49,13 +104,16 @@ class Produto(models.Model):
     preco_venda = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name='Preço de Venda')
 
     # Controle de Estoque
+    # Saldo: depois do cadastro, só muda pelos movimentos (ver estoque/movimentos.py)
     quantidade = models.IntegerField(default=0, verbose_name='Quantidade em Estoque')
+    reservado = models.IntegerField(default=0, editable=False, verbose_name='Reservado (Orçamentos Aprovados)')
     estoque_minimo = models.IntegerField(default=5, verbose_name='Estoque Mínimo (Alerta)')
 
     # Identificação e Localização
     codigo_barras = models.CharField(max_length=100, blank=True, null=True, unique=True,
                                      verbose_name='Código de Barras / GTIN')
-    referencia_fabricante = models.CharField(max_length=100, blank=True, null=True, verbose_name='Cód. Fabricante')
+    referencia_fabricante = models.CharField(max_length=100, blank=True, null=True, db_index=True,
+                                             verbose_name='Cód. Fabricante')
     local_fisico = models.CharField(max_length=100, blank=True, null=True, verbose_name='Localização no Estoque',
                                     help_text='Ex: Prateleira A1, Gaveta 2')
     garantia_meses = models.IntegerField(
@@ -71,20 +129,119 @@ class Produto(models.Model):
     data_cadastro = models.DateTimeField(auto_now_add=True, verbose_name='Data de Cadastro')
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    objects = ProdutoQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Produto / Serviço'
         verbose_name_plural = 'Produtos e Serviços'
         ordering = ['nome']
+        indexes = [
+            # Filtros laterais do admin (categoria + tipo, localização)
+            models.Index(fields=['categoria', 'tipo'], name='produto_categoria_tipo_idx'),
+            models.Index(fields=['local_fisico'], name='produto_local_idx'),
+            # Relatório de estoque baixo: índice parcial só com os produtos abaixo do mínimo,
+            # já na ordem do relatório (fica pequeno mesmo com um catálogo grande)
+            models.Index(
+                fields=['nome', 'id'], name='produto_estoque_baixo_idx',
+                condition=Q(tipo='P', quantidade__lte=F('estoque_minimo')),
+            ),
+            # Filtro "antigo" (tipo + data de cadastro)
+            models.Index(fields=['tipo', 'data_cadastro'], name='produto_tipo_cadastro_idx'),
+            # Produto alterado mais recentemente (marcador ETag das listagens da API)
+            models.Index(fields=['atualizado_em'], name='produto_atualizado_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nome} ({self.get_tipo_display()})"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # O saldo é atualizado no banco (F()) pelos movimentos: a cópia em memória
+            # pode estar velha e não pode sobrescrever uma baixa feita ao mesmo tempo
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in CAMPOS_SALDO
+            ]
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(autocomplete.CAMPOS_INDEXADOS):
+            autocomplete.indexar(self)
+        codigos.invalidar()
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        codigos.invalidar()
+        return resultado
+
+    @property
+    def disponivel(self):
+        """Quantidade livre para novos orçamentos (estoque menos as reservas)."""
+        return self.quantidade - self.reservado
+
     @property
     def alerta_promocao(self):
-        # ... (Mantenha a lógica do alerta_promocao igual) ...
+        # Mesma regra de Produto.objects.antigos() (listas usam a anotação em_estoque_antigo)
         if self.tipo == self.Tipo.SERVICO:
             return False
-        hoje = date.today()
-        data_cadastro_date = self.data_cadastro.date()
-        idade_anos = relativedelta(hoje, data_cadastro_date).years
-        return idade_anos >= 2
\ No newline at end of file
+        return self.data_cadastro < corte_estoque_antigo()
+
+
+class PalavraProduto(models.Model):
+    """
+    Índice de palavras do produto (nome e códigos, normalizados) para o autocomplete:
+    cada palavra digitada vira uma busca por prefixo num índice B-tree.
+    Mantido por Produto.save() (ver estoque/autocomplete.py).
+    """
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='palavras')
+    palavra = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['palavra', 'produto'], name='palavra_produto_idx'),
+        ]
+
+    def __str__(self):
+        return self.palavra
+
+
+class MovimentoEstoque(models.Model):
+    """
+    Razão do estoque: cada entrada, saída ou reserva de um produto, com a origem
+    (item do orçamento / OS) quando houver. Gravado por estoque/movimentos.py junto
+    com a atualização do saldo do produto.
+    """
+
+    class Tipo(models.TextChoices):
+        ENTRADA = 'E', 'Entrada'
+        SAIDA = 'S', 'Saída'
+        RESERVA = 'R', 'Reserva (Orçamento Aprovado)'
+        LIBERACAO = 'L', 'Liberação de Reserva'
+        BAIXA = 'B', 'Baixa de Reserva (OS Finalizada)'
+
+    produto = models.ForeignKey(Produto, on_delete=models.PROTECT, related_name='movimentos')
+    tipo = models.CharField(max_length=1, choices=Tipo.choices, verbose_name='Tipo')
+    quantidade = models.PositiveIntegerField(verbose_name='Quantidade')
+
+    item_orcamento = models.ForeignKey(
+        'servicos.ItemOrcamento', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='movimentos_estoque', verbose_name='Item do Orçamento'
+    )
+    ordem_servico = models.ForeignKey(
+        'servicos.OrdemServico', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='movimentos_estoque', verbose_name='Ordem de Serviço'
+    )
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    observacao = models.CharField(max_length=255, blank=True, verbose_name='Observação')
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Movimento de Estoque'
+        verbose_name_plural = 'Movimentos de Estoque'
+        ordering = ['-criado_em', '-id']
+        indexes = [
+            # Histórico de um produto, mais recentes primeiro
+            models.Index(fields=['produto', '-criado_em'], name='movimento_produto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.quantidade} - produto #{self.produto_id}"
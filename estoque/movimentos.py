@@ -0,0 +1,86 @@
+"""
+Movimentação de estoque.
+
+Todo ajuste de Produto.quantidade / Produto.reservado passa por movimentar(), que grava
+os MovimentoEstoque e atualiza o saldo no próprio banco:
+
+    UPDATE produto SET quantidade = quantidade - 2 WHERE id = 7 AND quantidade - reservado >= 2
+
+O valor nunca é lido e regravado em Python, então dois técnicos baixando o mesmo produto
+ao mesmo tempo não perdem nenhuma das baixas. A verificação de saldo está no WHERE do
+próprio UPDATE (sem SELECT ... FOR UPDATE nem bloqueio da tabela): só a linha de cada
+produto movimentado fica bloqueada até o fim da transação. Num lote com vários produtos,
+os UPDATEs saem sempre em ordem de id, para duas transações não se travarem mutuamente.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from .models import MovimentoEstoque, Produto
+
+# Efeito de cada tipo de movimento em (quantidade, reservado)
+EFEITOS = {
+    MovimentoEstoque.Tipo.ENTRADA: (1, 0),
+    MovimentoEstoque.Tipo.SAIDA: (-1, 0),
+    MovimentoEstoque.Tipo.RESERVA: (0, 1),
+    MovimentoEstoque.Tipo.LIBERACAO: (0, -1),
+    MovimentoEstoque.Tipo.BAIXA: (-1, -1),
+}
+
+
+class EstoqueInsuficiente(ValidationError):
+    """O lote deixaria algum produto com saldo disponível negativo (nada foi gravado)."""
+
+
+def _saldos(movimentos):
+    """Variação total de (quantidade, reservado) por produto no lote."""
+    saldos = defaultdict(lambda: [0, 0])
+    for movimento in movimentos:
+        delta_quantidade, delta_reservado = EFEITOS[movimento.tipo]
+        saldos[movimento.produto_id][0] += delta_quantidade * movimento.quantidade
+        saldos[movimento.produto_id][1] += delta_reservado * movimento.quantidade
+    return saldos
+
+
+def movimentar(movimentos, verificar_saldo=True):
+    """
+    Grava os movimentos (instâncias ainda não salvas de MovimentoEstoque, de um ou
+    vários produtos) e aplica o efeito nos saldos, tudo numa única transação.
+
+    Com verificar_saldo, o lote inteiro é recusado (EstoqueInsuficiente) se algum
+    produto ficaria com disponível (quantidade - reservado) ou reservado negativo.
+    Sem ela, a baixa é registrada mesmo assim (ex: peça já usada no serviço).
+    """
+    movimentos = [movimento for movimento in movimentos if movimento.quantidade]
+    if not movimentos:
+        return []
+
+    with transaction.atomic():
+        faltando = []
+        for produto_id, (delta_quantidade, delta_reservado) in sorted(_saldos(movimentos).items()):
+            if not delta_quantidade and not delta_reservado:
+                continue
+            linha = Produto.objects.filter(pk=produto_id)
+            if verificar_saldo:
+                if delta_quantidade < delta_reservado:
+                    linha = linha.filter(quantidade__gte=F('reservado') + delta_reservado - delta_quantidade)
+                if delta_reservado < 0:
+                    linha = linha.filter(reservado__gte=-delta_reservado)
+            atualizados = linha.update(
+                quantidade=F('quantidade') + delta_quantidade,
+                reservado=F('reservado') + delta_reservado,
+            )
+            if not atualizados:
+                faltando.append(produto_id)
+
+        if faltando:
+            nomes = Produto.objects.filter(pk__in=faltando).order_by('nome').values_list('nome', flat=True)
+            # Sai da transação com exceção: os UPDATEs já feitos no lote são desfeitos
+            raise EstoqueInsuficiente(
+                'Estoque insuficiente para: %(produtos)s.', code='estoque_insuficiente',
+                params={'produtos': ', '.join(nomes) or ', '.join(f'#{pk}' for pk in faltando)},
+            )
+
+        return MovimentoEstoque.objects.bulk_create(movimentos)
@@ -1,3 +1,391 @@
-from django.test import TestCase
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import User
+from . import autocomplete, codigos, movimentos
+from .models import Categoria, MovimentoEstoque, Produto
+
+
+class ConsultaCodigoTests(TestCase):
+    """
+    Leitura de código de barras: consulta exata e cache do processo.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        categoria = Categoria.objects.create(nome='Câmeras')
+        cls.camera = Produto.objects.create(
+            categoria=categoria, nome='Câmera IP', codigo_barras='7891234567895',
+            referencia_fabricante='CAM-100', preco_venda=Decimal('250.00'),
+        )
+        cls.cabo = Produto.objects.create(categoria=categoria, nome='Cabo UTP', referencia_fabricante='UTP-5E')
+
+    def setUp(self):
+        codigos._buscar.cache_clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def test_por_codigo_de_barras_e_fabricante(self):
+        self.assertEqual([p['id'] for p in codigos.consultar(' 7891234567895 ')], [self.camera.pk])
+        self.assertEqual([p['id'] for p in codigos.consultar('UTP-5E')], [self.cabo.pk])
+        self.assertEqual(codigos.consultar('000'), [])
+
+    def test_leitura_repetida_nao_consulta_o_banco(self):
+        codigos.consultar('7891234567895')
+        with self.assertNumQueries(0):
+            self.assertEqual(codigos.consultar('7891234567895')[0]['nome'], 'Câmera IP')
+
+    def test_salvar_produto_invalida(self):
+        codigos.consultar('7891234567895')
+        self.camera.nome = 'Câmera IP Full HD'
+        self.camera.save()
+        self.assertEqual(codigos.consultar('7891234567895')[0]['nome'], 'Câmera IP Full HD')
+
+    def test_alteracao_em_outro_processo(self):
+        codigos.consultar('7891234567895')
+        # Outro processo salvou um produto: só o contador compartilhado mudou
+        cache.incr(codigos.GERACAO_KEY)
+        codigos._estado.update(verificar_em=0)
+        with self.assertNumQueries(1):
+            codigos.consultar('7891234567895')
+
+    def test_leitura_expira_sem_cache_compartilhado(self):
+        codigos.consultar('7891234567895')
+        with mock.patch('estoque.codigos.time.monotonic', return_value=time.monotonic() + codigos.VALIDADE_SEGUNDOS):
+            with self.assertNumQueries(1):
+                codigos.consultar('7891234567895')
+
+    def test_cache_limitado(self):
+        for indice in range(codigos.MAXIMO_CODIGOS + 10):
+            codigos.consultar(f'inexistente-{indice}')
+        self.assertEqual(codigos._buscar.cache_info().currsize, codigos.MAXIMO_CODIGOS)
+
+    def test_api(self):
+        resposta = self.api.get('/estoque/api/codigo/7891234567895/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['produtos'][0]['preco_venda'], '250.00')
+
+        self.assertEqual(self.api.get('/estoque/api/codigo/nao-existe/').status_code, 404)
+
+    def test_admin_busca_pelo_codigo(self):
+        request = RequestFactory().get('/admin/estoque/produto/', {'q': 'CAM-100'})
+        request.user = self.admin
+        changelist = site._registry[Produto].get_changelist_instance(request)
+
+        self.assertEqual(list(changelist.result_list), [self.camera])
+        self.assertNotIn('LIKE', str(changelist.queryset.query))
+
+
+class AutocompleteProdutoTests(TestCase):
+    """
+    Autocomplete dos itens do orçamento: prefixo por palavra, cache e resposta enxuta.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        categoria = Categoria.objects.create(nome='Câmeras')
+        cls.camera = Produto.objects.create(categoria=categoria, nome='Câmera IP Intelbras', referencia_fabricante='VIP-1230')
+        cls.dvr = Produto.objects.create(categoria=categoria, nome='DVR 8 Canais', codigo_barras='7890000000017')
+        cls.cabo = Produto.objects.create(categoria=categoria, nome='Cabo coaxial para câmera')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def _ids(self, termo, pagina=1):
+        return [pk for pk, _texto, _palavras in autocomplete.buscar(termo, pagina)['itens']]
+
+    def test_prefixo_de_cada_palavra(self):
+        self.assertEqual(self._ids('cam'), [self.cabo.pk, self.camera.pk])
+        self.assertEqual(self._ids('CÂM intel'), [self.camera.pk])
+        self.assertEqual(self._ids('vip 1230'), [self.camera.pk])
+        self.assertEqual(self._ids('78900'), [self.dvr.pk])
+        self.assertEqual(self._ids('mera'), [])
+
+    def test_consulta_mais_longa_reaproveita_o_cache(self):
+        self._ids('ca')
+        with self.assertNumQueries(0):
+            self.assertEqual(self._ids('camera ip'), [self.camera.pk])
+            self.assertEqual(self._ids('cabo'), [self.cabo.pk])
+
+    def test_salvar_produto_descarta_o_cache(self):
+        self._ids('cam')
+        self.cabo.nome = 'Cabo de rede'
+        self.cabo.save()
+
+        self.assertEqual(self._ids('cam'), [self.camera.pk])
+        self.assertEqual(set(self.cabo.palavras.values_list('palavra', flat=True)), {'cabo', 'de', 'rede'})
+
+    def test_termo_longo_nao_vai_cru_para_a_chave(self):
+        termo = 'câmera ' * 60
+        with mock.patch('estoque.autocomplete.cache.set', wraps=cache.set) as gravar:
+            self.assertEqual(self._ids(termo), [self.cabo.pk, self.camera.pk])
+        chave = gravar.call_args.args[0]
+        self.assertLess(len(chave), 250)
+        self.assertNotIn('camera', chave)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._ids(termo), [self.cabo.pk, self.camera.pk])
+
+    def test_paginacao(self):
+        categoria = self.camera.categoria
+        for indice in range(autocomplete.POR_PAGINA + 5):
+            Produto.objects.create(categoria=categoria, nome=f'Conector {indice:02d}')
+
+        primeira = autocomplete.buscar('conector')
+        self.assertTrue(primeira['mais'])
+        self.assertEqual(len(primeira['itens']), autocomplete.POR_PAGINA)
+        # "mais" na consulta curta: a mais longa vai ao banco
+        self.assertEqual(len(self._ids('conector 0')), 10)
+        self.assertEqual(len(self._ids('conector', pagina=2)), 5)
+
+    def test_view_do_admin(self):
+        resposta = self.client.get(reverse('admin:estoque_produto_autocomplete'), {'term': 'dvr'})
+
+        self.assertEqual(resposta.json(), {
+            'results': [{'id': str(self.dvr.pk), 'text': 'DVR 8 Canais (Produto Físico)'}],
+            'pagination': {'more': False},
+        })
+
+    def test_inline_do_orcamento_usa_a_view(self):
+        resposta = self.client.get(reverse('admin:servicos_orcamento_add'))
+        self.assertContains(resposta, reverse('admin:estoque_produto_autocomplete'))
+
+
+class AlertasEstoqueTests(TestCase):
+    """
+    Estoque baixo e produto antigo calculados no banco: filtros, ordenação e relatório.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        cls.categoria = Categoria.objects.create(nome='Câmeras')
+        cls.baixo = Produto.objects.create(categoria=cls.categoria, nome='Cabo UTP', quantidade=2, estoque_minimo=5)
+        cls.ok = Produto.objects.create(categoria=cls.categoria, nome='Câmera IP', quantidade=20, estoque_minimo=5)
+        cls.servico = Produto.objects.create(categoria=cls.categoria, nome='Instalação', tipo=Produto.Tipo.SERVICO)
+        cls.antigo = Produto.objects.create(categoria=cls.categoria, nome='DVR antigo', quantidade=9, estoque_minimo=1)
+        Produto.objects.filter(pk__in=[cls.antigo.pk, cls.servico.pk]).update(
+            data_cadastro=timezone.now() - timedelta(days=800)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _changelist(self, parametros):
+        resposta = self.client.get(reverse('admin:estoque_produto_changelist'), parametros)
+        return list(resposta.context['cl'].result_list)
+
+    def test_anotacoes_e_filtros(self):
+        self.assertEqual(list(Produto.objects.estoque_baixo()), [self.baixo])
+        self.assertEqual(list(Produto.objects.antigos()), [self.antigo])
+
+        anotados = {p.pk: (p.em_estoque_baixo, p.em_estoque_antigo) for p in Produto.objects.com_alertas()}
+        self.assertEqual(anotados[self.baixo.pk], (True, False))
+        self.assertEqual(anotados[self.servico.pk], (False, False))
+        self.assertEqual(anotados[self.antigo.pk], (False, True))
+        self.assertTrue(Produto.objects.get(pk=self.antigo.pk).alerta_promocao)
+
+    def test_filtros_e_ordenacao_no_admin(self):
+        self.assertEqual(self._changelist({'nivel_estoque': 'baixo'}), [self.baixo])
+        self.assertEqual(self._changelist({'idade_estoque': 'antigo'}), [self.antigo])
+        self.assertEqual(set(self._changelist({'idade_estoque': 'recente'})), {self.baixo, self.ok})
+
+        # Coluna "Status Estoque" (8ª) ordenada pela folga: mais críticos primeiro
+        ordenados = self._changelist({'o': '8', 'tipo__exact': 'P'})
+        self.assertEqual(ordenados, [self.baixo, self.antigo, self.ok])
+
+    def test_relatorio_em_uma_consulta(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            resposta = api.get('/estoque/api/estoque-baixo/')
+
+        self.assertEqual(resposta.json(), {'produtos': [{
+            'id': self.baixo.pk, 'nome': 'Cabo UTP', 'quantidade': 2, 'reservado': 0,
+            'estoque_minimo': 5, 'local_fisico': None,
+        }], 'mais': False})
+
+    def test_relatorio_usa_o_indice_parcial(self):
+        Produto.objects.bulk_create([
+            Produto(categoria=self.categoria, nome=f'Produto {indice:05d}', quantidade=indice % 50, estoque_minimo=2)
+            for indice in range(3000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        plano = Produto.objects.estoque_baixo().order_by('nome', 'id').explain()
+        self.assertIn('produto_estoque_baixo_idx', plano)
+        self.assertNotIn('TEMP B-TREE', plano)
+
+
+class MovimentoEstoqueTests(TestCase):
+    """
+    Razão do estoque: saldo atualizado no banco, lote tudo-ou-nada e saldo protegido no save().
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha')
+        categoria = Categoria.objects.create(nome='Câmeras')
+        cls.camera = Produto.objects.create(categoria=categoria, nome='Câmera IP', quantidade=10)
+        cls.cabo = Produto.objects.create(categoria=categoria, nome='Cabo UTP', quantidade=3)
+
+    def _saldo(self, produto):
+        produto.refresh_from_db()
+        return produto.quantidade, produto.reservado
+
+    def test_lote_com_varios_produtos(self):
+        Tipo = MovimentoEstoque.Tipo
+        with self.assertNumQueries(5):  # savepoint e release, um UPDATE por produto, um INSERT
+            movimentos.movimentar([
+                MovimentoEstoque(produto=self.camera, tipo=Tipo.RESERVA, quantidade=4),
+                MovimentoEstoque(produto=self.cabo, tipo=Tipo.ENTRADA, quantidade=7),
+                MovimentoEstoque(produto=self.camera, tipo=Tipo.BAIXA, quantidade=1),
+            ])
+        self.assertEqual(self._saldo(self.camera), (9, 3))
+        self.assertEqual(self._saldo(self.cabo), (10, 0))
+        self.assertEqual(self.camera.movimentos.count(), 2)
+
+    def test_saldo_insuficiente_nao_grava_nada(self):
+        Tipo = MovimentoEstoque.Tipo
+        with self.assertRaises(movimentos.EstoqueInsuficiente) as contexto:
+            movimentos.movimentar([
+                MovimentoEstoque(produto=self.camera, tipo=Tipo.SAIDA, quantidade=2),
+                MovimentoEstoque(produto=self.cabo, tipo=Tipo.RESERVA, quantidade=4),
+            ])
+        self.assertIn('Cabo UTP', contexto.exception.messages[0])
+        self.assertEqual(self._saldo(self.camera), (10, 0))
+        self.assertFalse(MovimentoEstoque.objects.exists())
+
+        # Sem verificação (baixa de peça já usada), o saldo pode ficar negativo
+        movimentos.movimentar([MovimentoEstoque(produto=self.cabo, tipo=Tipo.SAIDA, quantidade=4)], verificar_saldo=False)
+        self.assertEqual(self._saldo(self.cabo), (-1, 0))
+
+    def test_save_de_copia_antiga_nao_sobrescreve_o_saldo(self):
+        antigo = Produto.objects.get(pk=self.camera.pk)
+        movimentos.movimentar([MovimentoEstoque(produto=self.camera, tipo=MovimentoEstoque.Tipo.SAIDA, quantidade=4)])
+
+        antigo.preco_venda = Decimal('199.90')
+        antigo.save()
+        self.assertEqual(self._saldo(self.camera), (6, 0))
+        self.camera.refresh_from_db()
+        self.assertEqual(self.camera.preco_venda, Decimal('199.90'))
+
+    def test_lancamento_manual_no_admin(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:estoque_movimentoestoque_add')
+
+        resposta = self.client.post(url, {'produto': self.cabo.pk, 'tipo': 'S', 'quantidade': 5, 'observacao': ''})
+        self.assertContains(resposta, 'Estoque disponível de Cabo UTP: 3.')
+
+        self.client.post(url, {'produto': self.cabo.pk, 'tipo': 'E', 'quantidade': 5, 'observacao': 'Compra'})
+        self.assertEqual(self._saldo(self.cabo), (8, 0))
+        self.assertEqual(MovimentoEstoque.objects.get().usuario, self.admin)
+
+
+class ConcorrenciaEstoqueTests(TransactionTestCase):
+    """
+    Vários processos movimentando os mesmos produtos ao mesmo tempo.
+
+    No SQLite dos testes as escritas são serializadas pelo próprio banco (o lock
+    compartilhado devolve "locked" e a transação é repetida); no PostgreSQL o UPDATE
+    condicional bloqueia só a linha do produto. Nos dois casos nenhuma baixa se perde.
+    """
+    THREADS = 10
+    LOTES = 20
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nome='Câmeras')
+        self.produtos = [
+            Produto.objects.create(categoria=categoria, nome=f'Produto {indice}', quantidade=1000)
+            for indice in range(3)
+        ]
+
+    def _em_paralelo(self, trabalho):
+        erros = []
+
+        def executar(indice):
+            try:
+                trabalho(indice)
+            except Exception as erro:  # noqa: BLE001 - repassado para a thread do teste
+                erros.append(erro)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=executar, args=(indice,)) for indice in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(erros, [])
+
+    def _repetindo(self, funcao):
+        while True:
+            try:
+                return funcao()
+            except OperationalError as erro:
+                if 'locked' not in str(erro):
+                    raise
+
+    def test_sem_baixas_perdidas(self):
+        def trabalho(indice):
+            aleatorio = random.Random(indice)
+            for _ in range(self.LOTES):
+                # Produtos em ordem aleatória no lote: movimentar() ordena os UPDATEs
+                lote = [
+                    MovimentoEstoque(produto=produto, tipo=MovimentoEstoque.Tipo.SAIDA, quantidade=1)
+                    for produto in aleatorio.sample(self.produtos, len(self.produtos))
+                ]
+                self._repetindo(lambda: movimentos.movimentar(lote))
+
+        self._em_paralelo(trabalho)
+
+        esperado = 1000 - self.THREADS * self.LOTES
+        for produto in self.produtos:
+            produto.refresh_from_db()
+            self.assertEqual(produto.quantidade, esperado)
+            self.assertEqual(produto.movimentos.count(), self.THREADS * self.LOTES)
+
+    def test_reservas_disputando_o_ultimo_estoque(self):
+        Produto.objects.filter(pk=self.produtos[0].pk).update(quantidade=5)
+        reservas = []
+
+        def trabalho(indice):
+            movimento = MovimentoEstoque(produto=self.produtos[0], tipo=MovimentoEstoque.Tipo.RESERVA, quantidade=1)
+            try:
+                self._repetindo(lambda: movimentos.movimentar([movimento]))
+                reservas.append(indice)
+            except movimentos.EstoqueInsuficiente:
+                pass
+
+        self._em_paralelo(trabalho)
+
+        self.produtos[0].refresh_from_db()
+        self.assertEqual(len(reservas), 5)
+        self.assertEqual((self.produtos[0].reservado, self.produtos[0].disponivel), (5, 0))
+
+    def test_so_a_linha_do_produto_e_bloqueada(self):
+        with CaptureQueriesContext(connection) as consultas:
+            movimentos.movimentar([MovimentoEstoque(produto=self.produtos[0], tipo=MovimentoEstoque.Tipo.SAIDA, quantidade=1)])
+
+        sqls = [consulta['sql'] for consulta in consultas]
+        self.assertFalse([sql for sql in sqls if 'FOR UPDATE' in sql or 'LOCK' in sql.upper()])
+        update = next(sql for sql in sqls if sql.startswith('UPDATE'))
+        self.assertIn('"estoque_produto"."id" = %s' % self.produtos[0].pk, update)
+        self.assertNotIn('SELECT', update)
@@ -1,6 +1,9 @@
 from django.urls import path
-from . import views
+from . import api_views, views
 
 urlpatterns = [
     path('', views.produto_list, name='produto_list'),
+    path('api/codigo/<str:codigo>/', api_views.ProdutoPorCodigoView.as_view(), name='api_produto_codigo'),
+    path('api/estoque-baixo/', api_views.EstoqueBaixoView.as_view(), name='api_estoque_baixo'),
+    path('exportar/<str:formato>/', views.exportar_produtos, name='exportar_produtos'),
 ]
\ No newline at end of file
@@ -1,8 +1,16 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from . import exportacao
 from .models import Produto
 
 @login_required
 def produto_list(request):
     produtos = Produto.objects.all()
-    return render(request, 'estoque/produto_list.html', {'produtos': produtos})
\ No newline at end of file
+    return render(request, 'estoque/produto_list.html', {'produtos': produtos})
+
+
+@staff_member_required
+def exportar_produtos(request, formato):
+    """Todos os produtos em CSV ou NDJSON (streaming)."""
+    return exportacao.exportar_produtos(None, formato)
@@ -0,0 +1,12 @@
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.urls import reverse
+
+
+class ProdutoAutocompleteSelect(AutocompleteSelect):
+    """
+    Autocomplete de produto que consulta a view própria do ProdutoAdmin
+    (índice de palavras + cache, ver estoque/autocomplete.py) em vez da view genérica do admin.
+    """
+
+    def get_url(self):
+        return reverse(f'{self.admin_site.name}:estoque_produto_autocomplete')
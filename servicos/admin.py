@@ -1,7 +1,30 @@
+from django import forms
 from django.contrib import admin
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Orcamento, ItemOrcamento, OrdemServico
+from core.exportacao import acao_exportacao
+from estoque.movimentos import EstoqueInsuficiente
+from estoque.widgets import ProdutoAutocompleteSelect
+from .models import Orcamento, ItemOrcamento, OrdemServico, TarefaPDF, TipoDocumento
+from . import exportacao, lote, services
+
+
+def resposta_zip(request, documentos, prefixo):
+    """
+    Devolve o ZIP de PDFs em streaming, à medida que os documentos ficam prontos.
+    """
+    conteudo = lote.gerar_zip(documentos, base_url=request.build_absolute_uri('/'))
+    response = StreamingHttpResponse(conteudo, content_type='application/zip')
+    filename = f"{prefixo}_{timezone.localdate():%Y%m%d}.zip"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _lista_ids(ids):
+    return ', '.join(f'#{pk}' for pk in ids)
 
 
 # 1. Primeiro definimos o Inline (Itens do Orçamento)
@@ -11,6 +34,12 @@ class ItemOrcamentoInline(admin.TabularInline):
     autocomplete_fields = ['produto']
     readonly_fields = ('subtotal',)
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # Autocomplete próprio de produtos (índice de palavras + cache)
+        if db_field.name == 'produto':
+            kwargs['widget'] = ProdutoAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 # 2. Depois definimos o Admin do Orçamento (que usa o Inline acima)
 class OrcamentoAdmin(admin.ModelAdmin):
@@ -18,7 +47,11 @@ class OrcamentoAdmin(admin.ModelAdmin):
     list_filter = ('status', 'validade')
     search_fields = ('cliente__nome', 'id')
     inlines = [ItemOrcamentoInline]  # <--- Aqui ele chama a classe definida acima
-    actions = ['marcar_aprovado', 'gerar_os']
+    actions = [
+        'marcar_aprovado', 'gerar_os', 'exportar_pdfs',
+        acao_exportacao(exportacao.exportar_orcamentos, 'csv'),
+        acao_exportacao(exportacao.exportar_orcamentos, 'ndjson'),
+    ]
 
     readonly_fields = ('valor_bruto', 'valor_total', 'botao_imprimir_formulario')
 
@@ -58,51 +91,98 @@ class OrcamentoAdmin(admin.ModelAdmin):
 
     @admin.action(description='Aprovar Orçamentos Selecionados')
     def marcar_aprovado(self, request, queryset):
-        queryset.update(status=Orcamento.Status.APROVADO)
+        try:
+            aprovados = services.aprovar_orcamentos(queryset.values_list('id', flat=True), request.user)
+        except EstoqueInsuficiente as erro:
+            self.message_user(request, f"Nenhum orçamento aprovado. {erro.messages[0]}", level='error')
+            return
+        self.message_user(request, f"{len(aprovados)} orçamento(s) aprovado(s) com estoque reservado.", level='success')
 
     @admin.action(description='Gerar OS a partir do Orçamento (Aprovados)')
     def gerar_os(self, request, queryset):
-        for orcamento in queryset:
-            if orcamento.status != Orcamento.Status.APROVADO:
-                self.message_user(request, f"Orçamento #{orcamento.id} não está Aprovado. Ignorado.", level='warning')
-                continue
-
-            if OrdemServico.objects.filter(orcamento_origem=orcamento).exists():
-                self.message_user(request, f"Orçamento #{orcamento.id} já gerou OS. Ignorado.", level='error')
-                continue
-
-            OrdemServico.objects.create(
-                orcamento_origem=orcamento,
-                cliente=orcamento.cliente,
-                descricao_problema=f"Serviço derivado do Orçamento #{orcamento.id}. \nCondições: {orcamento.observacoes}",
-                status=OrdemServico.Status.PENDENTE,
-                tecnico=request.user,
-                # Copia valores financeiros iniciais
-                valor_bruto=orcamento.valor_bruto,
-                desconto=orcamento.desconto,
-                valor_total=orcamento.valor_total
-            )
+        resultado = services.gerar_os_de_orcamentos(queryset.values_list('id', flat=True), request.user)
 
-            orcamento.status = Orcamento.Status.CONVERTIDO
-            orcamento.save()
+        if resultado['nao_aprovados']:
+            self.message_user(request, f"Orçamento(s) não aprovado(s), ignorado(s): {_lista_ids(resultado['nao_aprovados'])}.", level='warning')
+        if resultado['ja_convertidos']:
+            self.message_user(request, f"Orçamento(s) que já geraram OS, ignorado(s): {_lista_ids(resultado['ja_convertidos'])}.", level='error')
+        if resultado['convertidos']:
+            orcamentos = _lista_ids(orcamento_id for orcamento_id, _os_id in resultado['convertidos'])
+            self.message_user(request, f"OS gerada(s) com sucesso para o(s) Orçamento(s) {orcamentos}!", level='success')
 
-            self.message_user(request, f"OS gerada com sucesso para Orçamento #{orcamento.id}!", level='success')
+    @admin.action(description='Exportar PDFs selecionados (ZIP)')
+    def exportar_pdfs(self, request, queryset):
+        ids = queryset.order_by('id').values_list('id', flat=True)
+        documentos = [(TipoDocumento.ORCAMENTO, pk) for pk in ids]
+        return resposta_zip(request, documentos, 'orcamentos')
 
     def save_related(self, request, form, formsets, change):
-        super().save_related(request, form, formsets, change)
+        # Cada item salvo pede a atualização dos totais; o bloco junta tudo num único UPDATE.
+        # Num orçamento aprovado, aumentar um item reserva a diferença: sem estoque, os itens não são gravados
+        try:
+            with transaction.atomic(), Orcamento.adiando_totais():
+                super().save_related(request, form, formsets, change)
+        except EstoqueInsuficiente as erro:
+            for formset in formsets:
+                formset.new_objects, formset.changed_objects, formset.deleted_objects = [], [], []
+            self.message_user(request, f"Itens não alterados. {erro.messages[0]}", level='error')
+
         obj = form.instance
-        # Recalcula bruto somando os itens
-        total_itens = sum(item.subtotal for item in obj.itens.all())
-        obj.valor_bruto = total_itens
-        # Salva novamente para acionar a lógica de (Bruto - Desconto = Total) do model
-        obj.save()
+        if 'status' not in form.changed_data:
+            return
+        if obj.status == Orcamento.Status.APROVADO:
+            # Itens já gravados: reserva o estoque (ou volta o status se faltar produto)
+            try:
+                services.reservar_estoque([obj.pk], request.user)
+            except EstoqueInsuficiente as erro:
+                anterior = form.initial.get('status', Orcamento.Status.RASCUNHO)
+                Orcamento.objects.filter(pk=obj.pk).update(status=anterior)
+                obj.status = anterior
+                self.message_user(request, f"Orçamento não aprovado. {erro.messages[0]}", level='error')
+        elif obj.status == Orcamento.Status.REJEITADO:
+            services.liberar_reserva([obj.pk], request.user, observacao=f'Orçamento #{obj.pk} rejeitado')
+
+
+class OrdemServicoAdminForm(forms.ModelForm):
+    # Versão da OS quando o formulário foi aberto: se o app (ou outra pessoa) alterou
+    # a OS nesse meio tempo, a gravação é recusada em vez de sobrescrever a alteração
+    versao_carregada = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = OrdemServico
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['versao_carregada'].initial = self.instance.versao
+
+    def clean(self):
+        dados = super().clean()
+        if self.instance.pk:
+            # Bloqueia a linha até o fim da transação do admin: ninguém grava entre a checagem e o save
+            atual = (
+                OrdemServico.objects.select_for_update()
+                .filter(pk=self.instance.pk).values_list('versao', flat=True).first()
+            )
+            if dados.get('versao_carregada') != atual:
+                raise forms.ValidationError(
+                    'Esta OS foi alterada enquanto você editava. Recarregue a página para ver a versão atual.'
+                )
+        return dados
 
 
 class OrdemServicoAdmin(admin.ModelAdmin):
+    form = OrdemServicoAdminForm
     list_display = ('id', 'cliente', 'tecnico', 'status', 'valor_total', 'botao_imprimir')  # Adicionei o botão aqui
     list_filter = ('status', 'tecnico', 'data_abertura')
     search_fields = ('cliente__nome', 'descricao_problema', 'id')
     autocomplete_fields = ['cliente', 'tecnico']
+    actions = [
+        'exportar_pdfs',
+        acao_exportacao(exportacao.exportar_ordens, 'csv'),
+        acao_exportacao(exportacao.exportar_ordens, 'ndjson'),
+    ]
 
     readonly_fields = ('valor_bruto', 'valor_total', 'sincronizado', 'botao_imprimir_formulario')
 
@@ -120,7 +200,7 @@ class OrdemServicoAdmin(admin.ModelAdmin):
             'fields': ('botao_imprimir_formulario',)
         }),
         ('Datas e Controle', {
-            'fields': ('data_finalizacao', 'sincronizado'),
+            'fields': ('data_finalizacao', 'sincronizado', 'versao_carregada'),
         }),
     )
 
@@ -152,6 +232,31 @@ class OrdemServicoAdmin(admin.ModelAdmin):
         return "Salve antes de imprimir"
 
     botao_imprimir_formulario.short_description = 'Documentos'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'status' in form.changed_data:
+            services.movimentar_estoque_da_os(obj, request.user)
+
+    @admin.action(description='Exportar OS + Termos de Garantia selecionados (ZIP)')
+    def exportar_pdfs(self, request, queryset):
+        ids = queryset.order_by('id').values_list('id', flat=True)
+        return resposta_zip(request, lote.documentos_de_os(ids), 'ordens_servico')
+
+
+class TarefaPDFAdmin(admin.ModelAdmin):
+    """
+    Acompanhamento da fila de PDFs (somente leitura: quem cria as tarefas são as views).
+    """
+    list_display = ('id', 'tipo', 'objeto_id', 'status', 'solicitado_por', 'criado_em', 'concluido_em')
+    list_filter = ('status', 'tipo')
+    readonly_fields = [field.name for field in TarefaPDF._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
 # 3. Registra tudo no final
 admin.site.register(Orcamento, OrcamentoAdmin)
-admin.site.register(OrdemServico, OrdemServicoAdmin)
\ No newline at end of file
+admin.site.register(OrdemServico, OrdemServicoAdmin)
+admin.site.register(TarefaPDF, TarefaPDFAdmin)
\ No newline at end of file
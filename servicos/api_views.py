@@ -1,6 +1,35 @@
-from rest_framework import viewsets
-from .models import OrdemServico
-from .serializers import OrdemServicoSerializer
+from django.db.models import Prefetch
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from clientes import busca
+from clientes.models import Cliente
+from . import condicional, services, sincronizacao
+from .models import OrdemServico, ItemOrcamento, RegistroAlteracao
+from .pagination import OrdemServicoPagination
+from .serializers import (
+    AtualizacaoOfflineSerializer, ClienteSerializer, ItemSyncSerializer, OrdemServicoResumoSerializer,
+    OrdemServicoSerializer, OrdemServicoSyncSerializer, ler_campos
+)
+
+# Colunas que cada campo da API precisa: o resto não entra no SELECT (only)
+COLUNAS_POR_CAMPO = {
+    'id': ['id'],
+    'status': ['status'],
+    'data_abertura': ['data_abertura'],
+    'descricao_problema': ['descricao_problema'],
+    'laudo_tecnico': ['laudo_tecnico'],
+    'valor_total': ['valor_total'],
+    'versao': ['versao'],
+    'tecnico_nome': ['tecnico__first_name', 'tecnico__last_name'],
+    'cliente_nome': ['cliente__nome'],
+}
+
+# Máximo de alterações por envio em lote do app
+LIMITE_LOTE = 500
 
 
 class OrdemServicoViewSet(viewsets.ReadOnlyModelViewSet):
@@ -8,8 +37,207 @@ class OrdemServicoViewSet(viewsets.ReadOnlyModelViewSet):
     API para listar e ver detalhes das OS no celular.
     ReadOnlyModelViewSet = O celular pode ler (GET), mas ainda não pode apagar.
     """
-    queryset = OrdemServico.objects.all().order_by('-data_abertura')
+    # Carrega cliente, técnico e itens (com produto) de uma vez para a página inteira:
+    # o número de consultas não cresce com a quantidade de OS por página.
+    queryset = OrdemServico.objects.select_related(
+        'cliente', 'tecnico', 'orcamento_origem'
+    ).prefetch_related(
+        Prefetch('orcamento_origem__itens', queryset=ItemOrcamento.objects.select_related('produto'))
+    ).order_by('-data_abertura', '-id')
     serializer_class = OrdemServicoSerializer
+    pagination_class = OrdemServicoPagination
 
     # Permite filtrar por status (ex: só as PENDENTES)
-    filterset_fields = ['status', 'cliente__nome']
\ No newline at end of file
+    filterset_fields = ['status', 'cliente__nome']
+
+    def campos_solicitados(self):
+        """Árvore do ?fields=... (ex: id,status,cliente.nome) ou None para todos os campos."""
+        return ler_campos(self.request.query_params.get('fields')) or None
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.request.query_params.get('formato') == 'resumo':
+            return OrdemServicoResumoSerializer
+        return OrdemServicoSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('campos', self.campos_solicitados())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        """
+        Sem ?fields e no formato completo, usa o queryset padrão. Caso contrário,
+        carrega só as colunas e relações que a resposta vai usar.
+        """
+        campos = self.campos_solicitados()
+        serializer_class = self.get_serializer_class()
+        if campos is None and serializer_class is OrdemServicoSerializer:
+            return super().get_queryset()
+        if campos is None:
+            campos = {nome: {} for nome in serializer_class.Meta.fields}
+
+        # data_abertura e id sempre: são a ordenação (e o cursor da paginação)
+        colunas = ['id', 'data_abertura']
+        queryset = OrdemServico.objects.order_by('-data_abertura', '-id')
+        for nome, subcampos in campos.items():
+            colunas += COLUNAS_POR_CAMPO.get(nome, [])
+            if nome == 'cliente':
+                campos_cliente = [c for c in ClienteSerializer.Meta.fields if not subcampos or c in subcampos]
+                colunas += [f'cliente__{campo}' for campo in campos_cliente]
+            elif nome == 'itens':
+                colunas.append('orcamento_origem__id')
+                queryset = queryset.prefetch_related(
+                    Prefetch('orcamento_origem__itens', queryset=ItemOrcamento.objects.select_related('produto'))
+                )
+
+        relacoes = {coluna.split('__')[0] for coluna in colunas if '__' in coluna}
+        if relacoes:
+            queryset = queryset.select_related(*relacoes)
+        return queryset.only(*colunas)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        # ?busca=: OS dos clientes encontrados pela busca indexada (nome, documento, telefone, e-mail)
+        termo = self.request.query_params.get('busca', '').strip()
+        if termo:
+            queryset = queryset.filter(busca.filtro(termo, 'cliente__'))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        marcador = condicional.marcador_lista_os(request)
+        nao_modificado = condicional.resposta_nao_modificada(request, marcador)
+        if nao_modificado is not None:
+            return nao_modificado
+        return condicional.aplicar_cabecalhos(super().list(request, *args, **kwargs), marcador)
+
+    def retrieve(self, request, *args, **kwargs):
+        marcador = condicional.marcador_os(self.kwargs['pk'])
+        nao_modificado = condicional.resposta_nao_modificada(request, marcador)
+        if nao_modificado is not None:
+            return nao_modificado
+        return condicional.aplicar_cabecalhos(super().retrieve(request, *args, **kwargs), marcador)
+
+    @action(detail=False, methods=['post'], url_path='lote')
+    def lote(self, request):
+        """
+        Envio das alterações feitas offline: POST /servicos/api/ordens/lote/ com
+        {"atualizacoes": [{"id": 1, "versao": 3, "status": "FINALIZADO", "laudo_tecnico": "..."}]}.
+
+        Tudo é gravado numa única transação. Cada registro volta com seu resultado:
+        "aplicado" (com a nova versão), "conflito" (a OS mudou no servidor: volta a
+        versão atual para o app resolver), "nao_encontrada", "proibida" (OS de outro
+        técnico) ou "invalido".
+
+        O técnico altera só as OS em que é o responsável; quem tem a permissão
+        servicos.change_ordemservico altera qualquer uma.
+        """
+        usuario = request.user
+        if usuario.role != usuario.Role.TECNICO and not usuario.has_perm('servicos.change_ordemservico'):
+            raise PermissionDenied('Sem permissão para alterar OS.')
+        atualizacoes = request.data.get('atualizacoes') if isinstance(request.data, dict) else request.data
+        if not isinstance(atualizacoes, list):
+            raise ValidationError({'atualizacoes': 'Envie uma lista de alterações.'})
+        if len(atualizacoes) > LIMITE_LOTE:
+            raise ValidationError({'atualizacoes': f'Máximo de {LIMITE_LOTE} alterações por envio.'})
+
+        validacoes = [AtualizacaoOfflineSerializer(data=dados) for dados in atualizacoes]
+        validas = [serializer.validated_data for serializer in validacoes if serializer.is_valid()]
+        aplicadas = iter(services.aplicar_atualizacoes_lote(validas, usuario) if validas else [])
+
+        resposta = []
+        for dados, serializer in zip(atualizacoes, validacoes):
+            if serializer.errors:
+                resposta.append({
+                    'id': dados.get('id') if isinstance(dados, dict) else None,
+                    'resultado': 'invalido',
+                    'erros': serializer.errors,
+                })
+                continue
+            resultado, os_obj = next(aplicadas)
+            linha = {'id': serializer.validated_data['id'], 'resultado': resultado}
+            if resultado == 'aplicado':
+                linha['versao'] = os_obj.versao
+            elif resultado == 'conflito':
+                linha['versao_atual'] = os_obj.versao
+                linha['status'] = os_obj.status
+                linha['laudo_tecnico'] = os_obj.laudo_tecnico
+            resposta.append(linha)
+
+        return Response({'resultados': resposta}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='gerar')
+    def gerar(self, request):
+        """
+        Gera as OS dos orçamentos aprovados: POST /servicos/api/ordens/gerar/ com
+        {"orcamentos": [1, 2, 3]}. O usuário da requisição fica como técnico responsável.
+        """
+        if not request.user.has_perm('servicos.add_ordemservico'):
+            raise PermissionDenied('Sem permissão para gerar OS.')
+        ids = request.data.get('orcamentos') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            raise ValidationError({'orcamentos': 'Envie uma lista de ids de orçamentos.'})
+        if len(ids) > LIMITE_LOTE:
+            raise ValidationError({'orcamentos': f'Máximo de {LIMITE_LOTE} orçamentos por envio.'})
+
+        resultado = services.gerar_os_de_orcamentos(ids, request.user)
+        convertidos = [{'orcamento': orcamento_id, 'os': os_id} for orcamento_id, os_id in resultado['convertidos']]
+        return Response({
+            'convertidos': convertidos,
+            'nao_aprovados': resultado['nao_aprovados'],
+            'ja_convertidos': resultado['ja_convertidos'],
+        }, status=status.HTTP_201_CREATED if resultado['convertidos'] else status.HTTP_200_OK)
+
+
+class ClienteViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Clientes para o app. ?busca=<trecho de nome, documento, telefone ou e-mail>
+    usa o índice de busca e devolve os mais relevantes primeiro.
+    ?cpf_cnpj= e ?telefone= fazem consulta exata (com ou sem máscara).
+    """
+    queryset = Cliente.objects.order_by('nome', 'id')
+    serializer_class = ClienteSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset().only(*ClienteSerializer.Meta.fields)
+        params = self.request.query_params
+        if params.get('cpf_cnpj'):
+            queryset = queryset.filter(busca.filtro_documento(params['cpf_cnpj']))
+        if params.get('telefone'):
+            queryset = queryset.filter(busca.filtro_telefone(params['telefone']))
+        termo = params.get('busca', '').strip()
+        if termo:
+            queryset = busca.buscar(queryset, termo).order_by('-relevancia', 'nome', 'id')
+        return queryset
+
+
+class SincronizacaoView(APIView):
+    """
+    Sincronização incremental do app: GET /servicos/api/sync/?token=<último token>.
+    Devolve só as OS, itens e clientes criados/alterados/removidos desde o token,
+    mais o novo token. Sem token (ou token=0), devolve a base completa.
+    Enquanto "mais" for true, o app deve chamar de novo com o token recebido.
+    O token fica um pouco atrás das alterações mais recentes (ver
+    sincronizacao.JANELA_SEGURANCA): elas podem voltar repetidas e o app grava por id.
+    """
+
+    def get(self, request):
+        try:
+            token = int(request.query_params.get('token') or 0)
+        except ValueError:
+            raise ValidationError({'token': 'Token de sincronização inválido.'})
+
+        alteracoes = sincronizacao.alteracoes_desde(token)
+        ordens, itens, clientes = sincronizacao.carregar_registros(alteracoes['salvos'])
+        removidos = alteracoes['removidos']
+
+        return Response({
+            'token': str(alteracoes['token']),
+            'mais': alteracoes['mais'],
+            'ordens': OrdemServicoSyncSerializer(ordens, many=True).data,
+            'itens': ItemSyncSerializer(itens, many=True).data,
+            'clientes': ClienteSerializer(clientes, many=True).data,
+            'removidos': {
+                'ordens': sorted(removidos[RegistroAlteracao.Modelo.ORDEM_SERVICO]),
+                'itens': sorted(removidos[RegistroAlteracao.Modelo.ITEM_ORCAMENTO]),
+                'clientes': sorted(removidos[RegistroAlteracao.Modelo.CLIENTE]),
+            },
+        })
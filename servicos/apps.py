@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ServicosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'servicos'
+
+    def ready(self):
+        from . import indicadores, services, sincronizacao
+        sincronizacao.conectar_sinais()
+        indicadores.conectar_sinais()
+        services.conectar_sinais()
@@ -0,0 +1,121 @@
+"""
+Requisições condicionais (ETag / Last-Modified) para a API e os PDFs.
+
+O marcador de cada documento sai de uma única consulta leve (versões e datas de
+atualização do documento, do cliente, do técnico, do orçamento de origem e dos
+produtos, que também muda quando a categoria é renomeada), sem montar contexto,
+serializar ou renderizar nada.
+"""
+import hashlib
+
+from django.db.models import Max, Subquery
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from core.models import ConfiguracaoSistema
+from estoque.models import Produto
+from . import pdf
+from .models import Orcamento, OrdemServico, RegistroAlteracao, TipoDocumento
+
+
+def _hash(*partes):
+    return hashlib.sha256(repr(partes).encode('utf-8')).hexdigest()[:32]
+
+
+def _mais_recente(*datas):
+    datas = [data for data in datas if data is not None]
+    return max(datas) if datas else None
+
+
+def marcador_os(pk):
+    """
+    (etag, last_modified) da OS ou None se ela não existir.
+    """
+    linha = (
+        OrdemServico.objects
+        .filter(pk=pk)
+        .annotate(produtos_em=Max('orcamento_origem__itens__produto__atualizado_em'))
+        .values_list(
+            'versao', 'atualizado_em', 'cliente__atualizado_em',
+            'orcamento_origem__versao', 'orcamento_origem__atualizado_em', 'produtos_em',
+            'tecnico__username', 'tecnico__first_name', 'tecnico__last_name',
+        )
+        .first()
+    )
+    if linha is None:
+        return None
+    versao, atualizado_em, cliente_em, orcamento_versao, orcamento_em, produtos_em, *tecnico = linha
+    etag = _hash('os', pk, versao, atualizado_em, cliente_em, orcamento_versao, orcamento_em, produtos_em, tecnico)
+    return etag, _mais_recente(atualizado_em, cliente_em, orcamento_em, produtos_em)
+
+
+def marcador_orcamento(pk):
+    linha = (
+        Orcamento.objects
+        .filter(pk=pk)
+        .annotate(produtos_em=Max('itens__produto__atualizado_em'))
+        .values_list('versao', 'atualizado_em', 'cliente__atualizado_em', 'produtos_em')
+        .first()
+    )
+    if linha is None:
+        return None
+    versao, atualizado_em, cliente_em, produtos_em = linha
+    etag = _hash('orcamento', pk, versao, atualizado_em, cliente_em, produtos_em)
+    return etag, _mais_recente(atualizado_em, cliente_em, produtos_em)
+
+
+def marcador_lista_os(request):
+    """
+    Marcador de uma listagem: o último registro do log de sincronização muda sempre que
+    qualquer OS, item ou cliente é criado, alterado ou removido (e quando o técnico muda
+    de nome, ver sincronizacao.py); o produto alterado por último cobre produtos e
+    categorias. Uma consulta pelos índices, em vez de agregar a tabela de OS inteira.
+    """
+    produto_recente = Produto.objects.order_by('-atualizado_em').values('atualizado_em')[:1]
+    ultimo = (
+        RegistroAlteracao.objects.order_by('-id')
+        .values_list('id', 'criado_em', Subquery(produto_recente))
+        .first()
+    )
+    if ultimo is None:
+        ultimo = (0, None, produto_recente.values_list('atualizado_em', flat=True).first())
+    ultimo_id, criado_em, produtos_em = ultimo
+    return (
+        _hash('lista_os', request.get_full_path(), ultimo_id, produtos_em),
+        _mais_recente(criado_em, produtos_em),
+    )
+
+
+def marcador_pdf(tipo, pk):
+    """
+    Marcador do PDF = marcador do documento + configuração da empresa + versão do template.
+    """
+    marcador = marcador_orcamento(pk) if tipo == TipoDocumento.ORCAMENTO else marcador_os(pk)
+    if marcador is None:
+        return None
+    template_name = pdf.DOCUMENTOS[tipo][0]
+    etag = _hash(tipo, marcador[0], pdf.impressao_digital(template_name, ConfiguracaoSistema.carregar()))
+    return etag, marcador[1]
+
+
+def resposta_nao_modificada(request, marcador):
+    """
+    Devolve 304 (ou 412) se o cliente já tem a versão atual; senão None.
+    """
+    if marcador is None:
+        return None
+    etag, last_modified = marcador
+    return get_conditional_response(
+        request,
+        etag=quote_etag(etag),
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def aplicar_cabecalhos(response, marcador):
+    if marcador is not None and response.status_code == 200:
+        etag, last_modified = marcador
+        response['ETag'] = quote_etag(etag)
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,61 @@
+"""
+Exportação de OS e orçamentos (com itens) para a contabilidade. Ver core/exportacao.py.
+"""
+from django.db.models import Prefetch
+
+from core.exportacao import resposta_exportacao
+from .models import ItemOrcamento, Orcamento, OrdemServico
+
+COLUNAS_OS = [
+    ('id', 'id'),
+    ('status', 'status'),
+    ('data_abertura', 'data_abertura'),
+    ('data_finalizacao', 'data_finalizacao'),
+    ('cliente_id', 'cliente_id'),
+    ('cliente', 'cliente.nome'),
+    ('cliente_cpf_cnpj', 'cliente.cpf_cnpj'),
+    ('tecnico', 'tecnico.username'),
+    ('orcamento_origem_id', 'orcamento_origem_id'),
+    ('valor_bruto', 'valor_bruto'),
+    ('desconto', 'desconto'),
+    ('valor_total', 'valor_total'),
+    ('descricao_problema', 'descricao_problema'),
+    ('laudo_tecnico', 'laudo_tecnico'),
+]
+
+COLUNAS_ORCAMENTO = [
+    ('id', 'id'),
+    ('status', 'status'),
+    ('data_criacao', 'data_criacao'),
+    ('validade', 'validade'),
+    ('cliente_id', 'cliente_id'),
+    ('cliente', 'cliente.nome'),
+    ('cliente_cpf_cnpj', 'cliente.cpf_cnpj'),
+    ('valor_bruto', 'valor_bruto'),
+    ('desconto', 'desconto'),
+    ('valor_total', 'valor_total'),
+    ('observacoes', 'observacoes'),
+]
+
+COLUNAS_ITEM = [
+    ('id', 'id'),
+    ('produto_id', 'produto_id'),
+    ('produto', 'produto.nome'),
+    ('quantidade', 'quantidade'),
+    ('preco_unitario', 'preco_unitario'),
+    ('subtotal', 'subtotal'),
+]
+
+
+def exportar_ordens(queryset, formato):
+    queryset = OrdemServico.objects.all() if queryset is None else queryset
+    queryset = queryset.select_related('cliente', 'tecnico').order_by('id')
+    return resposta_exportacao(queryset, COLUNAS_OS, formato, 'ordens_servico')
+
+
+def exportar_orcamentos(queryset, formato):
+    queryset = Orcamento.objects.all() if queryset is None else queryset
+    queryset = queryset.select_related('cliente').prefetch_related(
+        Prefetch('itens', queryset=ItemOrcamento.objects.select_related('produto').order_by('id'))
+    ).order_by('id')
+    return resposta_exportacao(queryset, COLUNAS_ORCAMENTO, formato, 'orcamentos', filhos=('itens', COLUNAS_ITEM))
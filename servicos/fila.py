@@ -0,0 +1,134 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import pdf
+from .models import TarefaPDF
+
+logger = logging.getLogger(__name__)
+
+# PDFs prontos (e tarefas com erro) ficam disponíveis por este tempo; depois o
+# arquivo e a tarefa são apagados
+DIAS_RETENCAO = 7
+# De quanto em quanto tempo cada worker devolve as travadas e apaga as expiradas
+MANUTENCAO_SEGUNDOS = 300
+
+
+def enfileirar(tipo, objeto_id, usuario=None, base_url=''):
+    """
+    Registra um pedido de renderização. Quem consome é o comando `processar_pdfs`.
+    """
+    return TarefaPDF.objects.create(
+        tipo=tipo,
+        objeto_id=objeto_id,
+        solicitado_por=usuario if usuario and usuario.is_authenticated else None,
+        base_url=base_url or '',
+    )
+
+
+def reivindicar_proxima():
+    """
+    Pega a tarefa pendente mais antiga para este worker.
+    O UPDATE condicional garante que dois workers nunca processem a mesma tarefa,
+    sem depender de SELECT ... FOR UPDATE (que o SQLite não tem).
+    """
+    candidatas = (
+        TarefaPDF.objects
+        .filter(status=TarefaPDF.Status.PENDENTE)
+        .order_by('criado_em', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+    for tarefa_id in candidatas:
+        reivindicada = TarefaPDF.objects.filter(
+            pk=tarefa_id, status=TarefaPDF.Status.PENDENTE
+        ).update(status=TarefaPDF.Status.PROCESSANDO, iniciado_em=timezone.now())
+        if reivindicada:
+            return TarefaPDF.objects.get(pk=tarefa_id)
+    return None
+
+
+def liberar_travadas(minutos=10):
+    """
+    Devolve para a fila as tarefas de workers que morreram no meio do processamento.
+    """
+    limite = timezone.now() - timedelta(minutes=minutos)
+    return TarefaPDF.objects.filter(
+        status=TarefaPDF.Status.PROCESSANDO, iniciado_em__lt=limite
+    ).update(status=TarefaPDF.Status.PENDENTE, iniciado_em=None)
+
+
+def limpar_expiradas(dias=DIAS_RETENCAO):
+    """
+    Apaga os arquivos e as tarefas concluídas (ou com erro) há mais de `dias` dias.
+    Devolve a quantidade de tarefas apagadas.
+    """
+    limite = timezone.now() - timedelta(days=dias)
+    expiradas = TarefaPDF.objects.filter(
+        status__in=[TarefaPDF.Status.CONCLUIDO, TarefaPDF.Status.ERRO], concluido_em__lt=limite
+    )
+    for tarefa_id, arquivo in expiradas.exclude(arquivo='').exclude(arquivo=None).values_list('id', 'arquivo'):
+        try:
+            TarefaPDF._meta.get_field('arquivo').storage.delete(arquivo)
+        except OSError:
+            logger.warning("Não foi possível apagar o PDF da tarefa #%s (%s)", tarefa_id, arquivo)
+    return expiradas.delete()[0]
+
+
+def manutencao():
+    """Devolve as tarefas travadas para a fila e apaga as expiradas: (liberadas, apagadas)."""
+    return liberar_travadas(), limpar_expiradas()
+
+
+def processar(tarefa):
+    """
+    Renderiza a tarefa reivindicada e registra o resultado. A gravação final é
+    condicional: se a tarefa foi devolvida para a fila (liberar_travadas) e outro
+    worker a pegou nesse meio tempo, este resultado é descartado junto com o arquivo.
+    """
+    try:
+        conteudo, filename = pdf.gerar_documento(tarefa.tipo, tarefa.objeto_id, base_url=tarefa.base_url or None)
+    except Exception:
+        logger.exception("Falha ao gerar PDF da tarefa #%s", tarefa.pk)
+        tarefa.status = TarefaPDF.Status.ERRO
+        tarefa.erro = traceback.format_exc(limit=5)
+    else:
+        tarefa.arquivo.save(filename, ContentFile(conteudo), save=False)
+        tarefa.status = TarefaPDF.Status.CONCLUIDO
+        tarefa.erro = ''
+
+    tarefa.concluido_em = timezone.now()
+    gravada = TarefaPDF.objects.filter(
+        pk=tarefa.pk, status=TarefaPDF.Status.PROCESSANDO, iniciado_em=tarefa.iniciado_em
+    ).update(status=tarefa.status, arquivo=tarefa.arquivo.name or None, erro=tarefa.erro,
+             concluido_em=tarefa.concluido_em)
+    if not gravada:
+        logger.warning("Tarefa #%s não pertence mais a este worker; resultado descartado", tarefa.pk)
+        if tarefa.arquivo:
+            tarefa.arquivo.delete(save=False)
+    return tarefa
+
+
+def executar_worker(intervalo=1.0, sair_quando_vazia=False):
+    """
+    Loop de um worker: processa tarefas enquanto houver e dorme quando a fila esvazia.
+    A cada MANUTENCAO_SEGUNDOS também roda a manutenção da fila, para que tarefas de um
+    worker que morreu voltem sem precisar reiniciar o comando.
+    """
+    proxima_manutencao = time.monotonic() + MANUTENCAO_SEGUNDOS
+    while True:
+        close_old_connections()
+        if time.monotonic() >= proxima_manutencao:
+            manutencao()
+            proxima_manutencao = time.monotonic() + MANUTENCAO_SEGUNDOS
+        tarefa = reivindicar_proxima()
+        if tarefa is None:
+            if sair_quando_vazia:
+                return
+            time.sleep(intervalo)
+            continue
+        processar(tarefa)
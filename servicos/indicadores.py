@@ -0,0 +1,220 @@
+"""
+Indicadores do painel (dashboard): OS abertas por status, OS atrasadas e caixa do dia.
+
+Em vez de COUNT/SUM sobre a tabela de OS a cada acesso, o painel lê duas tabelas de
+resumo mantidas de forma incremental:
+
+- ContagemOS: quantas OS existem em cada (status, dia de abertura);
+- CaixaDiario: soma do valor_total das OS finalizadas em cada dia.
+
+Cada OS "contribui" com +1 numa linha de ContagemOS e, se finalizada, com o seu valor
+numa linha de CaixaDiario. Ao salvar, os sinais aplicam a diferença entre a contribuição
+antiga e a nova (UPDATE com F(), no mesmo commit da OS). Operações em lote que não
+disparam sinais (bulk_create, bulk_update) chamam aplicar_diferencas() diretamente.
+O comando `reconciliar_indicadores` recalcula tudo a partir das OS e corrige desvios.
+
+O resultado montado fica alguns segundos no cache.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import CaixaDiario, ContagemOS, OrdemServico
+
+STATUS_ABERTOS = (
+    OrdemServico.Status.PENDENTE,
+    OrdemServico.Status.EM_ANDAMENTO,
+    OrdemServico.Status.AGUARDANDO_PECA,
+)
+# OS aberta há mais dias que isto conta como atrasada
+PRAZO_OS_DIAS = 7
+CACHE_KEY = 'servicos:indicadores'
+CACHE_SEGUNDOS = 30
+CAMPOS_CONTRIBUICAO = ('status', 'data_abertura', 'data_finalizacao', 'valor_total')
+
+
+def contribuicao(os_obj):
+    """
+    O que a OS soma nos resumos: (status, dia de abertura) e, se finalizada,
+    (dia da finalização, valor). Aceita a OS ou um dict com CAMPOS_CONTRIBUICAO.
+    """
+    dados = os_obj if isinstance(os_obj, dict) else {campo: getattr(os_obj, campo) for campo in CAMPOS_CONTRIBUICAO}
+    if not dados['data_abertura']:
+        return None
+    caixa = None
+    if dados['status'] == OrdemServico.Status.FINALIZADO and dados['data_finalizacao']:
+        caixa = (timezone.localdate(dados['data_finalizacao']), Decimal(str(dados['valor_total'] or 0)))
+    return (dados['status'], timezone.localdate(dados['data_abertura'])), caixa
+
+
+def _somar(model, chaves, **deltas):
+    """Soma os deltas na linha (cria se não existir), sem ler o valor atual."""
+    if not any(deltas.values()):
+        return
+    atualizacao = {campo: F(campo) + delta for campo, delta in deltas.items()}
+    if model.objects.filter(**chaves).update(**atualizacao):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**chaves, **deltas)
+    except IntegrityError:
+        # Outra transação criou a linha entre o UPDATE e o INSERT
+        model.objects.filter(**chaves).update(**atualizacao)
+
+
+def aplicar_diferencas(antes, depois):
+    """
+    Atualiza os resumos trocando as contribuições `antes` pelas `depois`
+    (listas de contribuicao(); None = a OS não existia / deixou de existir).
+    """
+    contagens = Counter()
+    caixa = defaultdict(lambda: [Decimal('0'), 0])
+    for sinal, contribuicoes in ((-1, antes), (1, depois)):
+        for item in contribuicoes:
+            if item is None:
+                continue
+            chave_contagem, chave_caixa = item
+            contagens[chave_contagem] += sinal
+            if chave_caixa:
+                dia, valor = chave_caixa
+                caixa[dia][0] += sinal * valor
+                caixa[dia][1] += sinal
+
+    # Ordem fixa das linhas: duas transações não se travam mutuamente
+    for (status, dia), delta in sorted(contagens.items()):
+        _somar(ContagemOS, {'status': status, 'dia': dia}, total=delta)
+    for dia, (valor, quantidade) in sorted(caixa.items()):
+        _somar(CaixaDiario, {'dia': dia}, total=valor, quantidade=quantidade)
+
+
+def _muda_contribuicao(update_fields):
+    # Gravação parcial sem status, datas ou valores (ex: laudo): os resumos não mudam
+    return update_fields is None or bool(set(update_fields) & set(CAMPOS_CONTRIBUICAO))
+
+
+def _antes_de_salvar(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _muda_contribuicao(update_fields):
+        return
+    anterior = None
+    if instance.pk and not instance._state.adding:
+        dados = OrdemServico.objects.filter(pk=instance.pk).values(*CAMPOS_CONTRIBUICAO).first()
+        anterior = contribuicao(dados) if dados else None
+    instance._contribuicao_anterior = anterior
+
+
+def _ao_salvar(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or not _muda_contribuicao(update_fields):
+        return
+    aplicar_diferencas([getattr(instance, '_contribuicao_anterior', None)], [contribuicao(instance)])
+
+
+def _ao_remover(sender, instance, **kwargs):
+    aplicar_diferencas([contribuicao(instance)], [])
+
+
+def conectar_sinais():
+    pre_save.connect(_antes_de_salvar, sender=OrdemServico, dispatch_uid='indicadores_antes_salvar_os')
+    post_save.connect(_ao_salvar, sender=OrdemServico, dispatch_uid='indicadores_salvar_os')
+    post_delete.connect(_ao_remover, sender=OrdemServico, dispatch_uid='indicadores_remover_os')
+
+
+def calcular():
+    """Lê os resumos (poucas linhas) e monta os indicadores do painel."""
+    hoje = timezone.localdate()
+    por_status = dict(
+        ContagemOS.objects
+        .filter(status__in=STATUS_ABERTOS)
+        .values('status')
+        .annotate(soma=Sum('total'))
+        .values_list('status', 'soma')
+    )
+    atrasadas = ContagemOS.objects.filter(
+        status__in=STATUS_ABERTOS, dia__lt=hoje - timedelta(days=PRAZO_OS_DIAS)
+    ).aggregate(soma=Sum('total'))['soma']
+    caixa = CaixaDiario.objects.filter(dia=hoje).values('total', 'quantidade').first() or {}
+
+    return {
+        'abertas': sum(por_status.values()),
+        'abertas_por_status': [
+            (OrdemServico.Status(status).label, por_status.get(status, 0)) for status in STATUS_ABERTOS
+        ],
+        'atrasadas': atrasadas or 0,
+        'prazo_dias': PRAZO_OS_DIAS,
+        'caixa_dia': caixa.get('total') or Decimal('0.00'),
+        'finalizadas_dia': caixa.get('quantidade') or 0,
+    }
+
+
+def _chave_cache():
+    # Por dia: na virada, o "caixa do dia" e as atrasadas mudam sem nenhuma OS salva
+    return f'{CACHE_KEY}:{timezone.localdate():%Y%m%d}'
+
+
+def resumo():
+    """Indicadores do painel, com cache curto (alguns segundos de atraso são aceitáveis)."""
+    return cache.get_or_set(_chave_cache(), calcular, CACHE_SEGUNDOS)
+
+
+def reconciliar():
+    """
+    Recalcula os resumos a partir das OS (GROUP BY no banco) e corrige as linhas
+    divergentes (ex: depois de um UPDATE feito direto no banco). Retorna quantas
+    linhas foram corrigidas.
+    """
+    corrigidas = 0
+
+    with transaction.atomic():
+        # TruncDate usa o fuso atual: o mesmo dia local de contribuicao()
+        esperado_contagem = {
+            (linha['status'], linha['dia']): linha['total']
+            for linha in OrdemServico.objects
+            .annotate(dia=TruncDate('data_abertura'))
+            .values('status', 'dia')
+            .annotate(total=Count('id'))
+            .order_by()
+        }
+        esperado_caixa = {
+            linha['dia']: (linha['total'], linha['quantidade'])
+            for linha in OrdemServico.objects
+            .filter(status=OrdemServico.Status.FINALIZADO, data_finalizacao__isnull=False)
+            .annotate(dia=TruncDate('data_finalizacao'))
+            .values('dia')
+            .annotate(total=Sum('valor_total'), quantidade=Count('id'))
+            .order_by()
+        }
+
+        for linha in ContagemOS.objects.select_for_update():
+            esperado = esperado_contagem.pop((linha.status, linha.dia), 0)
+            if linha.total != esperado:
+                ContagemOS.objects.filter(pk=linha.pk).update(total=esperado)
+                corrigidas += 1
+        ContagemOS.objects.bulk_create([
+            ContagemOS(status=status, dia=dia, total=total) for (status, dia), total in esperado_contagem.items()
+        ])
+        corrigidas += len(esperado_contagem)
+
+        for linha in CaixaDiario.objects.select_for_update():
+            total, quantidade = esperado_caixa.pop(linha.dia, (Decimal('0.00'), 0))
+            if (linha.total, linha.quantidade) != (total, quantidade):
+                CaixaDiario.objects.filter(pk=linha.pk).update(total=total, quantidade=quantidade)
+                corrigidas += 1
+        CaixaDiario.objects.bulk_create([
+            CaixaDiario(dia=dia, total=total, quantidade=quantidade) for dia, (total, quantidade) in esperado_caixa.items()
+        ])
+        corrigidas += len(esperado_caixa)
+
+    cache.delete(_chave_cache())
+    return corrigidas
+
+
+def formatar_moeda(valor):
+    """1250.5 -> 'R$ 1.250,50'."""
+    texto = f'{Decimal(valor):,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+    return f'R$ {texto}'
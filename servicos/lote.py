@@ -0,0 +1,123 @@
+import io
+import multiprocessing
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.conf import settings
+
+# Este módulo é importado pelos processos do pool (spawn) antes do django.setup(),
+# por isso models e o renderizador só são importados dentro das funções.
+
+# Resultado de cada documento do lote: `erro` preenchido (e filename/conteudo None) quando falhou
+Resultado = namedtuple('Resultado', ['tipo', 'pk', 'filename', 'conteudo', 'erro'])
+
+
+class _Buffer(io.RawIOBase):
+    """
+    Destino não pesquisável (sem seek) para o ZipFile: acumula apenas os bytes
+    escritos desde a última coleta, que são enviados ao cliente em seguida.
+    """
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def coletar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def _inicializar_processo():
+    # Processos iniciados com "spawn" não herdam o Django configurado
+    django.setup()
+
+
+def _renderizar(tipo, pk, base_url):
+    from . import pdf
+
+    try:
+        conteudo, filename = pdf.gerar_documento(tipo, pk, base_url=base_url)
+    except Exception as exc:
+        return Resultado(tipo, pk, None, None, f"{type(exc).__name__}: {exc}")
+    return Resultado(tipo, pk, filename, conteudo, None)
+
+
+def documentos_de_os(ids, incluir_garantia=True):
+    """
+    Lista (tipo, pk) das OS e, opcionalmente, do termo de garantia de cada uma.
+    """
+    from .models import TipoDocumento
+
+    documentos = []
+    for pk in ids:
+        documentos.append((TipoDocumento.OS, pk))
+        if incluir_garantia:
+            documentos.append((TipoDocumento.GARANTIA, pk))
+    return documentos
+
+
+def _resultados(documentos, base_url, processos):
+    """
+    Gera os PDFs conforme ficam prontos. Só mantém `2 * processos` documentos em
+    andamento, então o lote inteiro nunca fica na memória ao mesmo tempo.
+    """
+    if processos <= 1:
+        for tipo, pk in documentos:
+            yield _renderizar(tipo, pk, base_url)
+        return
+
+    contexto = multiprocessing.get_context('spawn')
+    pendentes = iter(documentos)
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto,
+                             initializer=_inicializar_processo) as executor:
+        em_andamento = set()
+        for tipo, pk in pendentes:
+            em_andamento.add(executor.submit(_renderizar, tipo, pk, base_url))
+            if len(em_andamento) >= processos * 2:
+                break
+
+        while em_andamento:
+            prontos, em_andamento = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                yield futuro.result()
+                proximo = next(pendentes, None)
+                if proximo is not None:
+                    em_andamento.add(executor.submit(_renderizar, *proximo, base_url))
+
+
+def processos_padrao():
+    return getattr(settings, 'PDF_LOTE_PROCESSOS', min(4, os.cpu_count() or 1))
+
+
+def gerar_zip(documentos, base_url=None, processos=None):
+    """
+    Renderiza os documentos em paralelo e devolve o ZIP em pedaços (gerador),
+    pronto para StreamingHttpResponse ou para gravar em arquivo.
+    Documentos com erro não interrompem o lote: viram uma linha em ERROS.txt.
+    """
+    processos = processos_padrao() if processos is None else processos
+    buffer = _Buffer()
+    erros = []
+
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as arquivo_zip:
+        for resultado in _resultados(documentos, base_url, processos):
+            if resultado.erro:
+                erros.append(f"{resultado.tipo} #{resultado.pk}: {resultado.erro}")
+                continue
+            arquivo_zip.writestr(resultado.filename, resultado.conteudo)
+            yield buffer.coletar()
+
+        if erros:
+            arquivo_zip.writestr('ERROS.txt', '\n'.join(erros))
+
+    yield buffer.coletar()
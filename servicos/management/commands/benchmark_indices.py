@@ -0,0 +1,150 @@
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from clientes.models import Cliente
+from core.models import User
+from estoque.models import Categoria, Produto
+from servicos.models import Orcamento, OrdemServico
+
+
+class _Rollback(Exception):
+    pass
+
+
+# (descrição, model, nome do índice, função que monta o queryset)
+CONSULTAS = [
+    ('OS por status, mais recentes', OrdemServico, 'os_status_abertura_idx',
+     lambda dados: OrdemServico.objects.filter(status='AG_PECA').order_by('-data_abertura')[:20]),
+    ('OS de um técnico por status', OrdemServico, 'os_tecnico_status_idx',
+     lambda dados: OrdemServico.objects.filter(tecnico=dados['tecnico'], status='ANDAMENTO')),
+    ('Orçamentos enviados vencendo', Orcamento, 'orc_status_validade_idx',
+     lambda dados: Orcamento.objects.filter(status='ENVIADO', validade__lt=dados['hoje'] + timedelta(days=7))),
+    ('Orçamentos mais recentes', Orcamento, 'orc_criacao_idx',
+     lambda dados: Orcamento.objects.order_by('-data_criacao')[:20]),
+    ('Produtos por categoria e tipo', Produto, 'produto_categoria_tipo_idx',
+     lambda dados: Produto.objects.filter(categoria=dados['categoria'], tipo='S')),
+    ('Produtos por localização', Produto, 'produto_local_idx',
+     lambda dados: Produto.objects.filter(local_fisico='Prateleira 7')),
+    ('Produtos abaixo do estoque mínimo', Produto, 'produto_estoque_baixo_idx',
+     lambda dados: Produto.objects.estoque_baixo().order_by('nome', 'id')),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula uma base grande (temporária, desfeita no final) e mostra o plano (EXPLAIN) e o tempo '
+        'das consultas do admin/API com e sem os índices compostos. Os DROP INDEX seguram lock '
+        'exclusivo nas tabelas até o rollback (no PostgreSQL, ACCESS EXCLUSIVE: bloqueia até as '
+        'leituras), por isso só roda com DEBUG=True ou com --permitir-fora-do-debug, e nunca '
+        'deve ser usado num banco em produção.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ordens', type=int, default=20000, help='Quantidade de OS (e de orçamentos).')
+        parser.add_argument('--produtos', type=int, default=5000)
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument(
+            '--permitir-fora-do-debug', action='store_true',
+            help='Roda mesmo com DEBUG=False (ex: numa cópia do banco). As tabelas ficam travadas durante a medição.',
+        )
+
+    def _popular(self, ordens, produtos):
+        aleatorio = random.Random(42)
+        agora = timezone.now()
+
+        tecnicos = User.objects.bulk_create([
+            User(username=f'benchmark_tecnico_{i}', role=User.Role.TECNICO) for i in range(20)
+        ])
+        clientes = Cliente.objects.bulk_create([
+            Cliente(nome=f'Cliente Benchmark {i}', cpf_cnpj=f'benchmark-{i}', telefone='0') for i in range(500)
+        ])
+        categorias = Categoria.objects.bulk_create([Categoria(nome=f'Benchmark {i}') for i in range(30)])
+        Produto.objects.bulk_create([
+            Produto(
+                nome=f'Produto {i}', categoria=aleatorio.choice(categorias),
+                tipo=aleatorio.choice(Produto.Tipo.values), local_fisico=f'Prateleira {aleatorio.randrange(200)}',
+                quantidade=aleatorio.randrange(100),
+            )
+            for i in range(produtos)
+        ], batch_size=2000)
+
+        orcamentos = Orcamento.objects.bulk_create([
+            Orcamento(
+                cliente=aleatorio.choice(clientes), status=aleatorio.choice(Orcamento.Status.values),
+                validade=agora.date() + timedelta(days=aleatorio.randrange(-365, 365)),
+            )
+            for _ in range(ordens)
+        ], batch_size=2000)
+        os_criadas = OrdemServico.objects.bulk_create([
+            OrdemServico(
+                cliente=aleatorio.choice(clientes), tecnico=aleatorio.choice(tecnicos),
+                status=aleatorio.choice(OrdemServico.Status.values), descricao_problema='Benchmark',
+            )
+            for _ in range(ordens)
+        ], batch_size=2000)
+
+        # auto_now_add preenche tudo com "agora": espalha as datas num período de 2 anos
+        for obj in orcamentos:
+            obj.data_criacao = agora - timedelta(minutes=aleatorio.randrange(60 * 24 * 730))
+        Orcamento.objects.bulk_update(orcamentos, ['data_criacao'], batch_size=2000)
+        for obj in os_criadas:
+            obj.data_abertura = agora - timedelta(minutes=aleatorio.randrange(60 * 24 * 730))
+        OrdemServico.objects.bulk_update(os_criadas, ['data_abertura'], batch_size=2000)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')  # Estatísticas atualizadas para o planejador
+
+        return {'tecnico': tecnicos[0], 'categoria': categorias[0], 'hoje': agora.date()}
+
+    def _medir(self, queryset_fn, dados, repeticoes):
+        plano = queryset_fn(dados).explain()
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            list(queryset_fn(dados))
+        return plano, (time.perf_counter() - inicio) * 1000 / repeticoes
+
+    def _mostrar(self, titulo, plano, tempo):
+        self.stdout.write(f'  {titulo}: {tempo:8.2f} ms')
+        for linha in plano.splitlines():
+            self.stdout.write(f'      {linha}')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['permitir_fora_do_debug']:
+            raise CommandError(
+                'O benchmark remove índices e trava as tabelas até o fim. Rode com DEBUG=True '
+                'ou, numa cópia do banco, com --permitir-fora-do-debug.'
+            )
+
+        repeticoes = options['repeticoes']
+        self.stdout.write(f"Populando {options['ordens']} OS/orçamentos e {options['produtos']} produtos...")
+
+        try:
+            # Tudo (dados e remoção dos índices) é desfeito no final
+            with transaction.atomic():
+                dados = self._popular(options['ordens'], options['produtos'])
+
+                resultados = []
+                for descricao, _model, _indice, queryset_fn in CONSULTAS:
+                    resultados.append([descricao, self._medir(queryset_fn, dados, repeticoes)])
+
+                with connection.cursor() as cursor:
+                    for _descricao, model, indice, _queryset_fn in CONSULTAS:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(indice)}')
+                    cursor.execute('ANALYZE')
+
+                for resultado, (_descricao, _model, _indice, queryset_fn) in zip(resultados, CONSULTAS):
+                    resultado.append(self._medir(queryset_fn, dados, repeticoes))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        for descricao, (plano_com, tempo_com), (plano_sem, tempo_sem) in resultados:
+            self.stdout.write(self.style.MIGRATE_HEADING(descricao))
+            self._mostrar('sem índice', plano_sem, tempo_sem)
+            self._mostrar('com índice', plano_com, tempo_com)
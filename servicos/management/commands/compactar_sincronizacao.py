@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from servicos.models import RegistroAlteracao
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove do log de sincronização os registros superados por uma alteração mais nova do mesmo objeto. '
+        'Seguro para qualquer token: o estado final de cada objeto continua no log.'
+    )
+
+    def handle(self, *args, **options):
+        mais_recentes = (
+            RegistroAlteracao.objects
+            .values('modelo', 'objeto_id')
+            .annotate(ultimo=Max('id'))
+            .values('ultimo')
+        )
+        removidos, _ = RegistroAlteracao.objects.exclude(id__in=mais_recentes).delete()
+        self.stdout.write(self.style.SUCCESS(f"{removidos} registro(s) antigo(s) removido(s)."))
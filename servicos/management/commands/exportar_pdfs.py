@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from servicos import lote
+from servicos.models import Orcamento, OrdemServico, TipoDocumento
+
+
+class Command(BaseCommand):
+    help = 'Exporta em lote os PDFs de Orçamentos ou OS (com Termo de Garantia) para um arquivo ZIP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('documento', choices=['orcamento', 'os'])
+        parser.add_argument('--saida', required=True, help='Caminho do arquivo ZIP gerado.')
+        parser.add_argument('--ids', nargs='+', type=int, help='IDs específicos (padrão: todos).')
+        parser.add_argument('--status', help='Filtra pelo status (ex: FINALIZADO, APROVADO).')
+        parser.add_argument('--sem-garantia', action='store_true', help='Não inclui o Termo de Garantia das OS.')
+        parser.add_argument('--processos', type=int, default=None, help='Processos renderizando em paralelo.')
+        parser.add_argument('--base-url', default=None, help='URL do site, usada para resolver imagens.')
+
+    def handle(self, *args, **options):
+        model = Orcamento if options['documento'] == 'orcamento' else OrdemServico
+        queryset = model.objects.order_by('id')
+        if options['ids']:
+            queryset = queryset.filter(pk__in=options['ids'])
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+
+        ids = list(queryset.values_list('id', flat=True))
+        if not ids:
+            raise CommandError('Nenhum documento encontrado com esses filtros.')
+
+        if model is Orcamento:
+            documentos = [(TipoDocumento.ORCAMENTO, pk) for pk in ids]
+        else:
+            documentos = lote.documentos_de_os(ids, incluir_garantia=not options['sem_garantia'])
+
+        with open(options['saida'], 'wb') as destino:
+            for pedaco in lote.gerar_zip(documentos, base_url=options['base_url'], processos=options['processos']):
+                destino.write(pedaco)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(documentos)} documento(s) exportado(s) para {options['saida']}."))
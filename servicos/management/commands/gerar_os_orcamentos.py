@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from servicos import services
+from servicos.models import Orcamento
+
+
+class Command(BaseCommand):
+    help = 'Gera as OS dos orçamentos aprovados (os ids informados ou, com --aprovados, todos os aprovados).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help='Ids dos orçamentos.')
+        parser.add_argument('--aprovados', action='store_true', help='Todos os orçamentos aprovados.')
+        parser.add_argument('--tecnico', required=True, help='Usuário (username) responsável pelas OS geradas.')
+
+    def handle(self, *args, **options):
+        try:
+            tecnico = User.objects.get(username=options['tecnico'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário '{options['tecnico']}' não encontrado.")
+
+        ids = options['ids']
+        if options['aprovados']:
+            ids = Orcamento.objects.filter(status=Orcamento.Status.APROVADO).values_list('id', flat=True)
+        elif not ids:
+            raise CommandError('Informe os ids dos orçamentos ou use --aprovados.')
+
+        resultado = services.gerar_os_de_orcamentos(ids, tecnico)
+
+        for orcamento_id, os_id in resultado['convertidos']:
+            self.stdout.write(f'Orçamento #{orcamento_id} -> OS #{os_id}')
+        for chave, descricao in (('nao_aprovados', 'não aprovado'), ('ja_convertidos', 'já gerou OS')):
+            for orcamento_id in resultado[chave]:
+                self.stdout.write(self.style.WARNING(f'Orçamento #{orcamento_id} ignorado: {descricao}.'))
+        self.stdout.write(self.style.SUCCESS(f"{len(resultado['convertidos'])} OS gerada(s)."))
@@ -0,0 +1,42 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from servicos import fila
+
+
+def _worker(intervalo, sair_quando_vazia):
+    fila.executar_worker(intervalo=intervalo, sair_quando_vazia=sair_quando_vazia)
+
+
+class Command(BaseCommand):
+    help = 'Processa a fila de renderização de PDFs (TarefaPDF) com um pool local de workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Quantidade de processos renderizando em paralelo.')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera quando a fila está vazia.')
+        parser.add_argument('--uma-vez', action='store_true', help='Esvazia a fila e termina (útil no cron).')
+
+    def handle(self, *args, **options):
+        liberadas, apagadas = fila.manutencao()
+        if liberadas:
+            self.stdout.write(f"{liberadas} tarefa(s) travada(s) devolvida(s) para a fila.")
+        if apagadas:
+            self.stdout.write(f"{apagadas} tarefa(s) expirada(s) apagada(s).")
+
+        workers = max(1, options['workers'])
+        argumentos = (options['intervalo'], options['uma_vez'])
+
+        if workers == 1:
+            _worker(*argumentos)
+            return
+
+        # Cada processo abre a própria conexão com o banco
+        connections.close_all()
+        processos = [multiprocessing.Process(target=_worker, args=argumentos) for _ in range(workers)]
+        for processo in processos:
+            processo.start()
+        self.stdout.write(self.style.SUCCESS(f"{workers} workers de PDF em execução."))
+        for processo in processos:
+            processo.join()
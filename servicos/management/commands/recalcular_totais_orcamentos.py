@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max, Q
+
+from servicos.models import Orcamento
+
+
+class Command(BaseCommand):
+    help = (
+        'Corrige orçamentos cujo valor bruto/total não bate com a soma dos itens '
+        '(ex: itens gravados com bulk_create ou por SQL direto). Tudo é feito no banco, em faixas de ids.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=5000, help='Quantidade de ids por UPDATE.')
+
+    def handle(self, *args, **options):
+        tamanho = options['tamanho_lote']
+        ultimo = Orcamento.objects.aggregate(maior=Max('id'))['maior'] or 0
+
+        corrigidos = 0
+        for inicio in range(0, ultimo, tamanho):
+            divergentes = (
+                Orcamento.objects
+                .filter(id__gt=inicio, id__lte=inicio + tamanho)
+                .annotate(bruto_itens=Orcamento.expressao_valor_bruto())
+                .filter(~Q(valor_bruto=F('bruto_itens')) | ~Q(valor_total=F('bruto_itens') - F('desconto')))
+                .values_list('id', flat=True)
+            )
+            ids = list(divergentes)
+            if ids:
+                Orcamento.atualizar_totais(*ids)
+                corrigidos += len(ids)
+
+        self.stdout.write(self.style.SUCCESS(f"{corrigidos} orçamento(s) corrigido(s)."))
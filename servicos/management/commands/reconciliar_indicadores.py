@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from servicos import indicadores
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula os indicadores do painel (OS por status/dia e caixa diário) a partir das OS '
+        'e corrige o que divergir. Rodar periodicamente (ex: cron de madrugada).'
+    )
+
+    def handle(self, *args, **options):
+        corrigidas = indicadores.reconciliar()
+        self.stdout.write(self.style.SUCCESS(f"{corrigidas} linha(s) de indicadores corrigida(s)."))
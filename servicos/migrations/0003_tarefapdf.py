@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0002_orcamento_desconto_orcamento_valor_bruto_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaPDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('orcamento', 'Orçamento'), ('os', 'Ordem de Serviço'), ('garantia', 'Termo de Garantia')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='ID do Documento')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Na Fila'), ('PROCESSANDO', 'Processando'), ('CONCLUIDO', 'Concluído'), ('ERRO', 'Erro')], default='PENDENTE', max_length=20)),
+                ('base_url', models.CharField(blank=True, max_length=500)),
+                ('arquivo', models.FileField(blank=True, null=True, upload_to='pdf/tarefas/')),
+                ('erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas_pdf', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tarefa de PDF',
+                'verbose_name_plural': 'Fila de PDFs',
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='servicos_ta_status_bcb07a_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+        ('servicos', '0003_tarefapdf'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ordemservico',
+            index=models.Index(fields=['-data_abertura', '-id'], name='os_abertura_id_idx'),
+        ),
+    ]
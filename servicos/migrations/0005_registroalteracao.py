@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+def registrar_base_existente(apps, schema_editor):
+    """
+    Registra as linhas que já existem para que a primeira sincronização (token=0)
+    entregue a base completa pelo mesmo caminho das incrementais.
+    """
+    RegistroAlteracao = apps.get_model('servicos', 'RegistroAlteracao')
+    origens = [
+        ('ordemservico', apps.get_model('servicos', 'OrdemServico')),
+        ('itemorcamento', apps.get_model('servicos', 'ItemOrcamento')),
+        ('cliente', apps.get_model('clientes', 'Cliente')),
+    ]
+    for modelo, model in origens:
+        ids = model.objects.order_by('pk').values_list('pk', flat=True)
+        RegistroAlteracao.objects.bulk_create(
+            [RegistroAlteracao(modelo=modelo, objeto_id=pk, operacao='S') for pk in ids],
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+        ('servicos', '0004_ordemservico_os_abertura_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAlteracao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('ordemservico', 'Ordem de Serviço'), ('itemorcamento', 'Item de Orçamento'), ('cliente', 'Cliente')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('operacao', models.CharField(choices=[('S', 'Criado/Alterado'), ('R', 'Removido')], default='S', max_length=1)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Registro de Alteração',
+                'verbose_name_plural': 'Registros de Alteração',
+                'indexes': [models.Index(fields=['modelo', 'objeto_id'], name='servicos_re_modelo_f7e69f_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_base_existente, migrations.RunPython.noop),
+    ]
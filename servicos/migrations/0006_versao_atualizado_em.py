@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0005_registroalteracao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orcamento',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='orcamento',
+            name='versao',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ordemservico',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ordemservico',
+            name='versao',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_digitos_documento_telefone'),
+        ('servicos', '0006_versao_atualizado_em'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orcamento',
+            index=models.Index(fields=['status', 'validade'], name='orc_status_validade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orcamento',
+            index=models.Index(fields=['-data_criacao'], name='orc_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemservico',
+            index=models.Index(fields=['status', '-data_abertura'], name='os_status_abertura_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordemservico',
+            index=models.Index(fields=['tecnico', 'status'], name='os_tecnico_status_idx'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:12
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def preencher_indicadores(apps, schema_editor):
+    # Mesmo cálculo de servicos.indicadores.reconciliar(), com os models históricos
+    OrdemServico = apps.get_model('servicos', 'OrdemServico')
+    ContagemOS = apps.get_model('servicos', 'ContagemOS')
+    CaixaDiario = apps.get_model('servicos', 'CaixaDiario')
+
+    ContagemOS.objects.bulk_create([
+        ContagemOS(status=linha['status'], dia=linha['dia'], total=linha['total'])
+        for linha in OrdemServico.objects
+        .annotate(dia=TruncDate('data_abertura'))
+        .values('status', 'dia')
+        .annotate(total=Count('id'))
+        .order_by()
+    ])
+    CaixaDiario.objects.bulk_create([
+        CaixaDiario(dia=linha['dia'], total=linha['total'], quantidade=linha['quantidade'])
+        for linha in OrdemServico.objects
+        .filter(status='FINALIZADO', data_finalizacao__isnull=False)
+        .annotate(dia=TruncDate('data_finalizacao'))
+        .values('dia')
+        .annotate(total=Sum('valor_total'), quantidade=Count('id'))
+        .order_by()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0007_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaixaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(unique=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('quantidade', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Caixa Diário',
+                'verbose_name_plural': 'Caixa Diário',
+            },
+        ),
+        migrations.CreateModel(
+            name='ContagemOS',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDENTE', 'Aguardando Início'), ('ANDAMENTO', 'Em Execução'), ('AG_PECA', 'Aguardando Peça'), ('FINALIZADO', 'Finalizado'), ('CANCELADO', 'Cancelado')], max_length=20)),
+                ('dia', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contagem de OS',
+                'verbose_name_plural': 'Contagens de OS',
+                'constraints': [models.UniqueConstraint(fields=('status', 'dia'), name='contagem_os_status_dia_uniq')],
+            },
+        ),
+        migrations.RunPython(preencher_indicadores, migrations.RunPython.noop),
+    ]
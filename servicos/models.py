@@ -1,9 +1,38 @@
+import contextvars
+from contextlib import contextmanager
 from decimal import Decimal  # <--- IMPORTAÇÃO ESSENCIAL NOVA
 from django.db import models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
 from django.conf import settings
+from django.utils import timezone
 from clientes.models import Cliente
 from estoque.models import Produto
 
+# Orçamentos com itens alterados dentro de Orcamento.adiando_totais() (None = fora do bloco)
+_totais_adiados = contextvars.ContextVar('totais_adiados', default=None)
+
+
+def _salvar_avancando_versao(obj, salvar, args, kwargs):
+    """
+    Grava `obj` avançando a versão no próprio UPDATE (versao = versao + 1), em vez de
+    ler, somar em memória e gravar: duas gravações simultâneas não voltam a mesma versão.
+    Com update_fields, a versão e a data de atualização entram na lista.
+    """
+    if obj._state.adding:
+        salvar(*args, **kwargs)
+        return
+    if kwargs.get('update_fields') is not None:
+        kwargs['update_fields'] = {*kwargs['update_fields'], 'versao', 'atualizado_em'}
+    versao_anterior = obj.versao
+    obj.versao = F('versao') + 1
+    try:
+        salvar(*args, **kwargs)
+    except Exception:
+        obj.versao = versao_anterior
+        raise
+    obj.refresh_from_db(fields=['versao'])
+
 
 class Orcamento(models.Model):
     class Status(models.TextChoices):
@@ -29,7 +58,34 @@ class Orcamento(models.Model):
 
     observacoes = models.TextField(blank=True, verbose_name='Condições de Pagamento / Obs')
 
+    # Marcador de versão (ETag/Last-Modified): muda a cada alteração do orçamento ou dos itens
+    versao = models.PositiveIntegerField(default=1, editable=False)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Filtros do admin por status + validade (ex: enviados que vencem esta semana)
+            models.Index(fields=['status', 'validade'], name='orc_status_validade_idx'),
+            # Listagem do site, mais recentes primeiro
+            models.Index(fields=['-data_criacao'], name='orc_criacao_idx'),
+        ]
+
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            if not {'valor_bruto', 'desconto'} & set(update_fields):
+                # Gravação parcial sem os valores (ex: status): os totais ficam com atualizar_totais
+                _salvar_avancando_versao(self, super().save, args, kwargs)
+                return
+            kwargs['update_fields'] = {*update_fields, 'valor_bruto', 'desconto', 'valor_total'}
+
+        if self.pk:
+            # O bruto sempre vem dos itens (a cópia em memória pode estar velha)
+            self.valor_bruto = (
+                ItemOrcamento.objects.filter(orcamento_id=self.pk).aggregate(total=self.expressao_total_itens())['total']
+                or 0
+            )
+
         # CORREÇÃO DO ERRO: Converte tudo para Decimal antes de calcular
         val_bruto = Decimal(str(self.valor_bruto or 0))
         val_desc = Decimal(str(self.desconto or 0))
@@ -38,7 +94,65 @@ class Orcamento(models.Model):
         self.desconto = val_desc
         self.valor_total = val_bruto - val_desc
 
-        super().save(*args, **kwargs)
+        _salvar_avancando_versao(self, super().save, args, kwargs)
+
+    @staticmethod
+    def expressao_total_itens():
+        # Mesmo valor que a soma dos subtotais, calculado no banco (itens de bulk_create também entram)
+        return Round(
+            Sum(F('quantidade') * F('preco_unitario'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            2,
+        )
+
+    @classmethod
+    def expressao_valor_bruto(cls):
+        """Soma dos itens de cada orçamento, como subconsulta para UPDATE/annotate."""
+        soma = (
+            ItemOrcamento.objects
+            .filter(orcamento=OuterRef('pk'))
+            .values('orcamento')
+            .annotate(total=cls.expressao_total_itens())
+            .values('total')
+        )
+        return Coalesce(
+            Subquery(soma, output_field=DecimalField(max_digits=10, decimal_places=2)),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+
+    @classmethod
+    def atualizar_totais(cls, *pks):
+        """
+        Recalcula bruto/total e avança a versão num único UPDATE, sem carregar o orçamento
+        nem os itens. Chamado a cada item salvo ou apagado; quem grava itens em lote
+        (bulk_create, queryset.update) deve chamar com os orçamentos afetados.
+        """
+        pendentes = _totais_adiados.get()
+        if pendentes is not None:
+            pendentes.update(pks)
+            return
+        cls.objects.filter(pk__in=pks).update(
+            valor_bruto=cls.expressao_valor_bruto(),
+            valor_total=cls.expressao_valor_bruto() - F('desconto'),
+            versao=F('versao') + 1,
+            atualizado_em=timezone.now(),
+        )
+
+    @classmethod
+    @contextmanager
+    def adiando_totais(cls):
+        """
+        Junta as atualizações de totais do bloco num único UPDATE no final
+        (ex: o admin salvando todas as linhas do inline de itens).
+        """
+        pendentes = set()
+        token = _totais_adiados.set(pendentes)
+        try:
+            yield
+        finally:
+            _totais_adiados.reset(token)
+        if pendentes:
+            cls.atualizar_totais(*pendentes)
 
     def __str__(self):
         return f"Orçamento #{self.id} - {self.cliente.nome}"
@@ -58,6 +172,12 @@ class ItemOrcamento(models.Model):
         preco = Decimal(str(self.preco_unitario))
         self.subtotal = qtd * preco
         super().save(*args, **kwargs)
+        Orcamento.atualizar_totais(self.orcamento_id)
+
+    def delete(self, *args, **kwargs):
+        resultado = super().delete(*args, **kwargs)
+        Orcamento.atualizar_totais(self.orcamento_id)
+        return resultado
 
     def __str__(self):
         return f"{self.quantidade}x {self.produto.nome}"
@@ -100,6 +220,20 @@ class OrdemServico(models.Model):
     laudo_tecnico = models.TextField(blank=True, verbose_name='Laudo Técnico / Solução')
     sincronizado = models.BooleanField(default=True, editable=False)
 
+    # Marcador de versão (ETag/Last-Modified e detecção de conflito)
+    versao = models.PositiveIntegerField(default=1, editable=False)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Listagem da API (paginação por cursor) e telas ordenadas por abertura
+            models.Index(fields=['-data_abertura', '-id'], name='os_abertura_id_idx'),
+            # Filtro por status (admin e API) já na ordem da listagem
+            models.Index(fields=['status', '-data_abertura'], name='os_status_abertura_idx'),
+            # Fila de cada técnico ("minhas OS em andamento")
+            models.Index(fields=['tecnico', 'status'], name='os_tecnico_status_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # CORREÇÃO DO ERRO: Mesma proteção para a OS
         val_bruto = Decimal(str(self.valor_bruto or 0))
@@ -109,7 +243,132 @@ class OrdemServico(models.Model):
         self.desconto = val_desc
         self.valor_total = val_bruto - val_desc
 
-        super().save(*args, **kwargs)
+        # Finalizada sem data (admin, shell): a data entra no caixa do dia dos indicadores
+        if self.status == self.Status.FINALIZADO and not self.data_finalizacao:
+            self.data_finalizacao = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'data_finalizacao'}
+
+        _salvar_avancando_versao(self, super().save, args, kwargs)
+
+    def __str__(self):
+        return f"OS #{self.id} - {self.cliente.nome} ({self.get_status_display()})"
+
+
+class ContagemOS(models.Model):
+    """
+    Indicadores do painel: quantidade de OS por status e dia de abertura.
+    Mantida a cada OS salva/removida (ver servicos/indicadores.py), para o painel
+    somar poucas linhas em vez de contar a tabela de OS inteira.
+    """
+    status = models.CharField(max_length=20, choices=OrdemServico.Status.choices)
+    dia = models.DateField()
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Contagem de OS'
+        verbose_name_plural = 'Contagens de OS'
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'dia'], name='contagem_os_status_dia_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.status} {self.dia}: {self.total}"
+
+
+class CaixaDiario(models.Model):
+    """
+    Indicadores do painel: soma do valor_total das OS finalizadas em cada dia.
+    Mantida junto com ContagemOS.
+    """
+    dia = models.DateField(unique=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    quantidade = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Caixa Diário'
+        verbose_name_plural = 'Caixa Diário'
+
+    def __str__(self):
+        return f"{self.dia}: {self.total}"
+
+
+class TipoDocumento(models.TextChoices):
+    """Documentos PDF que o sistema sabe gerar."""
+    ORCAMENTO = 'orcamento', 'Orçamento'
+    OS = 'os', 'Ordem de Serviço'
+    GARANTIA = 'garantia', 'Termo de Garantia'
+
+
+class TarefaPDF(models.Model):
+    """
+    Fila de renderização assíncrona de PDFs (tabela no próprio banco, sem broker externo).
+    Os workers do comando `processar_pdfs` consomem as tarefas pendentes.
+    """
+
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Na Fila'
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        CONCLUIDO = 'CONCLUIDO', 'Concluído'
+        ERRO = 'ERRO', 'Erro'
+
+    tipo = models.CharField(max_length=20, choices=TipoDocumento.choices)
+    objeto_id = models.PositiveBigIntegerField(verbose_name='ID do Documento')
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
+
+    base_url = models.CharField(max_length=500, blank=True)
+    arquivo = models.FileField(upload_to='pdf/tarefas/', blank=True, null=True)
+    erro = models.TextField(blank=True)
+
+    solicitado_por = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tarefas_pdf'
+    )
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Tarefa de PDF'
+        verbose_name_plural = 'Fila de PDFs'
+        indexes = [
+            models.Index(fields=['status', 'criado_em']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.objeto_id} ({self.get_status_display()})"
+
+
+class RegistroAlteracao(models.Model):
+    """
+    Log de alterações usado na sincronização incremental do app (Seção mobile).
+    O ID é o token de sincronização: o celular pede tudo que veio depois do último ID que viu.
+    """
+
+    class Modelo(models.TextChoices):
+        ORDEM_SERVICO = 'ordemservico', 'Ordem de Serviço'
+        ITEM_ORCAMENTO = 'itemorcamento', 'Item de Orçamento'
+        CLIENTE = 'cliente', 'Cliente'
+
+    class Operacao(models.TextChoices):
+        SALVO = 'S', 'Criado/Alterado'
+        REMOVIDO = 'R', 'Removido'
+
+    modelo = models.CharField(max_length=20, choices=Modelo.choices)
+    objeto_id = models.PositiveBigIntegerField()
+    operacao = models.CharField(max_length=1, choices=Operacao.choices, default=Operacao.SALVO)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Registro de Alteração'
+        verbose_name_plural = 'Registros de Alteração'
+        indexes = [
+            models.Index(fields=['modelo', 'objeto_id']),
+        ]
 
     def __str__(self):
-        return f"OS #{self.id} - {self.cliente.nome} ({self.get_status_display()})"
\ No newline at end of file
+        return f"#{self.id} {self.modelo} {self.objeto_id} ({self.get_operacao_display()})"
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+
+
+class OrdemServicoCursorPagination(CursorPagination):
+    """
+    Paginação por cursor (keyset) sobre (data_abertura, id), apoiada pelo índice
+    os_abertura_id_idx. Não faz COUNT(*) e o custo é o mesmo em qualquer profundidade;
+    as páginas também não "andam" quando novas OS são abertas durante a rolagem.
+
+    O cursor do DRF guarda só o primeiro campo da ordenação e desempata com OFFSET
+    (que volta a crescer quando muitas OS têm a mesma data_abertura). Aqui a posição
+    leva data_abertura e id, e a página seguinte é
+    data_abertura < d OR (data_abertura = d AND id < i): sempre sem OFFSET.
+    """
+    ordering = ('-data_abertura', '-id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        # Posição única: os links "next"/"previous" nunca precisam de offset
+        return f'{instance.data_abertura.isoformat()}|{instance.id}'
+
+    def _ler_posicao(self, posicao):
+        try:
+            data, pk = posicao.split('|')
+            return datetime.fromisoformat(data), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        # Só o deslocamento pela posição: um offset vindo de fora é ignorado
+        reverse, posicao = (self.cursor.reverse, self.cursor.position) if self.cursor else (False, None)
+
+        if reverse:
+            # Página anterior: as OS mais novas que a posição, lidas de baixo para cima
+            queryset = queryset.order_by('data_abertura', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if posicao is not None:
+            data, pk = self._ler_posicao(posicao)
+            if reverse:
+                queryset = queryset.filter(Q(data_abertura__gt=data) | Q(data_abertura=data, id__gt=pk))
+            else:
+                queryset = queryset.filter(Q(data_abertura__lt=data) | Q(data_abertura=data, id__lt=pk))
+
+        resultados = list(queryset[:self.page_size + 1])
+        self.page = resultados[:self.page_size]
+        tem_seguinte = len(resultados) > len(self.page)
+        seguinte = self._get_position_from_instance(resultados[-1], self.ordering) if tem_seguinte else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = posicao is not None, tem_seguinte
+            self.next_position, self.previous_position = posicao, seguinte
+        else:
+            self.has_next, self.has_previous = tem_seguinte, posicao is not None
+            self.next_position, self.previous_position = seguinte, posicao
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class OrdemServicoPagination(BasePagination):
+    """
+    Mantém a paginação por número de página como padrão (compatível com o app atual)
+    e ativa o cursor com ?paginacao=cursor (os links "next"/"previous" já carregam o cursor).
+    """
+
+    def __init__(self):
+        self.por_pagina = PageNumberPagination()
+        self.por_cursor = OrdemServicoCursorPagination()
+        self.ativa = self.por_pagina
+
+    def usar_cursor(self, request):
+        return request.query_params.get('paginacao') == 'cursor' or 'cursor' in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ativa = self.por_cursor if self.usar_cursor(request) else self.por_pagina
+        return self.ativa.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.ativa.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.ativa.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.ativa.to_html()
+
+    def get_results(self, data):
+        return self.ativa.get_results(data)
+
+    def get_schema_operation_parameters(self, view):
+        return (
+            self.por_pagina.get_schema_operation_parameters(view)
+            + self.por_cursor.get_schema_operation_parameters(view)
+        )
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.template.loader import get_template, render_to_string
+
+from core.models import ConfiguracaoSistema
+from .models import ItemOrcamento, Orcamento, OrdemServico, TipoDocumento
+
+
+# Imagens já decodificadas pelo WeasyPrint neste processo (na prática, a logo).
+# Cada troca de logo gera um arquivo com outro nome: o limite impede que as antigas
+# se acumulem num worker de vida longa.
+_cache_imagens = {}
+LIMITE_CACHE_IMAGENS = 16
+
+
+def renderizar_pdf(template_name, context, base_url=None):
+    """
+    Renderiza o template HTML e converte em PDF com o WeasyPrint.
+    """
+    # Import tardio: carregar o WeasyPrint (pango/cairo) é caro e só
+    # quem realmente gera documentos precisa pagar esse custo.
+    from weasyprint import HTML
+
+    html_string = render_to_string(template_name, context)
+    if len(_cache_imagens) >= LIMITE_CACHE_IMAGENS:
+        _cache_imagens.clear()
+    return HTML(string=html_string, base_url=base_url).write_pdf(cache=_cache_imagens)
+
+
+# --- Cache de PDFs renderizados ---------------------------------------------
+
+def _cache_dir():
+    return Path(getattr(settings, 'PDF_CACHE_DIR', Path(settings.BASE_DIR) / 'cache' / 'pdf'))
+
+
+def _cache_max_bytes():
+    return getattr(settings, 'PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+
+
+def _serializar(parte):
+    """
+    Converte instâncias de models (e listas/dicts delas) em estruturas simples
+    para compor a impressão digital do documento.
+    """
+    if isinstance(parte, models.Model):
+        return [parte._meta.label] + [
+            field.value_to_string(parte) for field in parte._meta.concrete_fields
+        ]
+    if isinstance(parte, dict):
+        return {str(k): _serializar(v) for k, v in sorted(parte.items())}
+    if isinstance(parte, (list, tuple)):
+        return [_serializar(p) for p in parte]
+    return parte
+
+
+def versao_template(template_name):
+    """
+    Hash do código-fonte do template: qualquer alteração no layout gera uma nova chave.
+    """
+    source = get_template(template_name).template.source
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def impressao_digital(template_name, *partes):
+    """
+    Gera a chave do cache a partir de tudo que aparece no documento:
+    registros do banco (documento, itens, cliente, configuração) e a versão do template.
+    Se qualquer um deles mudar, a chave muda e o PDF é renderizado de novo.
+    """
+    payload = json.dumps(
+        [template_name, versao_template(template_name), _serializar(list(partes))],
+        cls=DjangoJSONEncoder,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def ler_cache(chave):
+    caminho = _cache_dir() / f"{chave}.pdf"
+    try:
+        conteudo = caminho.read_bytes()
+    except FileNotFoundError:
+        return None
+    # Atualiza o mtime: é ele que define a ordem de despejo (LRU)
+    try:
+        os.utime(caminho)
+    except FileNotFoundError:
+        pass
+    return conteudo
+
+
+def gravar_cache(chave, conteudo):
+    pasta = _cache_dir()
+    pasta.mkdir(parents=True, exist_ok=True)
+
+    # Escrita atômica: outro worker nunca lê um PDF pela metade
+    fd, tmp = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(conteudo)
+    os.replace(tmp, pasta / f"{chave}.pdf")
+
+    despejar_cache()
+
+
+def despejar_cache(max_bytes=None):
+    """
+    Remove os PDFs usados há mais tempo até o cache caber no limite configurado.
+    """
+    max_bytes = _cache_max_bytes() if max_bytes is None else max_bytes
+    arquivos = []
+    total = 0
+    for entrada in os.scandir(_cache_dir()):
+        if not entrada.name.endswith('.pdf'):
+            continue
+        try:
+            stat = entrada.stat()
+        except FileNotFoundError:
+            continue
+        arquivos.append((stat.st_mtime, stat.st_size, entrada.path))
+        total += stat.st_size
+
+    arquivos.sort()
+    for _mtime, tamanho, caminho in arquivos:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+
+
+def obter_pdf(template_name, context, chave, base_url=None):
+    """
+    Devolve o PDF do cache ou renderiza (e guarda) se ainda não existir.
+    """
+    pdf_file = ler_cache(chave)
+    if pdf_file is None:
+        pdf_file = renderizar_pdf(template_name, context, base_url=base_url)
+        gravar_cache(chave, pdf_file)
+    return pdf_file
+
+
+# --- Documentos ----------------------------------------------------------------
+
+# tipo -> (template, prefixo do nome do arquivo)
+DOCUMENTOS = {
+    TipoDocumento.ORCAMENTO: ('servicos/orcamento_pdf.html', 'orcamento'),
+    TipoDocumento.OS: ('servicos/os_pdf.html', 'os'),
+    TipoDocumento.GARANTIA: ('servicos/garantia_pdf.html', 'garantia_os'),
+}
+
+
+def nome_arquivo(tipo, pk):
+    """Nome do PDF para download (ex: garantia_os_15.pdf)."""
+    return f"{DOCUMENTOS[tipo][1]}_{pk}.pdf"
+
+
+def _itens_prefetch(lookup):
+    # Os templates mostram nome, referência e categoria do produto de cada item
+    return Prefetch(lookup, queryset=ItemOrcamento.objects.select_related('produto__categoria').order_by('id'))
+
+
+def montar_contexto(tipo, pk):
+    """
+    Carrega tudo que o documento exibe num número fixo de consultas,
+    independente da quantidade de itens:
+      1. documento + cliente (+ técnico e orçamento de origem, no caso da OS)
+      2. itens + produtos + categorias
+    A configuração do sistema vem do cache (ConfiguracaoSistema.carregar).
+    Retorna (template, contexto, partes da impressão digital, nome do arquivo).
+    """
+    template_name = DOCUMENTOS[tipo][0]
+
+    if tipo == TipoDocumento.ORCAMENTO:
+        queryset = Orcamento.objects.select_related('cliente').prefetch_related(_itens_prefetch('itens'))
+        documento = get_object_or_404(queryset, pk=pk)
+        itens = list(documento.itens.all())
+        context = {'orcamento': documento}
+        partes = [documento, documento.cliente]
+    else:
+        queryset = OrdemServico.objects.select_related(
+            'cliente', 'tecnico', 'orcamento_origem'
+        ).prefetch_related(_itens_prefetch('orcamento_origem__itens'))
+        documento = get_object_or_404(queryset, pk=pk)
+        # Se a OS veio de um Orçamento, os itens exibidos são os dele
+        itens = list(documento.orcamento_origem.itens.all()) if documento.orcamento_origem else []
+        context = {'os': documento}
+        partes = [documento, documento.cliente, documento.tecnico.get_full_name(), documento.tecnico.username]
+
+    config = ConfiguracaoSistema.carregar()
+    context.update({'itens': itens, 'config': config})
+    partes += [
+        itens,
+        [item.produto for item in itens],
+        [item.produto.categoria for item in itens],
+        config,
+    ]
+    return template_name, context, partes, nome_arquivo(tipo, documento.id)
+
+
+def gerar_documento(tipo, pk, base_url=None, request=None):
+    """
+    Gera (ou busca no cache) o PDF do documento. Retorna (conteúdo, nome do arquivo).
+    """
+    template_name, context, partes, filename = montar_contexto(tipo, pk)
+    context['request'] = request
+
+    chave = impressao_digital(template_name, *partes)
+    return obter_pdf(template_name, context, chave, base_url=base_url), filename
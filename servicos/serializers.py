@@ -4,6 +4,44 @@ from clientes.models import Cliente
 from estoque.models import Produto
 
 
+def ler_campos(valor):
+    """
+    Converte o parâmetro ?fields=id,status,cliente.nome em árvore:
+    {'id': {}, 'status': {}, 'cliente': {'nome': {}}}
+    """
+    arvore = {}
+    for caminho in (valor or '').split(','):
+        caminho = caminho.strip()
+        if not caminho:
+            continue
+        no = arvore
+        for parte in caminho.split('.'):
+            no = no.setdefault(parte, {})
+    return arvore
+
+
+def restringir_campos(serializer, campos):
+    """Remove do serializer (e dos aninhados) tudo que não está na árvore de campos."""
+    for nome in list(serializer.fields):
+        if nome not in campos:
+            serializer.fields.pop(nome)
+        elif campos[nome] and isinstance(serializer.fields[nome], serializers.Serializer):
+            restringir_campos(serializer.fields[nome], campos[nome])
+
+
+class CamposDinamicosMixin:
+    """
+    Sparse fieldsets: aceita `campos` (árvore de ler_campos) e serializa só o que foi pedido.
+    Sem `campos`, o serializer se comporta como sempre.
+    """
+
+    def __init__(self, *args, campos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.campos = campos
+        if campos:
+            restringir_campos(self, campos)
+
+
 class ClienteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Cliente
@@ -19,7 +57,7 @@ class ProdutoResumidoSerializer(serializers.ModelSerializer):
         fields = ['id', 'nome', 'tipo', 'preco_venda']
 
 
-class ItemOSSerializer(serializers.ModelSerializer):
+class ItemOSSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     # Nested Serializer: Traz os dados do produto dentro do item
     produto = ProdutoResumidoSerializer(read_only=True)
 
@@ -28,7 +66,7 @@ class ItemOSSerializer(serializers.ModelSerializer):
         fields = ['id', 'produto', 'quantidade', 'preco_unitario', 'subtotal']
 
 
-class OrdemServicoSerializer(serializers.ModelSerializer):
+class OrdemServicoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     cliente = ClienteSerializer(read_only=True)
     itens = serializers.SerializerMethodField()
     tecnico_nome = serializers.CharField(source='tecnico.get_full_name', read_only=True)
@@ -44,6 +82,7 @@ class OrdemServicoSerializer(serializers.ModelSerializer):
             'descricao_problema',
             'laudo_tecnico',
             'valor_total',
+            'versao',
             'itens'
         ]
 
@@ -53,5 +92,59 @@ class OrdemServicoSerializer(serializers.ModelSerializer):
         """
         if obj.orcamento_origem:
             itens = obj.orcamento_origem.itens.all()
-            return ItemOSSerializer(itens, many=True).data
-        return []
\ No newline at end of file
+            campos_itens = self.campos.get('itens') if self.campos else None
+            return ItemOSSerializer(itens, many=True, campos=campos_itens or None).data
+        return []
+
+
+class OrdemServicoResumoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Versão compacta para a tela de lista do celular (?formato=resumo):
+    sem textos longos, sem cliente aninhado e sem itens.
+    """
+    cliente_nome = serializers.CharField(source='cliente.nome', read_only=True)
+
+    class Meta:
+        model = OrdemServico
+        fields = ['id', 'cliente_nome', 'status', 'data_abertura']
+
+
+# --- Sincronização incremental (formato "plano": o app monta as relações pelos IDs) ---
+
+class ItemSyncSerializer(serializers.ModelSerializer):
+    produto = ProdutoResumidoSerializer(read_only=True)
+
+    class Meta:
+        model = ItemOrcamento
+        fields = ['id', 'orcamento', 'produto', 'quantidade', 'preco_unitario', 'subtotal']
+
+
+class OrdemServicoSyncSerializer(serializers.ModelSerializer):
+    tecnico_nome = serializers.CharField(source='tecnico.get_full_name', read_only=True)
+
+    class Meta:
+        model = OrdemServico
+        fields = [
+            'id',
+            'cliente',
+            'orcamento_origem',
+            'tecnico_nome',
+            'status',
+            'data_abertura',
+            'data_finalizacao',
+            'descricao_problema',
+            'laudo_tecnico',
+            'valor_total',
+            'versao',
+        ]
+
+
+class AtualizacaoOfflineSerializer(serializers.Serializer):
+    """
+    Uma alteração feita offline pelo técnico. `versao` é a versão da OS que o
+    celular tinha quando a alteração foi feita (detecção de conflito).
+    """
+    id = serializers.IntegerField()
+    versao = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=OrdemServico.Status.choices, required=False)
+    laudo_tecnico = serializers.CharField(required=False, allow_blank=True)
@@ -0,0 +1,357 @@
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_save, pre_delete
+from django.utils import timezone
+
+from estoque import movimentos
+from estoque.models import MovimentoEstoque, Produto
+from . import indicadores, sincronizacao
+from .models import ItemOrcamento, Orcamento, OrdemServico
+
+# Campos que o técnico pode alterar offline
+CAMPOS_EDITAVEIS_OFFLINE = ('status', 'laudo_tecnico')
+
+
+def aplicar_atualizacoes_lote(atualizacoes, usuario=None):
+    """
+    Aplica de uma vez as alterações feitas offline pelos técnicos.
+
+    `atualizacoes` é uma lista de dicts já validados com `id`, `versao` (a versão que o
+    celular tinha) e os campos alterados. Tudo roda numa única transação, com uma
+    leitura e um UPDATE em lote. Se a versão no servidor for outra, o registro não é
+    aplicado (conflito) e fica marcado como não sincronizado.
+
+    Com `usuario`, quem não tem a permissão servicos.change_ordemservico só altera
+    as OS em que é o técnico responsável; as outras voltam como 'proibida'.
+
+    Retorna uma lista (na ordem recebida) de (resultado, os_obj), com resultado
+    'aplicado', 'conflito', 'nao_encontrada' ou 'proibida'. A mesma OS repetida no
+    lote é aplicada só uma vez; as repetições seguintes viram conflito.
+    """
+    ids = [atualizacao['id'] for atualizacao in atualizacoes]
+    somente_do_tecnico = usuario is not None and not usuario.has_perm('servicos.change_ordemservico')
+    agora = timezone.now()
+    resultados = []
+    aplicadas = {}
+    conflitos = {}
+    mudaram_status = []
+    contribuicoes_antes = []
+
+    with transaction.atomic():
+        ordens = OrdemServico.objects.select_for_update().in_bulk(ids)
+
+        for atualizacao in atualizacoes:
+            os_obj = ordens.get(atualizacao['id'])
+            if os_obj is None:
+                resultados.append(('nao_encontrada', None))
+                continue
+            if somente_do_tecnico and os_obj.tecnico_id != usuario.pk:
+                resultados.append(('proibida', None))
+                continue
+
+            if os_obj.pk in aplicadas or os_obj.versao != atualizacao['versao']:
+                if os_obj.pk not in aplicadas:
+                    conflitos[os_obj.pk] = os_obj
+                resultados.append(('conflito', os_obj))
+                continue
+
+            status_anterior = os_obj.status
+            contribuicoes_antes.append(indicadores.contribuicao(os_obj))
+            for campo in CAMPOS_EDITAVEIS_OFFLINE:
+                if campo in atualizacao:
+                    setattr(os_obj, campo, atualizacao[campo])
+            if os_obj.status != status_anterior:
+                mudaram_status.append(os_obj)
+            if os_obj.status == OrdemServico.Status.FINALIZADO and not os_obj.data_finalizacao:
+                os_obj.data_finalizacao = agora
+            os_obj.versao += 1
+            os_obj.sincronizado = True
+            os_obj.atualizado_em = agora
+            aplicadas[os_obj.pk] = os_obj
+            resultados.append(('aplicado', os_obj))
+
+        if aplicadas:
+            OrdemServico.objects.bulk_update(
+                aplicadas.values(),
+                [*CAMPOS_EDITAVEIS_OFFLINE, 'data_finalizacao', 'versao', 'sincronizado', 'atualizado_em'],
+            )
+            # bulk_update não dispara sinais: registra no log de sincronização e nos indicadores manualmente
+            sincronizacao.registrar_alteracoes(OrdemServico, list(aplicadas))
+            indicadores.aplicar_diferencas(
+                contribuicoes_antes, [indicadores.contribuicao(os_obj) for os_obj in aplicadas.values()]
+            )
+
+        # Finalizadas/canceladas no celular: baixa ou libera o estoque no mesmo commit
+        baixar_estoque([os_obj for os_obj in mudaram_status if os_obj.status == OrdemServico.Status.FINALIZADO])
+        for os_obj in mudaram_status:
+            if os_obj.status == OrdemServico.Status.CANCELADO:
+                movimentar_estoque_da_os(os_obj)
+
+        if conflitos:
+            # Divergência entre o celular e o servidor: fica sinalizada até o app reenviar
+            OrdemServico.objects.filter(pk__in=list(conflitos)).update(sincronizado=False)
+            for os_obj in conflitos.values():
+                os_obj.sincronizado = False
+
+    return resultados
+
+
+def gerar_os_de_orcamentos(orcamento_ids, tecnico):
+    """
+    Converte os orçamentos aprovados em OS, todos de uma vez e numa única transação:
+    uma leitura dos orçamentos, uma das OS já geradas, um bulk_create e um UPDATE de
+    status. Se algo falhar, nada fica convertido pela metade.
+
+    Retorna um dict com as listas de ids:
+    'convertidos' ([(orcamento_id, os_id)]), 'nao_aprovados' e 'ja_convertidos'.
+    """
+    resultado = {'convertidos': [], 'nao_aprovados': [], 'ja_convertidos': []}
+
+    with transaction.atomic():
+        orcamentos = list(
+            Orcamento.objects.select_for_update()
+            .filter(pk__in=list(orcamento_ids))
+            .only('id', 'cliente_id', 'status', 'observacoes', 'valor_bruto', 'desconto')
+            .order_by('id')
+        )
+        aprovados = []
+        for orcamento in orcamentos:
+            if orcamento.status == Orcamento.Status.APROVADO:
+                aprovados.append(orcamento)
+            else:
+                resultado['nao_aprovados'].append(orcamento.pk)
+
+        ja_convertidos = set(
+            OrdemServico.objects
+            .filter(orcamento_origem__in=[orcamento.pk for orcamento in aprovados])
+            .values_list('orcamento_origem_id', flat=True)
+        )
+        novos = []
+        for orcamento in aprovados:
+            if orcamento.pk in ja_convertidos:
+                resultado['ja_convertidos'].append(orcamento.pk)
+                continue
+            # bulk_create não passa pelo save(): o total já vai calculado
+            novos.append(OrdemServico(
+                orcamento_origem_id=orcamento.pk,
+                cliente_id=orcamento.cliente_id,
+                descricao_problema=f"Serviço derivado do Orçamento #{orcamento.pk}. \nCondições: {orcamento.observacoes}",
+                status=OrdemServico.Status.PENDENTE,
+                tecnico=tecnico,
+                valor_bruto=orcamento.valor_bruto,
+                desconto=orcamento.desconto,
+                valor_total=orcamento.valor_bruto - orcamento.desconto,
+            ))
+
+        if novos:
+            OrdemServico.objects.bulk_create(novos)
+            convertidos = [os_obj.orcamento_origem_id for os_obj in novos]
+            Orcamento.objects.filter(pk__in=convertidos).update(
+                status=Orcamento.Status.CONVERTIDO, versao=F('versao') + 1, atualizado_em=timezone.now()
+            )
+            # bulk_create não dispara sinais: registra no log de sincronização e nos indicadores manualmente
+            sincronizacao.registrar_alteracoes(OrdemServico, [os_obj.pk for os_obj in novos])
+            indicadores.aplicar_diferencas([], [indicadores.contribuicao(os_obj) for os_obj in novos])
+            resultado['convertidos'] = [(os_obj.orcamento_origem_id, os_obj.pk) for os_obj in novos]
+
+    return resultado
+
+
+def _itens_para_estoque(**filtros):
+    """Itens dos orçamentos com o tipo do produto (serviços não reservam estoque)."""
+    return (
+        ItemOrcamento.objects
+        .filter(**filtros)
+        .select_related('produto')
+        .only('id', 'orcamento_id', 'produto_id', 'quantidade', 'produto__tipo')
+        .order_by('id')
+    )
+
+
+def _situacao_estoque(item_ids):
+    """
+    Situação de cada item a partir dos seus movimentos (uma consulta agrupada):
+    {item_id: ({produto_id: quantidade ainda reservada}, baixado)}.
+    O reservado é o que foi de fato reservado (reservas - liberações - baixas), não a
+    quantidade atual do item, que pode ter sido editada depois da aprovação.
+    """
+    sinais = {
+        MovimentoEstoque.Tipo.RESERVA: 1,
+        MovimentoEstoque.Tipo.LIBERACAO: -1,
+        MovimentoEstoque.Tipo.BAIXA: -1,
+    }
+    situacao = {}
+    linhas = (
+        MovimentoEstoque.objects
+        .filter(item_orcamento__in=list(item_ids))
+        .values_list('item_orcamento', 'produto', 'tipo')
+        .annotate(total=Sum('quantidade'))
+        .order_by()
+    )
+    for item_id, produto_id, tipo, total in linhas:
+        saldos, baixado = situacao.setdefault(item_id, ({}, False))
+        if tipo in (MovimentoEstoque.Tipo.BAIXA, MovimentoEstoque.Tipo.SAIDA):
+            situacao[item_id] = (saldos, True)
+        if tipo in sinais:
+            saldos[produto_id] = saldos.get(produto_id, 0) + sinais[tipo] * total
+    return situacao
+
+
+def _quantidade_desejada(item):
+    return item.quantidade if item.produto.tipo == Produto.Tipo.PRODUTO else 0
+
+
+def _movimento(item, produto_id, tipo, quantidade, **extra):
+    return MovimentoEstoque(
+        produto_id=produto_id, tipo=tipo, quantidade=quantidade, item_orcamento_id=item.pk, **extra
+    )
+
+
+def _ajustar_reservas(itens, usuario=None):
+    """
+    Deixa a reserva de cada item igual à quantidade atual: reserva a diferença
+    (item aumentado) ou libera a sobra (item diminuído, produto trocado).
+    """
+    itens = list(itens)
+    situacao = _situacao_estoque(item.pk for item in itens)
+    lote = []
+    for item in itens:
+        saldos, baixado = situacao.get(item.pk, ({}, False))
+        if baixado:
+            continue
+        extra = {'usuario': usuario, 'observacao': f'Orçamento #{item.orcamento_id} aprovado'}
+        for produto_id, saldo in saldos.items():
+            if produto_id != item.produto_id and saldo > 0:
+                lote.append(_movimento(item, produto_id, MovimentoEstoque.Tipo.LIBERACAO, saldo, **extra))
+        diferenca = _quantidade_desejada(item) - saldos.get(item.produto_id, 0)
+        if diferenca > 0:
+            lote.append(_movimento(item, item.produto_id, MovimentoEstoque.Tipo.RESERVA, diferenca, **extra))
+        elif diferenca < 0:
+            lote.append(_movimento(item, item.produto_id, MovimentoEstoque.Tipo.LIBERACAO, -diferenca, **extra))
+    return movimentos.movimentar(lote)
+
+
+def reservar_estoque(orcamento_ids, usuario=None):
+    """
+    Reserva os produtos dos orçamentos aprovados. O que já está reservado é descontado,
+    então pode ser chamado de novo sem reservar em dobro. Sem saldo disponível para
+    todos, nada é reservado (movimentos.EstoqueInsuficiente).
+    """
+    return _ajustar_reservas(_itens_para_estoque(orcamento_id__in=list(orcamento_ids)), usuario)
+
+
+def _liberacoes(itens, situacao, observacao='', **extra):
+    """Liberação de tudo o que ainda está reservado nos itens (os já baixados ficam de fora)."""
+    lote = []
+    for item in itens:
+        saldos, baixado = situacao.get(item.pk, ({}, False))
+        if baixado:
+            continue
+        for produto_id, saldo in saldos.items():
+            if saldo > 0:
+                lote.append(_movimento(
+                    item, produto_id, MovimentoEstoque.Tipo.LIBERACAO, saldo,
+                    observacao=observacao or f'Orçamento #{item.orcamento_id}', **extra
+                ))
+    return lote
+
+
+def liberar_reserva(orcamento_ids, usuario=None, ordem_servico=None, observacao=''):
+    """Devolve ao disponível o que ainda está reservado nos orçamentos (rejeitado / OS cancelada)."""
+    itens = list(_itens_para_estoque(orcamento_id__in=list(orcamento_ids)))
+    situacao = _situacao_estoque(item.pk for item in itens)
+    return movimentos.movimentar(
+        _liberacoes(itens, situacao, observacao, ordem_servico=ordem_servico, usuario=usuario)
+    )
+
+
+def baixar_estoque(ordens, usuario=None):
+    """
+    Saída dos produtos das OS finalizadas, num único lote: o que estava reservado vira
+    baixa da reserva, o que passar da reserva vira saída simples e a sobra da reserva
+    é liberada. Itens já baixados são ignorados. A baixa é registrada mesmo sem saldo
+    (as peças já foram usadas no serviço).
+    """
+    por_orcamento = {os_obj.orcamento_origem_id: os_obj for os_obj in ordens if os_obj.orcamento_origem_id}
+    if not por_orcamento:
+        return []
+    itens = list(_itens_para_estoque(orcamento_id__in=list(por_orcamento)))
+    situacao = _situacao_estoque(item.pk for item in itens)
+
+    lote = []
+    for item in itens:
+        saldos, baixado = situacao.get(item.pk, ({}, False))
+        if baixado:
+            continue
+        os_obj = por_orcamento[item.orcamento_id]
+        extra = {'ordem_servico': os_obj, 'usuario': usuario, 'observacao': f'OS #{os_obj.pk} finalizada'}
+        for produto_id, saldo in saldos.items():
+            if produto_id != item.produto_id and saldo > 0:
+                lote.append(_movimento(item, produto_id, MovimentoEstoque.Tipo.LIBERACAO, saldo, **extra))
+        reservado = max(saldos.get(item.produto_id, 0), 0)
+        usado = _quantidade_desejada(item)
+        if min(reservado, usado):
+            lote.append(_movimento(item, item.produto_id, MovimentoEstoque.Tipo.BAIXA, min(reservado, usado), **extra))
+        if usado > reservado:
+            lote.append(_movimento(item, item.produto_id, MovimentoEstoque.Tipo.SAIDA, usado - reservado, **extra))
+        elif reservado > usado:
+            lote.append(_movimento(item, item.produto_id, MovimentoEstoque.Tipo.LIBERACAO, reservado - usado, **extra))
+    return movimentos.movimentar(lote, verificar_saldo=False)
+
+
+def _ao_salvar_item(sender, instance, raw=False, **kwargs):
+    # Item alterado num orçamento já aprovado: ajusta a reserva à nova quantidade/produto
+    if raw:
+        return
+    if Orcamento.objects.filter(pk=instance.orcamento_id, status=Orcamento.Status.APROVADO).exists():
+        _ajustar_reservas(_itens_para_estoque(pk=instance.pk))
+
+
+def _ao_remover_item(sender, instance, **kwargs):
+    """
+    Item (ou o orçamento inteiro) removido: devolve o que ainda estava reservado.
+    Os movimentos ficam sem o item (SET_NULL), então a liberação já nasce sem ele.
+    """
+    situacao = _situacao_estoque([instance.pk])
+    lote = _liberacoes(
+        [instance], situacao, f'Item #{instance.pk} do orçamento #{instance.orcamento_id} removido'
+    )
+    for movimento in lote:
+        movimento.item_orcamento_id = None
+    movimentos.movimentar(lote)
+
+
+def conectar_sinais():
+    post_save.connect(_ao_salvar_item, sender=ItemOrcamento, dispatch_uid='estoque_salvar_item_orcamento')
+    pre_delete.connect(_ao_remover_item, sender=ItemOrcamento, dispatch_uid='estoque_remover_item_orcamento')
+
+
+def movimentar_estoque_da_os(os_obj, usuario=None):
+    """Efeito da mudança de status da OS no estoque: finalizada baixa, cancelada libera."""
+    if os_obj.status == OrdemServico.Status.FINALIZADO:
+        baixar_estoque([os_obj], usuario)
+    elif os_obj.status == OrdemServico.Status.CANCELADO and os_obj.orcamento_origem_id:
+        liberar_reserva(
+            [os_obj.orcamento_origem_id], usuario, ordem_servico=os_obj, observacao=f'OS #{os_obj.pk} cancelada'
+        )
+
+
+def aprovar_orcamentos(orcamento_ids, usuario=None):
+    """
+    Aprova os orçamentos (rascunho, enviado ou rejeitado) e reserva o estoque dos
+    itens, tudo ou nada. Retorna os ids aprovados.
+    """
+    with transaction.atomic():
+        aprovados = list(
+            Orcamento.objects.select_for_update()
+            .filter(pk__in=list(orcamento_ids))
+            .exclude(status__in=[Orcamento.Status.APROVADO, Orcamento.Status.CONVERTIDO])
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        if aprovados:
+            Orcamento.objects.filter(pk__in=aprovados).update(
+                status=Orcamento.Status.APROVADO, versao=F('versao') + 1, atualizado_em=timezone.now()
+            )
+            reservar_estoque(aprovados, usuario)
+    return aprovados
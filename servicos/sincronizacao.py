@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef, Prefetch
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from clientes.models import Cliente
+from .models import ItemOrcamento, OrdemServico, RegistroAlteracao
+
+MODELOS = {
+    OrdemServico: RegistroAlteracao.Modelo.ORDEM_SERVICO,
+    ItemOrcamento: RegistroAlteracao.Modelo.ITEM_ORCAMENTO,
+    Cliente: RegistroAlteracao.Modelo.CLIENTE,
+}
+
+# Campos do técnico que vão junto com cada OS (tecnico_nome)
+CAMPOS_TECNICO = ('username', 'first_name', 'last_name')
+
+# Quantos registros do log cada chamada consome; o app repete enquanto "mais" for true
+LIMITE_POR_CHAMADA = 500
+
+# O ID do log é reservado no INSERT, não no commit: uma transação mais lenta pode gravar
+# um ID menor depois que o app já leu os maiores. O token só avança até os registros
+# mais velhos que esta janela; os recentes voltam de novo na chamada seguinte
+# (o app grava por (modelo, objeto_id), então repetir não tem efeito).
+# Limite: criado_em também é o horário do INSERT, então uma transação que fica aberta
+# mais que a janela depois de gravar no log ainda pode aparecer abaixo de um token já
+# devolvido (e o app perde essa alteração até a próxima sincronização completa).
+# Onde houver rotinas longas em lote, aumente SINCRONIZACAO_JANELA_SEGUNDOS para
+# cobrir a maior delas.
+JANELA_SEGURANCA = timedelta(seconds=getattr(settings, 'SINCRONIZACAO_JANELA_SEGUNDOS', 60))
+
+
+def registrar_alteracoes(model, ids, operacao=RegistroAlteracao.Operacao.SALVO):
+    """
+    Registra alterações em lote. Use em operações que não disparam sinais
+    (queryset.update, bulk_create, bulk_update).
+    """
+    RegistroAlteracao.objects.bulk_create([
+        RegistroAlteracao(modelo=MODELOS[model], objeto_id=pk, operacao=operacao) for pk in ids
+    ])
+
+
+def _ao_salvar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    RegistroAlteracao.objects.create(modelo=MODELOS[sender], objeto_id=instance.pk)
+
+
+def _ao_remover(sender, instance, **kwargs):
+    RegistroAlteracao.objects.create(
+        modelo=MODELOS[sender], objeto_id=instance.pk, operacao=RegistroAlteracao.Operacao.REMOVIDO
+    )
+
+
+def _antes_de_salvar_tecnico(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._nome_anterior = None
+    if raw or instance._state.adding:
+        return
+    # Ex: o login grava só last_login; o nome não muda
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_TECNICO):
+        return
+    # Só lê o nome anterior de quem tem OS (para os demais a troca não afeta o app)
+    instance._nome_anterior = (
+        sender.objects
+        .filter(Exists(OrdemServico.objects.filter(tecnico=OuterRef('pk'))), pk=instance.pk)
+        .values_list(*CAMPOS_TECNICO)
+        .first()
+    )
+
+
+def _ao_salvar_tecnico(sender, instance, raw=False, **kwargs):
+    # Nome do técnico alterado: as OS dele voltam para o app (e o marcador das listagens muda)
+    anterior = getattr(instance, '_nome_anterior', None)
+    if raw or anterior is None or anterior == tuple(getattr(instance, campo) for campo in CAMPOS_TECNICO):
+        return
+    registrar_alteracoes(OrdemServico, OrdemServico.objects.filter(tecnico=instance).values_list('pk', flat=True))
+
+
+def conectar_sinais():
+    for model in MODELOS:
+        post_save.connect(_ao_salvar, sender=model, dispatch_uid=f'sincronizacao_salvar_{model.__name__}')
+        post_delete.connect(_ao_remover, sender=model, dispatch_uid=f'sincronizacao_remover_{model.__name__}')
+    pre_save.connect(_antes_de_salvar_tecnico, sender=get_user_model(), dispatch_uid='sincronizacao_antes_tecnico')
+    post_save.connect(_ao_salvar_tecnico, sender=get_user_model(), dispatch_uid='sincronizacao_salvar_tecnico')
+
+
+def alteracoes_desde(token, limite=None):
+    """
+    Lê o log a partir do token e devolve só o estado final de cada registro:
+    {'salvos': {modelo: {ids}}, 'removidos': {modelo: {ids}}, 'token': novo_token, 'mais': bool}
+
+    O novo token fica atrás dos registros gravados há menos de JANELA_SEGURANCA.
+    """
+    limite = limite or LIMITE_POR_CHAMADA
+    registros = list(
+        RegistroAlteracao.objects
+        .filter(id__gt=token)
+        .order_by('id')
+        .values_list('id', 'modelo', 'objeto_id', 'operacao', 'criado_em')[:limite + 1]
+    )
+    mais = len(registros) > limite
+    registros = registros[:limite]
+
+    corte = timezone.now() - JANELA_SEGURANCA
+    novo_token = max((_id for _id, *_resto, criado_em in registros if criado_em <= corte), default=token)
+
+    ultimo_estado = {}
+    for _id, modelo, objeto_id, operacao, _criado_em in registros:
+        ultimo_estado[(modelo, objeto_id)] = operacao
+
+    salvos = {modelo: set() for modelo in RegistroAlteracao.Modelo.values}
+    removidos = {modelo: set() for modelo in RegistroAlteracao.Modelo.values}
+    for (modelo, objeto_id), operacao in ultimo_estado.items():
+        destino = removidos if operacao == RegistroAlteracao.Operacao.REMOVIDO else salvos
+        destino[modelo].add(objeto_id)
+
+    return {
+        'salvos': salvos,
+        'removidos': removidos,
+        'token': novo_token,
+        # Página cheia só de registros recentes: o resto vem quando eles saírem da janela
+        'mais': mais and novo_token > token,
+    }
+
+
+def carregar_registros(salvos):
+    """
+    Busca as linhas atuais do que mudou, num número fixo de consultas.
+    Quando uma OS muda, os itens do orçamento de origem vão junto
+    (o celular pode ainda não tê-los, ex: OS recém gerada de um orçamento antigo).
+    """
+    itens_prefetch = Prefetch('orcamento_origem__itens', queryset=ItemOrcamento.objects.select_related('produto'))
+    ordens = list(
+        OrdemServico.objects
+        .filter(pk__in=salvos[RegistroAlteracao.Modelo.ORDEM_SERVICO])
+        .select_related('tecnico', 'orcamento_origem')
+        .prefetch_related(itens_prefetch)
+    )
+
+    itens = {
+        item.pk: item
+        for item in ItemOrcamento.objects.filter(
+            pk__in=salvos[RegistroAlteracao.Modelo.ITEM_ORCAMENTO],
+            orcamento__ordemservico__isnull=False,
+        ).select_related('produto').distinct()
+    }
+    for os_obj in ordens:
+        if os_obj.orcamento_origem:
+            for item in os_obj.orcamento_origem.itens.all():
+                itens[item.pk] = item
+
+    clientes = list(Cliente.objects.filter(pk__in=salvos[RegistroAlteracao.Modelo.CLIENTE]))
+    return ordens, sorted(itens.values(), key=lambda item: item.pk), clientes
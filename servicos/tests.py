@@ -1,3 +1,1164 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.template.loader import render_to_string
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from clientes.models import Cliente
+from core.models import ConfiguracaoSistema, User
+from estoque.models import Categoria, Produto
+from . import fila, indicadores, pdf, services
+from .models import ContagemOS, Orcamento, ItemOrcamento, OrdemServico, RegistroAlteracao, TarefaPDF, TipoDocumento
+
+
+class DadosBaseMixin:
+    """
+    Cria o mínimo necessário para gerar documentos: técnico, cliente, produto e orçamento.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@teste.com', 'senha123')
+        cls.tecnico = User.objects.create_user('tecnico', password='senha123', role=User.Role.TECNICO)
+        cls.cliente = Cliente.objects.create(nome='Cliente Teste', cpf_cnpj='12345678900', telefone='71999990000')
+        cls.categoria = Categoria.objects.create(nome='Câmeras')
+        cls.produto = Produto.objects.create(
+            nome='Câmera IP', categoria=cls.categoria, preco_venda=Decimal('150.00'), quantidade=10
+        )
+        cls.orcamento = Orcamento.objects.create(cliente=cls.cliente, validade=date(2030, 1, 1))
+        ItemOrcamento.objects.create(
+            orcamento=cls.orcamento, produto=cls.produto, quantidade=2, preco_unitario=Decimal('150.00')
+        )
+        cls.os = OrdemServico.objects.create(
+            orcamento_origem=cls.orcamento,
+            cliente=cls.cliente,
+            tecnico=cls.tecnico,
+            descricao_problema='Instalação de câmeras',
+        )
+
+
+class ContextoDocumentoTests(DadosBaseMixin, TestCase):
+    """
+    O número de consultas para montar e renderizar um documento não pode crescer com os itens.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for indice in range(40):
+            produto = Produto.objects.create(nome=f'Produto {indice}', categoria=cls.categoria)
+            ItemOrcamento.objects.create(
+                orcamento=cls.orcamento, produto=produto, quantidade=1, preco_unitario=Decimal('10.00')
+            )
+
+    def setUp(self):
+        # A configuração vem do cache; aquecemos antes de contar as consultas
+        ConfiguracaoSistema.invalidar_cache()
+        ConfiguracaoSistema.carregar()
+
+    def _renderizar(self, tipo, pk):
+        template_name, context, partes, _filename = pdf.montar_contexto(tipo, pk)
+        render_to_string(template_name, context)
+        pdf.impressao_digital(template_name, *partes)
+        return context
+
+    def test_consultas_orcamento(self):
+        with self.assertNumQueries(2):
+            context = self._renderizar(TipoDocumento.ORCAMENTO, self.orcamento.pk)
+        self.assertEqual(len(context['itens']), 41)
+
+    def test_consultas_os(self):
+        with self.assertNumQueries(2):
+            context = self._renderizar(TipoDocumento.OS, self.os.pk)
+        self.assertEqual(len(context['itens']), 41)
+
+    def test_consultas_garantia(self):
+        with self.assertNumQueries(2):
+            self._renderizar(TipoDocumento.GARANTIA, self.os.pk)
+
+
+class PastaTemporariaMixin:
+    """
+    Direciona o cache de PDFs e os uploads para uma pasta temporária.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        settings_patch = override_settings(
+            PDF_CACHE_DIR=os.path.join(self.cache_dir.name, 'pdf'),
+            MEDIA_ROOT=os.path.join(self.cache_dir.name, 'media'),
+        )
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+        self.client.force_login(self.admin)
+
+
+class CachePdfTests(DadosBaseMixin, PastaTemporariaMixin, TestCase):
+
+    @mock.patch('servicos.pdf.renderizar_pdf', return_value=b'%PDF-fake')
+    def test_reimpressao_usa_cache(self, renderizar):
+        url = reverse('orcamento_pdf', args=[self.orcamento.pk])
+
+        self.assertEqual(self.client.get(url).content, b'%PDF-fake')
+        self.assertEqual(self.client.get(url).content, b'%PDF-fake')
+        self.assertEqual(renderizar.call_count, 1)
+
+    @mock.patch('servicos.pdf.renderizar_pdf', return_value=b'%PDF-fake')
+    def test_alteracao_de_item_invalida_cache(self, renderizar):
+        url = reverse('os_pdf', args=[self.os.pk])
+        self.client.get(url)
+
+        item = self.orcamento.itens.get()
+        item.quantidade = 3
+        item.save()
+        self.client.get(url)
+
+        self.assertEqual(renderizar.call_count, 2)
+
+    def test_impressao_digital_muda_com_documento(self):
+        template_name = 'servicos/orcamento_pdf.html'
+        antes = pdf.impressao_digital(template_name, self.orcamento)
+        self.orcamento.desconto = Decimal('10.00')
+        depois = pdf.impressao_digital(template_name, self.orcamento)
+
+        self.assertNotEqual(antes, depois)
+        self.assertNotEqual(antes, pdf.impressao_digital('servicos/os_pdf.html', self.orcamento))
+
+    def test_impressao_digital_com_logo(self):
+        config = ConfiguracaoSistema(nome_empresa='Empresa', logo='config/logos/logo.png')
+        antes = pdf.impressao_digital('servicos/os_pdf.html', config)
+        config.logo = 'config/logos/outra.png'
+
+        self.assertNotEqual(antes, pdf.impressao_digital('servicos/os_pdf.html', config))
+
+    def test_despejo_remove_menos_usados(self):
+        for idade, chave in enumerate(['novo', 'recente', 'antigo']):
+            pdf.gravar_cache(chave, b'x' * 100)
+            caminho = os.path.join(self.cache_dir.name, 'pdf', f'{chave}.pdf')
+            os.utime(caminho, (time.time() - idade * 60, time.time() - idade * 60))
+        pdf.ler_cache('antigo')  # a leitura o torna o mais recente
+
+        pdf.despejar_cache(max_bytes=250)
+
+        self.assertIsNotNone(pdf.ler_cache('antigo'))
+        self.assertIsNotNone(pdf.ler_cache('novo'))
+        self.assertIsNone(pdf.ler_cache('recente'))
+
+    def test_cache_de_imagens_limitado(self):
+        weasyprint = mock.MagicMock()
+        self.addCleanup(pdf._cache_imagens.clear)
+        pdf._cache_imagens.update({f'logo_{i}.png': object() for i in range(pdf.LIMITE_CACHE_IMAGENS)})
+
+        with mock.patch.dict('sys.modules', {'weasyprint': weasyprint}):
+            template_name, context, _partes, _filename = pdf.montar_contexto(TipoDocumento.ORCAMENTO, self.orcamento.pk)
+            pdf.renderizar_pdf(template_name, context)
+
+        self.assertEqual(pdf._cache_imagens, {})
+        self.assertIs(weasyprint.HTML.return_value.write_pdf.call_args.kwargs['cache'], pdf._cache_imagens)
+
+
+@mock.patch('servicos.pdf.renderizar_pdf', return_value=b'%PDF-fake')
+class FilaPdfTests(DadosBaseMixin, PastaTemporariaMixin, TestCase):
+
+    def test_fluxo_assincrono(self, renderizar):
+        resposta = self.client.get(reverse('garantia_pdf', args=[self.os.pk]), {'assincrono': '1'})
+        self.assertEqual(resposta.status_code, 202)
+        dados = resposta.json()
+        self.assertEqual(dados['status'], TarefaPDF.Status.PENDENTE)
+        self.assertIsNone(dados['download_url'])
+        renderizar.assert_not_called()
+
+        fila.executar_worker(sair_quando_vazia=True)
+
+        dados = self.client.get(dados['status_url']).json()
+        self.assertEqual(dados['status'], TarefaPDF.Status.CONCLUIDO)
+        download = self.client.get(dados['download_url'])
+        self.assertEqual(b''.join(download.streaming_content), b'%PDF-fake')
+        self.assertIn(f'garantia_os_{self.os.pk}.pdf', download['Content-Disposition'])
+
+    def test_reivindicacao_nao_repete_tarefa(self, renderizar):
+        tarefa = fila.enfileirar('os', self.os.pk)
+
+        self.assertEqual(fila.reivindicar_proxima().pk, tarefa.pk)
+        self.assertIsNone(fila.reivindicar_proxima())
+
+    def test_erro_de_renderizacao_fica_registrado(self, renderizar):
+        renderizar.side_effect = RuntimeError('falhou')
+        tarefa = fila.enfileirar('orcamento', self.orcamento.pk)
+
+        fila.executar_worker(sair_quando_vazia=True)
+
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.ERRO)
+        self.assertIn('RuntimeError', tarefa.erro)
+
+    def test_expiradas_sao_apagadas(self, renderizar):
+        antiga, recente = fila.enfileirar('os', self.os.pk), fila.enfileirar('os', self.os.pk)
+        fila.executar_worker(sair_quando_vazia=True)
+        antiga.refresh_from_db()
+        caminho = antiga.arquivo.path
+        TarefaPDF.objects.filter(pk=antiga.pk).update(
+            concluido_em=timezone.now() - timedelta(days=fila.DIAS_RETENCAO + 1)
+        )
+
+        self.assertEqual(fila.limpar_expiradas(), 1)
+        self.assertFalse(os.path.exists(caminho))
+        self.assertEqual(list(TarefaPDF.objects.values_list('id', flat=True)), [recente.pk])
+
+    @mock.patch('servicos.fila.MANUTENCAO_SEGUNDOS', 0)
+    def test_worker_devolve_travadas_sem_reiniciar(self, renderizar):
+        tarefa = fila.enfileirar('os', self.os.pk)
+        TarefaPDF.objects.filter(pk=tarefa.pk).update(
+            status=TarefaPDF.Status.PROCESSANDO, iniciado_em=timezone.now() - timedelta(hours=1)
+        )
+
+        fila.executar_worker(sair_quando_vazia=True)
+
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaPDF.Status.CONCLUIDO)
+
+    def test_resultado_de_tarefa_reivindicada_por_outro_worker_e_descartado(self, renderizar):
+        fila.enfileirar('os', self.os.pk)
+        tarefa = fila.reivindicar_proxima()
+        # Devolvida por liberar_travadas e pega por outro worker enquanto este renderizava
+        TarefaPDF.objects.filter(pk=tarefa.pk).update(iniciado_em=timezone.now() + timedelta(seconds=1))
+
+        fila.processar(tarefa)
+
+        self.assertEqual(TarefaPDF.objects.get(pk=tarefa.pk).status, TarefaPDF.Status.PROCESSANDO)
+        self.assertFalse(os.listdir(os.path.join(self.cache_dir.name, 'media', 'pdf', 'tarefas')))
+
+    def test_renderizacao_inline_continua_padrao(self, renderizar):
+        resposta = self.client.get(reverse('orcamento_pdf', args=[self.orcamento.pk]))
+
+        self.assertEqual(resposta['Content-Type'], 'application/pdf')
+        self.assertFalse(TarefaPDF.objects.exists())
+
+
+@override_settings(PDF_LOTE_PROCESSOS=1)
+@mock.patch('servicos.pdf.renderizar_pdf', return_value=b'%PDF-fake')
+class ExportacaoLotePdfTests(DadosBaseMixin, PastaTemporariaMixin, TestCase):
+
+    def _zip_da_acao(self, model_name, ids):
+        resposta = self.client.post(
+            reverse(f'admin:servicos_{model_name}_changelist'),
+            {'action': 'exportar_pdfs', '_selected_action': ids},
+        )
+        self.assertEqual(resposta['Content-Type'], 'application/zip')
+        conteudo = io.BytesIO(b''.join(resposta.streaming_content))
+        return zipfile.ZipFile(conteudo)
+
+    def test_acao_os_inclui_garantia(self, renderizar):
+        arquivo_zip = self._zip_da_acao('ordemservico', [self.os.pk])
+
+        self.assertEqual(
+            sorted(arquivo_zip.namelist()),
+            [f'garantia_os_{self.os.pk}.pdf', f'os_{self.os.pk}.pdf'],
+        )
+        self.assertEqual(arquivo_zip.read(f'os_{self.os.pk}.pdf'), b'%PDF-fake')
+
+    def test_falha_em_um_documento_nao_interrompe_lote(self, renderizar):
+        renderizar.side_effect = [b'%PDF-fake', RuntimeError('falhou')]
+        outro = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+
+        arquivo_zip = self._zip_da_acao('orcamento', [self.orcamento.pk, outro.pk])
+
+        self.assertIn(f'orcamento_{self.orcamento.pk}.pdf', arquivo_zip.namelist())
+        self.assertIn('RuntimeError', arquivo_zip.read('ERROS.txt').decode())
+
+    def test_comando_grava_zip(self, renderizar):
+        saida = os.path.join(self.cache_dir.name, 'lote.zip')
+        call_command('exportar_pdfs', 'os', '--saida', saida, '--sem-garantia', '--processos', '1', stdout=io.StringIO())
+
+        self.assertEqual(zipfile.ZipFile(saida).namelist(), [f'os_{self.os.pk}.pdf'])
+
+
+class OrdemServicoApiTests(DadosBaseMixin, TestCase):
+    """
+    A listagem da API faz sempre o mesmo número de consultas, seja qual for o tamanho da página.
+    """
+    # Marcador (ETag) + COUNT da paginação + página de OS (com cliente/técnico/orçamento) + itens com produto
+    CONSULTAS_POR_PAGINA = 4
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.tecnico)
+
+    def _criar_os(self, quantidade):
+        for indice in range(quantidade):
+            orcamento = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+            for _ in range(3):
+                ItemOrcamento.objects.create(
+                    orcamento=orcamento, produto=self.produto, quantidade=1, preco_unitario=Decimal('10.00')
+                )
+            OrdemServico.objects.create(
+                orcamento_origem=orcamento, cliente=self.cliente, tecnico=self.tecnico,
+                descricao_problema=f'OS {indice}',
+            )
+
+    def test_consultas_constantes_por_pagina(self):
+        with self.assertNumQueries(self.CONSULTAS_POR_PAGINA):
+            resposta = self.api.get('/servicos/api/ordens/')
+        self.assertEqual(len(resposta.json()['results']), 1)
+
+        self._criar_os(25)
+        with self.assertNumQueries(self.CONSULTAS_POR_PAGINA):
+            resposta = self.api.get('/servicos/api/ordens/')
+        self.assertEqual(len(resposta.json()['results']), 20)
+        self.assertEqual(len(resposta.json()['results'][0]['itens']), 3)
+
+    def test_paginacao_por_cursor_sem_count(self):
+        self._criar_os(25)
+
+        # Sem o COUNT(*): página de OS + itens
+        with self.assertNumQueries(self.CONSULTAS_POR_PAGINA - 1):
+            resposta = self.api.get('/servicos/api/ordens/', {'paginacao': 'cursor'})
+        dados = resposta.json()
+        self.assertNotIn('count', dados)
+        self.assertEqual(len(dados['results']), 20)
+
+        # Uma OS aberta durante a rolagem não desloca a próxima página
+        self._criar_os(1)
+        segunda = self.api.get(dados['next']).json()
+        ids = [os_['id'] for os_ in dados['results'] + segunda['results']]
+        self.assertEqual(len(ids), 26)
+        self.assertEqual(len(set(ids)), 26)
+        self.assertIsNone(segunda['next'])
+
+    def test_cursor_com_datas_iguais_sem_offset(self):
+        self._criar_os(45)
+        OrdemServico.objects.update(data_abertura=timezone.now())
+
+        paginas, url, params = [], '/servicos/api/ordens/', {'paginacao': 'cursor'}
+        with CaptureQueriesContext(connection) as consultas:
+            while url:
+                dados = self.api.get(url, params).json()
+                paginas.append([os_['id'] for os_ in dados['results']])
+                url, params = dados['next'], None
+        ids = [pk for pagina in paginas for pk in pagina]
+        self.assertEqual(ids, sorted(OrdemServico.objects.values_list('id', flat=True), reverse=True))
+        self.assertEqual([len(pagina) for pagina in paginas], [20, 20, 6])
+        self.assertFalse([q['sql'] for q in consultas if 'OFFSET' in q['sql']])
+
+        # E de volta pelo "previous"
+        anterior = self.api.get(dados['previous']).json()
+        self.assertEqual([os_['id'] for os_ in anterior['results']], paginas[1])
+
+    def test_campos_solicitados(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.api.get('/servicos/api/ordens/', {'fields': 'id,status,cliente.nome'})
+
+        self.assertEqual(
+            resposta.json()['results'][0],
+            {'id': self.os.pk, 'status': 'PENDENTE', 'cliente': {'nome': 'Cliente Teste'}},
+        )
+        # Marcador + COUNT + página; nada de itens, técnico ou textos longos
+        self.assertEqual(len(consultas), 3)
+        sql = consultas[-1]['sql']
+        self.assertNotIn('laudo_tecnico', sql)
+        self.assertNotIn('core_user', sql)
+        self.assertNotIn('cpf_cnpj', sql)
+
+    def test_campos_aninhados_dos_itens(self):
+        resposta = self.api.get(f'/servicos/api/ordens/{self.os.pk}/', {'fields': 'id,itens.produto.nome'})
+
+        self.assertEqual(resposta.json(), {'id': self.os.pk, 'itens': [{'produto': {'nome': 'Câmera IP'}}]})
+
+    def test_formato_resumo(self):
+        self._criar_os(5)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.api.get('/servicos/api/ordens/', {'formato': 'resumo', 'paginacao': 'cursor'})
+
+        self.assertEqual(
+            set(resposta.json()['results'][0]), {'id', 'cliente_nome', 'status', 'data_abertura'}
+        )
+        self.assertEqual(len(consultas), 2)
+        self.assertNotIn('descricao_problema', consultas[-1]['sql'])
+
+    def test_detalhe(self):
+        with self.assertNumQueries(3):
+            resposta = self.api.get(f'/servicos/api/ordens/{self.os.pk}/')
+
+        dados = resposta.json()
+        self.assertEqual(dados['cliente']['nome'], 'Cliente Teste')
+        self.assertEqual(dados['itens'][0]['produto']['nome'], 'Câmera IP')
+
+    def test_busca_por_cliente(self):
+        outro = Cliente.objects.create(nome='Padaria Estrela', cpf_cnpj='55566677788', telefone='71988887777')
+        OrdemServico.objects.create(cliente=outro, tecnico=self.tecnico, descricao_problema='Alarme')
+
+        resposta = self.api.get('/servicos/api/ordens/', {'busca': 'estrela'})
+        self.assertEqual([os_['cliente']['id'] for os_ in resposta.json()['results']], [outro.pk])
+
+
+@mock.patch('servicos.sincronizacao.JANELA_SEGURANCA', timedelta(0))
+class SincronizacaoApiTests(DadosBaseMixin, TestCase):
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.tecnico)
+
+    def _sync(self, token=None):
+        params = {'token': token} if token is not None else {}
+        resposta = self.api.get('/servicos/api/sync/', params)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()
+
+    def test_primeira_sincronizacao_traz_tudo(self):
+        dados = self._sync()
+
+        self.assertEqual([os_['id'] for os_ in dados['ordens']], [self.os.pk])
+        self.assertEqual(len(dados['itens']), 1)
+        self.assertEqual([c['id'] for c in dados['clientes']], [self.cliente.pk])
+        self.assertFalse(dados['mais'])
+
+    def test_delta_traz_so_o_que_mudou(self):
+        token = self._sync()['token']
+        self.assertEqual(self._sync(token)['ordens'], [])
+
+        self.os.laudo_tecnico = 'Câmeras instaladas'
+        self.os.save()
+        dados = self._sync(token)
+
+        self.assertEqual(dados['ordens'][0]['laudo_tecnico'], 'Câmeras instaladas')
+        self.assertEqual(dados['clientes'], [])
+        self.assertNotEqual(dados['token'], token)
+
+    def test_remocoes(self):
+        token = self._sync()['token']
+        item = self.orcamento.itens.get()
+        item_id = item.pk
+        item.delete()
+
+        dados = self._sync(token)
+        self.assertEqual(dados['removidos']['itens'], [item_id])
+
+    def test_os_nova_de_orcamento_antigo_leva_itens(self):
+        orcamento = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+        ItemOrcamento.objects.create(orcamento=orcamento, produto=self.produto, preco_unitario=Decimal('5.00'))
+        token = self._sync()['token']
+
+        nova = OrdemServico.objects.create(
+            orcamento_origem=orcamento, cliente=self.cliente, tecnico=self.tecnico, descricao_problema='Nova'
+        )
+        dados = self._sync(token)
+
+        self.assertEqual([os_['id'] for os_ in dados['ordens']], [nova.pk])
+        self.assertEqual([item['orcamento'] for item in dados['itens']], [orcamento.pk])
+
+    def test_consultas_constantes(self):
+        for indice in range(10):
+            OrdemServico.objects.create(
+                orcamento_origem=self.orcamento, cliente=self.cliente, tecnico=self.tecnico,
+                descricao_problema=f'OS {indice}',
+            )
+        # log + OS (com técnico/orçamento) + itens das OS + itens alterados + clientes
+        with self.assertNumQueries(5):
+            self._sync()
+
+    @mock.patch('servicos.sincronizacao.LIMITE_POR_CHAMADA', 2)
+    def test_token_em_partes(self):
+        dados = self._sync()
+        self.assertTrue(dados['mais'])
+        dados = self._sync(dados['token'])
+        self.assertFalse(dados['mais'])
+
+    def test_renomear_tecnico_devolve_as_os(self):
+        token = self._sync()['token']
+        self.tecnico.first_name = 'Carlos'
+        self.tecnico.save()
+
+        self.assertEqual([os_['id'] for os_ in self._sync(token)['ordens']], [self.os.pk])
+
+    def test_login_e_usuario_sem_os_nao_consultam_nome(self):
+        self.tecnico.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.tecnico.save(update_fields=['last_login'])
+
+        sem_os = User.objects.create_user('sem_os', role=User.Role.TECNICO)
+        sem_os.first_name = 'Novo'
+        antes = RegistroAlteracao.objects.count()
+        sem_os.save()
+        self.assertEqual(RegistroAlteracao.objects.count(), antes)
+
+    def test_token_invalido(self):
+        self.assertEqual(self.api.get('/servicos/api/sync/', {'token': 'abc'}).status_code, 400)
+
+    def test_alteracoes_recentes_voltam_ate_sair_da_janela(self):
+        token = self._sync()['token']
+        self.os.laudo_tecnico = 'Câmeras instaladas'
+        self.os.save()
+
+        with mock.patch('servicos.sincronizacao.JANELA_SEGURANCA', timedelta(seconds=60)):
+            # Dentro da janela: volta a OS, mas o token não passa dela
+            dados = self._sync(token)
+            self.assertEqual([os_['id'] for os_ in dados['ordens']], [self.os.pk])
+            self.assertEqual(dados['token'], token)
+            self.assertEqual([os_['id'] for os_ in self._sync(token)['ordens']], [self.os.pk])
+
+            depois = timezone.now() + timedelta(seconds=61)
+            with mock.patch('servicos.sincronizacao.timezone.now', return_value=depois):
+                dados = self._sync(token)
+            self.assertNotEqual(dados['token'], token)
+            self.assertEqual(self._sync(dados['token'])['ordens'], [])
+
+    def test_compactacao_preserva_estado_final(self):
+        for _ in range(3):
+            self.os.save()
+        call_command('compactar_sincronizacao', stdout=io.StringIO())
+
+        self.assertEqual(
+            RegistroAlteracao.objects.filter(modelo='ordemservico', objeto_id=self.os.pk).count(), 1
+        )
+        self.assertEqual(len(self._sync()['ordens']), 1)
+
+
+class EnvioOfflineApiTests(DadosBaseMixin, TestCase):
+    """
+    POST /servicos/api/ordens/lote/: alterações feitas offline, gravadas num lote só.
+    """
+    URL = '/servicos/api/ordens/lote/'
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.tecnico)
+
+    def _enviar(self, atualizacoes):
+        resposta = self.api.post(self.URL, {'atualizacoes': atualizacoes}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()['resultados']
+
+    def test_aplica_e_incrementa_versao(self):
+        ultimo_log = RegistroAlteracao.objects.order_by('-id').values_list('id', flat=True).first()
+        resultados = self._enviar([
+            {'id': self.os.pk, 'versao': self.os.versao, 'status': 'FINALIZADO', 'laudo_tecnico': 'Concluído'},
+        ])
+
+        self.assertEqual(resultados, [{'id': self.os.pk, 'resultado': 'aplicado', 'versao': 2}])
+        self.os.refresh_from_db()
+        self.assertEqual(self.os.laudo_tecnico, 'Concluído')
+        self.assertIsNotNone(self.os.data_finalizacao)
+        self.assertTrue(self.os.sincronizado)
+        # bulk_update não dispara sinais: o log de sincronização é gravado pelo serviço
+        self.assertTrue(RegistroAlteracao.objects.filter(
+            id__gt=ultimo_log, modelo='ordemservico', objeto_id=self.os.pk
+        ).exists())
+
+    def test_conflito_de_versao(self):
+        self.os.laudo_tecnico = 'Alterado no escritório'
+        self.os.save()
+
+        resultados = self._enviar([{'id': self.os.pk, 'versao': 1, 'laudo_tecnico': 'Do celular'}])
+
+        self.assertEqual(resultados[0]['resultado'], 'conflito')
+        self.assertEqual(resultados[0]['versao_atual'], 2)
+        self.os.refresh_from_db()
+        self.assertEqual(self.os.laudo_tecnico, 'Alterado no escritório')
+        self.assertFalse(self.os.sincronizado)
+
+    def test_resultado_por_registro(self):
+        outra = OrdemServico.objects.create(cliente=self.cliente, tecnico=self.tecnico, descricao_problema='Outra')
+        resultados = self._enviar([
+            {'id': self.os.pk, 'versao': 1, 'status': 'ANDAMENTO'},
+            {'id': 999999, 'versao': 1},
+            {'id': outra.pk, 'versao': 1, 'status': 'INEXISTENTE'},
+            {'id': self.os.pk, 'versao': 1, 'status': 'CANCELADO'},
+        ])
+
+        self.assertEqual(
+            [resultado['resultado'] for resultado in resultados],
+            ['aplicado', 'nao_encontrada', 'invalido', 'conflito'],
+        )
+        self.os.refresh_from_db()
+        self.assertEqual(self.os.status, 'ANDAMENTO')
+        self.assertTrue(self.os.sincronizado)
+
+    def test_consultas_constantes(self):
+        ordens = [
+            OrdemServico.objects.create(cliente=self.cliente, tecnico=self.tecnico, descricao_problema=f'OS {i}')
+            for i in range(20)
+        ]
+        # leitura (FOR UPDATE) + UPDATE em lote + log de sincronização, dentro de uma transação
+        with CaptureQueriesContext(connection) as consultas:
+            self._enviar([{'id': os_obj.pk, 'versao': 1, 'laudo_tecnico': 'ok'} for os_obj in ordens])
+        escritas = [q for q in consultas.captured_queries if 'servicos_ordemservico' in q['sql']]
+        self.assertEqual(len(escritas), 2)
+
+    def test_payload_invalido(self):
+        resposta = self.api.post(self.URL, {'atualizacoes': 'x'}, format='json')
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_os_de_outro_tecnico_e_proibida(self):
+        outro = User.objects.create_user('outro', password='senha123', role=User.Role.TECNICO)
+        alheia = OrdemServico.objects.create(cliente=self.cliente, tecnico=outro, descricao_problema='Alheia')
+        resultados = self._enviar([
+            {'id': alheia.pk, 'versao': 1, 'status': 'CANCELADO'},
+            {'id': self.os.pk, 'versao': 1, 'laudo_tecnico': 'ok'},
+        ])
+
+        self.assertEqual([r['resultado'] for r in resultados], ['proibida', 'aplicado'])
+        alheia.refresh_from_db()
+        self.assertEqual(alheia.status, OrdemServico.Status.PENDENTE)
+
+        # Com a permissão de alterar OS, qualquer uma pode ser alterada
+        self.api.force_authenticate(self.admin)
+        resultados = self._enviar([{'id': alheia.pk, 'versao': 1, 'status': 'ANDAMENTO'}])
+        self.assertEqual(resultados[0]['resultado'], 'aplicado')
+
+    def test_sem_permissao(self):
+        atendente = User.objects.create_user('atendente', password='senha123', role=User.Role.FINANCEIRO)
+        self.api.force_authenticate(atendente)
+        resposta = self.api.post(self.URL, {'atualizacoes': [{'id': self.os.pk, 'versao': 1}]}, format='json')
+        self.assertEqual(resposta.status_code, 403)
+
+    def test_admin_recusa_versao_antiga(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:servicos_ordemservico_change', args=[self.os.pk])
+        dados = {
+            'orcamento_origem': self.orcamento.pk, 'cliente': self.cliente.pk, 'tecnico': self.tecnico.pk,
+            'status': 'ANDAMENTO', 'descricao_problema': 'Instalação de câmeras', 'laudo_tecnico': 'Do escritório',
+            'desconto': '0', 'data_finalizacao_0': '', 'data_finalizacao_1': '', 'versao_carregada': self.os.versao,
+        }
+        # O celular alterou a OS depois que o formulário foi aberto
+        self._enviar([{'id': self.os.pk, 'versao': self.os.versao, 'laudo_tecnico': 'Do celular'}])
+
+        resposta = self.client.post(url, dados)
+        self.assertEqual(resposta.status_code, 200)
+        self.os.refresh_from_db()
+        self.assertEqual(self.os.laudo_tecnico, 'Do celular')
+
+        dados['versao_carregada'] = self.os.versao
+        self.assertEqual(self.client.post(url, dados).status_code, 302)
+        self.os.refresh_from_db()
+        self.assertEqual(self.os.laudo_tecnico, 'Do escritório')
+
+
+class ExportacaoDadosTests(DadosBaseMixin, TestCase):
+    """
+    Exportação CSV/NDJSON em streaming, lida do banco em lotes.
+    """
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _conteudo(self, resposta):
+        self.assertTrue(resposta.streaming)
+        return b''.join(resposta.streaming_content).decode('utf-8')
+
+    def test_orcamentos_csv_uma_linha_por_item(self):
+        vazio = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+        resposta = self.client.get(reverse('exportar_orcamentos', args=['csv']))
+
+        linhas = self._conteudo(resposta).lstrip('\ufeff').splitlines()
+        self.assertTrue(linhas[0].startswith('id;status;'))
+        self.assertIn('itens.produto', linhas[0])
+        self.assertEqual(len(linhas), 3)
+        self.assertIn('Câmera IP', linhas[1])
+        self.assertTrue(linhas[2].startswith(f'{vazio.pk};'))
+
+    def test_orcamentos_ndjson_com_itens(self):
+        resposta = self.client.get(reverse('exportar_orcamentos', args=['ndjson']))
+
+        registros = [json.loads(linha) for linha in self._conteudo(resposta).splitlines()]
+        self.assertEqual(registros[0]['id'], self.orcamento.pk)
+        self.assertEqual(registros[0]['itens'][0]['produto'], 'Câmera IP')
+        self.assertEqual(resposta['Content-Type'], 'application/x-ndjson')
+
+    @mock.patch('core.exportacao.TAMANHO_LOTE', 2)
+    def test_le_em_lotes(self):
+        for _ in range(5):
+            orcamento = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+            ItemOrcamento.objects.create(orcamento=orcamento, produto=self.produto, preco_unitario=Decimal('1.00'))
+
+        # Um cursor lido em lotes de 2 + os itens de cada lote (6 orçamentos = 3 lotes)
+        resposta = self.client.get(reverse('exportar_orcamentos', args=['ndjson']))
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self._conteudo(resposta).splitlines()), 6)
+
+    def test_acao_do_admin_exporta_selecao(self):
+        resposta = self.client.post(reverse('admin:servicos_ordemservico_changelist'), {
+            'action': 'exportar_csv', '_selected_action': [self.os.pk],
+        })
+        linhas = self._conteudo(resposta).splitlines()
+        self.assertEqual(len(linhas), 2)
+        self.assertIn('Cliente Teste', linhas[1])
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get(reverse('exportar_os', args=['xlsx'])).status_code, 404)
+
+
+class TotaisOrcamentoTests(DadosBaseMixin, TestCase):
+    """
+    Totais do orçamento mantidos no banco a cada item, sem recalcular em Python.
+    """
+
+    def _totais(self):
+        self.orcamento.refresh_from_db()
+        return self.orcamento.valor_bruto, self.orcamento.valor_total
+
+    def test_item_salvo_e_apagado_atualiza_totais(self):
+        Orcamento.objects.filter(pk=self.orcamento.pk).update(desconto=Decimal('50.00'))
+        item = ItemOrcamento.objects.create(
+            orcamento=self.orcamento, produto=self.produto, quantidade=1, preco_unitario=Decimal('99.99')
+        )
+        self.assertEqual(self._totais(), (Decimal('399.99'), Decimal('349.99')))
+
+        versao = self.orcamento.versao
+        item.delete()
+        self.assertEqual(self._totais(), (Decimal('300.00'), Decimal('250.00')))
+        self.assertEqual(self.orcamento.versao, versao + 1)
+
+    def test_save_de_copia_antiga_nao_sobrescreve_o_bruto(self):
+        antigo = Orcamento.objects.get(pk=self.orcamento.pk)
+        ItemOrcamento.objects.create(
+            orcamento=self.orcamento, produto=self.produto, quantidade=1, preco_unitario=Decimal('10.00')
+        )
+        antigo.desconto = Decimal('10.00')
+        antigo.save()
+        self.assertEqual(self._totais(), (Decimal('310.00'), Decimal('300.00')))
+
+    def test_save_parcial_so_recalcula_com_valores(self):
+        self.orcamento.status = Orcamento.Status.ENVIADO
+        with CaptureQueriesContext(connection) as consultas:
+            self.orcamento.save(update_fields=['status'])
+        self.assertFalse([q['sql'] for q in consultas if 'SUM(' in q['sql']])
+
+        self.orcamento.desconto = Decimal('20.00')
+        self.orcamento.save(update_fields=['desconto'])
+        self.assertEqual(self._totais(), (Decimal('300.00'), Decimal('280.00')))
+
+    def test_admin_salva_inline_com_um_update(self):
+        self.client.force_login(self.admin)
+        item = self.orcamento.itens.get()
+        dados = {
+            'cliente': self.cliente.pk, 'validade': '2030-01-01', 'status': Orcamento.Status.RASCUNHO,
+            'observacoes': '', 'desconto': '0.00',
+            'itens-TOTAL_FORMS': 3, 'itens-INITIAL_FORMS': 1, 'itens-MIN_NUM_FORMS': 0, 'itens-MAX_NUM_FORMS': 1000,
+            'itens-0-id': item.pk, 'itens-0-orcamento': self.orcamento.pk, 'itens-0-produto': self.produto.pk,
+            'itens-0-quantidade': 3, 'itens-0-preco_unitario': '150.00',
+            'itens-1-orcamento': self.orcamento.pk, 'itens-1-produto': self.produto.pk,
+            'itens-1-quantidade': 1, 'itens-1-preco_unitario': '25.50',
+            'itens-2-orcamento': self.orcamento.pk, 'itens-2-produto': self.produto.pk,
+            'itens-2-quantidade': 2, 'itens-2-preco_unitario': '10.00',
+        }
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.post(reverse('admin:servicos_orcamento_change', args=[self.orcamento.pk]), dados)
+        self.assertEqual(resposta.status_code, 302)
+
+        updates = [q['sql'] for q in consultas if q['sql'].startswith('UPDATE "servicos_orcamento"')]
+        # Um do save do próprio orçamento e um único para os três itens do inline
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self._totais(), (Decimal('495.50'), Decimal('495.50')))
+
+    def test_comando_corrige_itens_em_lote(self):
+        outro = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+        ItemOrcamento.objects.bulk_create([
+            ItemOrcamento(orcamento=outro, produto=self.produto, quantidade=2, preco_unitario=Decimal('12.50'),
+                          subtotal=Decimal('25.00'))
+            for _ in range(3)
+        ])
+        saida = io.StringIO()
+        call_command('recalcular_totais_orcamentos', tamanho_lote=1, stdout=saida)
+
+        self.assertIn('1 orçamento(s) corrigido(s)', saida.getvalue())
+        outro.refresh_from_db()
+        self.assertEqual((outro.valor_bruto, outro.valor_total), (Decimal('75.00'), Decimal('75.00')))
+        self.assertEqual(self._totais(), (Decimal('300.00'), Decimal('300.00')))
+
+
+class ConversaoOrcamentosTests(DadosBaseMixin, TestCase):
+    """
+    Geração de OS em lote a partir dos orçamentos aprovados (admin, comando e API).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.aprovados = Orcamento.objects.bulk_create([
+            Orcamento(cliente=cls.cliente, validade=date(2030, 1, 1), status=Orcamento.Status.APROVADO,
+                      valor_bruto=Decimal('100.00'), desconto=Decimal('10.00'), valor_total=Decimal('90.00'))
+            for _ in range(3)
+        ])
+        cls.rascunho = Orcamento.objects.create(cliente=cls.cliente, validade=date(2030, 1, 1))
+        # O orçamento base da mixin já tem OS
+        Orcamento.objects.filter(pk=cls.orcamento.pk).update(status=Orcamento.Status.APROVADO)
+
+    def _todos(self):
+        return [self.orcamento.pk, self.rascunho.pk] + [orcamento.pk for orcamento in self.aprovados]
+
+    def test_converte_em_consultas_fixas(self):
+        # Fixas: não dependem de quantos orçamentos são convertidos (só de quantos dias/status mudam nos indicadores)
+        with self.assertNumQueries(8):
+            resultado = services.gerar_os_de_orcamentos(self._todos(), self.tecnico)
+
+        self.assertEqual([orcamento_id for orcamento_id, _os_id in resultado['convertidos']],
+                         [orcamento.pk for orcamento in self.aprovados])
+        self.assertEqual(resultado['nao_aprovados'], [self.rascunho.pk])
+        self.assertEqual(resultado['ja_convertidos'], [self.orcamento.pk])
+
+        os_obj = OrdemServico.objects.get(orcamento_origem=self.aprovados[0])
+        self.assertEqual((os_obj.valor_total, os_obj.tecnico, os_obj.status),
+                         (Decimal('90.00'), self.tecnico, OrdemServico.Status.PENDENTE))
+        self.assertEqual(Orcamento.objects.filter(status=Orcamento.Status.CONVERTIDO).count(), 3)
+        self.assertTrue(RegistroAlteracao.objects.filter(
+            modelo=RegistroAlteracao.Modelo.ORDEM_SERVICO, objeto_id=os_obj.pk
+        ).exists())
+
+        # Segunda vez: nada a converter
+        self.assertEqual(services.gerar_os_de_orcamentos(self._todos(), self.tecnico)['convertidos'], [])
+
+    def test_falha_desfaz_tudo(self):
+        with mock.patch('servicos.sincronizacao.registrar_alteracoes', side_effect=RuntimeError('falhou')):
+            with self.assertRaises(RuntimeError):
+                services.gerar_os_de_orcamentos(self._todos(), self.tecnico)
+
+        self.assertEqual(OrdemServico.objects.count(), 1)
+        self.assertFalse(Orcamento.objects.filter(status=Orcamento.Status.CONVERTIDO).exists())
+
+    def test_acao_do_admin(self):
+        self.client.force_login(self.admin)
+        resposta = self.client.post(reverse('admin:servicos_orcamento_changelist'), {
+            'action': 'gerar_os', '_selected_action': self._todos(),
+        }, follow=True)
+
+        mensagens = [str(mensagem) for mensagem in resposta.context['messages']]
+        self.assertEqual(len(mensagens), 3)
+        self.assertEqual(OrdemServico.objects.filter(tecnico=self.admin).count(), 3)
+
+    def test_comando(self):
+        saida = io.StringIO()
+        call_command('gerar_os_orcamentos', '--aprovados', '--tecnico', 'tecnico', stdout=saida)
+        self.assertIn('3 OS gerada(s).', saida.getvalue())
+
+    def test_api(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        resposta = api.post('/servicos/api/ordens/gerar/', {'orcamentos': self._todos()}, format='json')
+
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(len(resposta.json()['convertidos']), 3)
+        self.assertEqual(resposta.json()['nao_aprovados'], [self.rascunho.pk])
+
+        api.force_authenticate(self.tecnico)
+        self.assertEqual(api.post('/servicos/api/ordens/gerar/', {'orcamentos': [1]}, format='json').status_code, 403)
+
+
+class EstoqueOrcamentoOsTests(DadosBaseMixin, TestCase):
+    """
+    Reserva na aprovação do orçamento, baixa na OS finalizada e liberação no cancelamento.
+    """
+
+    def _saldo(self):
+        self.produto.refresh_from_db()
+        return self.produto.quantidade, self.produto.reservado
+
+    def test_aprovar_reserva_uma_vez(self):
+        self.assertEqual(services.aprovar_orcamentos([self.orcamento.pk]), [self.orcamento.pk])
+        self.assertEqual(self._saldo(), (10, 2))
+
+        # Aprovado de novo / reserva repetida: nada muda
+        self.assertEqual(services.aprovar_orcamentos([self.orcamento.pk]), [])
+        services.reservar_estoque([self.orcamento.pk])
+        self.assertEqual(self._saldo(), (10, 2))
+
+    def test_aprovar_sem_estoque_nao_aprova(self):
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade=1)
+        self.client.force_login(self.admin)
+        self.client.post(reverse('admin:servicos_orcamento_changelist'), {
+            'action': 'marcar_aprovado', '_selected_action': [self.orcamento.pk],
+        })
+
+        self.orcamento.refresh_from_db()
+        self.assertEqual(self.orcamento.status, Orcamento.Status.RASCUNHO)
+        self.assertEqual(self._saldo(), (1, 0))
+
+    def test_os_finalizada_no_celular_baixa_a_reserva(self):
+        services.aprovar_orcamentos([self.orcamento.pk])
+        api = APIClient()
+        api.force_authenticate(self.tecnico)
+        envio = {'atualizacoes': [{'id': self.os.pk, 'versao': self.os.versao, 'status': 'FINALIZADO'}]}
+        api.post('/servicos/api/ordens/lote/', envio, format='json')
+
+        self.assertEqual(self._saldo(), (8, 0))
+        self.assertEqual(
+            list(self.produto.movimentos.order_by('id').values_list('tipo', 'ordem_servico')),
+            [('R', None), ('B', self.os.pk)],
+        )
+
+    def test_os_sem_reserva_e_cancelamento(self):
+        self.os.status = OrdemServico.Status.FINALIZADO
+        self.os.save()
+        services.movimentar_estoque_da_os(self.os)
+        services.movimentar_estoque_da_os(self.os)
+        self.assertEqual(self._saldo(), (8, 0))
+
+        outro = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+        ItemOrcamento.objects.create(orcamento=outro, produto=self.produto, quantidade=3, preco_unitario=Decimal('1.00'))
+        services.aprovar_orcamentos([outro.pk])
+        cancelada = OrdemServico.objects.create(
+            orcamento_origem=outro, cliente=self.cliente, tecnico=self.tecnico,
+            descricao_problema='Cancelada', status=OrdemServico.Status.CANCELADO,
+        )
+        services.movimentar_estoque_da_os(cancelada)
+        self.assertEqual(self._saldo(), (8, 0))
+
+    def test_item_alterado_apos_aprovacao_libera_o_reservado(self):
+        Produto.objects.filter(pk=self.produto.pk).update(quantidade=20)
+        outro = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1))
+        ItemOrcamento.objects.create(orcamento=outro, produto=self.produto, quantidade=5, preco_unitario=Decimal('1.00'))
+        services.aprovar_orcamentos([self.orcamento.pk, outro.pk])
+        self.assertEqual(self._saldo(), (20, 7))
+
+        # Aumentar o item de um orçamento aprovado reserva a diferença
+        item = self.orcamento.itens.get()
+        item.quantidade = 6
+        item.save()
+        self.assertEqual(self._saldo(), (20, 11))
+
+        # Reduzir libera o excesso; a rejeição devolve só o que continua reservado
+        item.quantidade = 3
+        item.save()
+        self.assertEqual(self._saldo(), (20, 8))
+        services.liberar_reserva([self.orcamento.pk])
+        self.assertEqual(self._saldo(), (20, 5))
+
+    def test_item_alterado_sem_estoque_nao_grava(self):
+        services.aprovar_orcamentos([self.orcamento.pk])
+        item = self.orcamento.itens.get()
+        self.client.force_login(self.admin)
+        dados = {
+            'cliente': self.cliente.pk, 'validade': '2030-01-01', 'status': Orcamento.Status.APROVADO,
+            'desconto': '0', 'observacoes': '',
+            'itens-TOTAL_FORMS': 1, 'itens-INITIAL_FORMS': 1, 'itens-MIN_NUM_FORMS': 0, 'itens-MAX_NUM_FORMS': 1000,
+            'itens-0-id': item.pk, 'itens-0-orcamento': self.orcamento.pk, 'itens-0-produto': self.produto.pk,
+            'itens-0-quantidade': 20, 'itens-0-preco_unitario': '10.00',
+        }
+        self.client.post(reverse('admin:servicos_orcamento_change', args=[self.orcamento.pk]), dados)
+
+        item.refresh_from_db()
+        self.assertEqual(item.quantidade, 2)
+        self.assertEqual(self._saldo(), (10, 2))
+
+    def test_remover_orcamento_aprovado_libera_a_reserva(self):
+        services.aprovar_orcamentos([self.orcamento.pk])
+        self.os.delete()
+        self.orcamento.delete()
+
+        self.assertEqual(self._saldo(), (10, 0))
+        self.assertEqual(
+            list(self.produto.movimentos.order_by('id').values_list('tipo', 'quantidade', 'item_orcamento')),
+            [('R', 2, None), ('L', 2, None)],
+        )
+
+
+class IndicadoresPainelTests(DadosBaseMixin, TestCase):
+    """
+    Indicadores do painel mantidos nas tabelas de resumo a cada OS salva, removida ou gravada em lote.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def _indicadores(self):
+        return indicadores.calcular()
+
+    def test_save_parcial_sem_campos_do_resumo_nao_consulta(self):
+        self.os.laudo_tecnico = 'Parcial'
+        with CaptureQueriesContext(connection) as consultas:
+            self.os.save(update_fields=['laudo_tecnico'])
+        # Nem a leitura da contribuição anterior nem a atualização dos resumos
+        self.assertFalse([q['sql'] for q in consultas if 'data_finalizacao' in q['sql'] or 'contagemos' in q['sql']])
+
+        self.os.status = OrdemServico.Status.FINALIZADO
+        self.os.save(update_fields=['status'])
+        self.assertTrue(ContagemOS.objects.filter(status=OrdemServico.Status.FINALIZADO, total=1).exists())
+
+    def test_salvar_finalizar_e_remover(self):
+        self.assertEqual(self._indicadores()['abertas'], 1)
+
+        self.os.status = OrdemServico.Status.FINALIZADO
+        self.os.data_finalizacao = timezone.now()
+        self.os.valor_bruto = Decimal('1250.00')
+        self.os.save()
+        kpis = self._indicadores()
+        self.assertEqual((kpis['abertas'], kpis['caixa_dia'], kpis['finalizadas_dia']), (0, Decimal('1250.00'), 1))
+
+        self.os.delete()
+        kpis = self._indicadores()
+        self.assertEqual((kpis['abertas'], kpis['caixa_dia'], kpis['finalizadas_dia']), (0, Decimal('0.00'), 0))
+
+    def test_finalizada_pelo_admin_entra_no_caixa(self):
+        self.client.force_login(self.admin)
+        self.client.post(reverse('admin:servicos_ordemservico_change', args=[self.os.pk]), {
+            'orcamento_origem': self.orcamento.pk, 'cliente': self.cliente.pk, 'tecnico': self.tecnico.pk,
+            'status': 'FINALIZADO', 'descricao_problema': 'Instalação de câmeras', 'laudo_tecnico': '',
+            'desconto': '0', 'data_finalizacao_0': '', 'data_finalizacao_1': '', 'versao_carregada': self.os.versao,
+        })
+
+        self.os.refresh_from_db()
+        self.assertIsNotNone(self.os.data_finalizacao)
+        kpis = self._indicadores()
+        self.assertEqual((kpis['abertas'], kpis['finalizadas_dia']), (0, 1))
+        self.assertEqual(indicadores.reconciliar(), 0)
+
+    def test_operacoes_em_lote(self):
+        api = APIClient()
+        api.force_authenticate(self.tecnico)
+        envio = {'atualizacoes': [{'id': self.os.pk, 'versao': self.os.versao, 'status': 'ANDAMENTO'}]}
+        api.post('/servicos/api/ordens/lote/', envio, format='json')
+
+        aprovado = Orcamento.objects.create(cliente=self.cliente, validade=date(2030, 1, 1), status=Orcamento.Status.APROVADO)
+        services.gerar_os_de_orcamentos([aprovado.pk], self.tecnico)
+
+        self.assertEqual(self._indicadores()['abertas_por_status'][:2], [('Aguardando Início', 1), ('Em Execução', 1)])
+        self.assertEqual(indicadores.reconciliar(), 0)
+
+    def test_atrasadas_e_reconciliacao(self):
+        # UPDATE direto no banco: os resumos só acertam na reconciliação
+        OrdemServico.objects.filter(pk=self.os.pk).update(data_abertura=timezone.now() - timedelta(days=10))
+        self.assertEqual(self._indicadores()['atrasadas'], 0)
+
+        saida = io.StringIO()
+        call_command('reconciliar_indicadores', stdout=saida)
+        self.assertIn('2 linha(s)', saida.getvalue())
+        kpis = self._indicadores()
+        self.assertEqual((kpis['abertas'], kpis['atrasadas']), (1, 1))
+
+    def test_painel_nao_consulta_a_tabela_de_os(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('dashboard'))
+        self.assertContains(resposta, 'R$ 0,00')
+        self.assertFalse([q['sql'] for q in consultas if 'servicos_ordemservico' in q['sql']])
+
+        # Dentro do TTL: nenhuma consulta aos resumos
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('dashboard'))
+        self.assertFalse([q['sql'] for q in consultas if 'servicos_' in q['sql']])
+
+    def test_formatar_moeda(self):
+        self.assertEqual(indicadores.formatar_moeda(Decimal('1250.5')), 'R$ 1.250,50')
+        self.assertEqual(indicadores.formatar_moeda(Decimal('1234567.891')), 'R$ 1.234.567,89')
+
+
+class IndicesConsultasTests(TestCase):
+
+    def test_benchmark_mostra_planos_e_desfaz_tudo(self):
+        saida = io.StringIO()
+        call_command('benchmark_indices', ordens=200, produtos=100, repeticoes=1,
+                     permitir_fora_do_debug=True, stdout=saida)
+
+        texto = saida.getvalue()
+        self.assertIn('USING INDEX os_status_abertura_idx', texto)
+        self.assertIn('USING INDEX orc_status_validade_idx', texto)
+        self.assertFalse(OrdemServico.objects.exists())
+        # Os índices removidos para a comparação voltaram com o rollback
+        with connection.cursor() as cursor:
+            indices = connection.introspection.get_constraints(cursor, 'servicos_ordemservico')
+        self.assertIn('os_tecnico_status_idx', indices)
+
+    def test_benchmark_recusa_rodar_fora_do_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_indices', ordens=1, produtos=1, repeticoes=1, stdout=io.StringIO())
+        self.assertFalse(OrdemServico.objects.exists())
+
+
+@mock.patch('servicos.pdf.renderizar_pdf', return_value=b'%PDF-fake')
+class RequisicaoCondicionalTests(DadosBaseMixin, PastaTemporariaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.tecnico)
+
+    def test_detalhe_api_sem_alteracao_devolve_304(self, renderizar):
+        url = f'/servicos/api/ordens/{self.os.pk}/'
+        etag = self.api.get(url)['ETag']
+
+        # Só a consulta do marcador: nada é serializado
+        with self.assertNumQueries(1):
+            resposta = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 304)
+
+        self.os.laudo_tecnico = 'Concluído'
+        self.os.save()
+        resposta = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+
+    def test_lista_api(self, renderizar):
+        resposta = self.api.get('/servicos/api/ordens/')
+        self.assertIn('Last-Modified', resposta)
+
+        self.assertEqual(self.api.get('/servicos/api/ordens/', HTTP_IF_NONE_MATCH=resposta['ETag']).status_code, 304)
+        self.assertEqual(
+            self.api.get('/servicos/api/ordens/', {'status': 'PENDENTE'}, HTTP_IF_NONE_MATCH=resposta['ETag']).status_code,
+            200,
+        )
+
+    def test_tecnico_e_categoria_mudam_etag(self, renderizar):
+        url = f'/servicos/api/ordens/{self.os.pk}/'
+        etag, etag_lista = self.api.get(url)['ETag'], self.api.get('/servicos/api/ordens/')['ETag']
+
+        self.tecnico.first_name = 'Carlos'
+        self.tecnico.save()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.api.get('/servicos/api/ordens/', HTTP_IF_NONE_MATCH=etag_lista).status_code, 200)
+
+        etag, etag_lista = self.api.get(url)['ETag'], self.api.get('/servicos/api/ordens/')['ETag']
+        self.categoria.nome = 'Câmeras IP'
+        self.categoria.save()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.api.get('/servicos/api/ordens/', HTTP_IF_NONE_MATCH=etag_lista).status_code, 200)
+
+    def test_versao_avanca_no_banco(self, renderizar):
+        # Duas cópias da mesma OS gravadas em sequência: nenhuma incrementa sobre a versão velha
+        primeira = OrdemServico.objects.get(pk=self.os.pk)
+        segunda = OrdemServico.objects.get(pk=self.os.pk)
+        primeira.save()
+        segunda.save()
+        self.assertEqual((primeira.versao, segunda.versao), (2, 3))
+
+        segunda.laudo_tecnico = 'Parcial'
+        segunda.save(update_fields=['laudo_tecnico'])
+        self.os.refresh_from_db()
+        self.assertEqual((segunda.versao, self.os.versao), (4, 4))
+
+    def test_pdf_nao_renderiza_quando_nao_modificado(self, renderizar):
+        url = reverse('os_pdf', args=[self.os.pk])
+        etag = self.client.get(url)['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(renderizar.call_count, 1)
+
+    def test_alteracao_de_item_muda_etag_do_pdf(self, renderizar):
+        url = reverse('orcamento_pdf', args=[self.orcamento.pk])
+        etag = self.client.get(url)['ETag']
+
+        item = self.orcamento.itens.get()
+        item.quantidade = 5
+        item.save()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified_do_pdf(self, renderizar):
+        url = reverse('garantia_pdf', args=[self.os.pk])
+        last_modified = self.client.get(url)['Last-Modified']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
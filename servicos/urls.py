@@ -4,27 +4,31 @@ from . import views
 # Certifique-se de ter criado o ficheiro api_views.py conforme o passo anterior
 from . import api_views
 
-urlpatterns = [
-    # Listas (Telas do Site)
-    path('os/', views.os_list, name='os_list'),
-    path('orcamentos/', views.orcamento_list, name='orcamento_list'),
-
-    # ... (Mantenha as rotas de PDF e API que já existiam) ...
-    path('orcamento/<int:pk>/pdf/', views.gerar_orcamento_pdf, name='orcamento_pdf'),
-    # ...
-]
-
 # Configura o Roteador Automático da API
 router = DefaultRouter()
 router.register(r'ordens', api_views.OrdemServicoViewSet, basename='api_os')
+router.register(r'clientes', api_views.ClienteViewSet, basename='api_clientes')
 
 urlpatterns = [
+    # --- Listas (Telas do Site) ---
+    path('os/', views.os_list, name='os_list'),
+    path('orcamentos/', views.orcamento_list, name='orcamento_list'),
+
     # --- Rotas de Documentos (PDFs) ---
     path('orcamento/<int:pk>/pdf/', views.gerar_orcamento_pdf, name='orcamento_pdf'),
     path('os/<int:pk>/pdf/', views.gerar_os_pdf, name='os_pdf'),
     path('os/<int:pk>/garantia/', views.gerar_garantia_pdf, name='garantia_pdf'),
 
+    # --- Fila de PDFs (renderização assíncrona: ?assincrono=1 nas rotas acima) ---
+    path('pdf/tarefas/<int:pk>/', views.tarefa_pdf_status, name='tarefa_pdf_status'),
+    path('pdf/tarefas/<int:pk>/download/', views.tarefa_pdf_download, name='tarefa_pdf_download'),
+
+    # --- Exportação para a contabilidade (formato: csv ou ndjson) ---
+    path('exportar/os/<str:formato>/', views.exportar_ordens, name='exportar_os'),
+    path('exportar/orcamentos/<str:formato>/', views.exportar_orcamentos, name='exportar_orcamentos'),
+
     # --- Rota da API (Para o App/Mobile) ---
     # O endereço final será: http://SEU_IP:8000/servicos/api/ordens/
+    path('api/sync/', api_views.SincronizacaoView.as_view(), name='api_sync'),
     path('api/', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,10 +1,10 @@
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from django.shortcuts import get_object_or_404
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from weasyprint import HTML
-from core.models import ConfiguracaoSistema
-from .models import Orcamento, OrdemServico
+from .models import Orcamento, OrdemServico, TarefaPDF, TipoDocumento
+from . import condicional, exportacao, fila, pdf
 
 
 @login_required
@@ -19,28 +19,51 @@ def orcamento_list(request):
     return render(request, 'servicos/orcamento_list.html', {'orcamentos': orcamentos})
 
 
-@staff_member_required
-def gerar_orcamento_pdf(request, pk):
-    orcamento = get_object_or_404(Orcamento, pk=pk)
-    config = ConfiguracaoSistema.objects.first()
+def _resposta_documento(request, tipo, pk):
+    """
+    Renderiza na hora (padrão) ou, com ?assincrono=1, coloca o documento na fila
+    e devolve o ID da tarefa para o cliente acompanhar.
+    """
+    if request.GET.get('assincrono') in ('1', 'true'):
+        model = Orcamento if tipo == TipoDocumento.ORCAMENTO else OrdemServico
+        get_object_or_404(model, pk=pk)
+        tarefa = fila.enfileirar(tipo, pk, usuario=request.user, base_url=request.build_absolute_uri())
+        return JsonResponse(_dados_tarefa(tarefa), status=202)
+
+    # Navegador já tem a versão atual: 304 sem montar contexto nem renderizar
+    marcador = condicional.marcador_pdf(tipo, pk)
+    nao_modificado = condicional.resposta_nao_modificada(request, marcador)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    pdf_file, filename = pdf.gerar_documento(
+        tipo, pk, base_url=request.build_absolute_uri(), request=request
+    )
 
-    if not config:
-        config = {'nome_empresa': 'Configure no Admin', 'endereco_completo': ''}
+    response = HttpResponse(pdf_file, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return condicional.aplicar_cabecalhos(response, marcador)
 
-    context = {
-        'orcamento': orcamento,
-        'itens': orcamento.itens.all(),
-        'config': config,
-        'request': request
+
+def _dados_tarefa(tarefa):
+    dados = {
+        'id': tarefa.id,
+        'tipo': tarefa.tipo,
+        'objeto_id': tarefa.objeto_id,
+        'status': tarefa.status,
+        'status_url': reverse('tarefa_pdf_status', args=[tarefa.id]),
+        'download_url': None,
     }
+    if tarefa.status == TarefaPDF.Status.CONCLUIDO:
+        dados['download_url'] = reverse('tarefa_pdf_download', args=[tarefa.id])
+    elif tarefa.status == TarefaPDF.Status.ERRO:
+        dados['erro'] = 'Falha ao gerar o documento.'
+    return dados
 
-    html_string = render_to_string('servicos/orcamento_pdf.html', context)
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    filename = f"orcamento_{orcamento.id}.pdf"
-    response['Content-Disposition'] = f'inline; filename="{filename}"'
-    return response
+@staff_member_required
+def gerar_orcamento_pdf(request, pk):
+    return _resposta_documento(request, TipoDocumento.ORCAMENTO, pk)
 
 
 @staff_member_required
@@ -49,31 +72,7 @@ def gerar_os_pdf(request, pk):
     Gera o PDF da Ordem de Serviço.
     Se a OS veio de um Orçamento, busca os itens dele para exibir.
     """
-    os_obj = get_object_or_404(OrdemServico, pk=pk)
-    config = ConfiguracaoSistema.objects.first()
-
-    if not config:
-        config = {'nome_empresa': 'Configure no Admin', 'endereco_completo': ''}
-
-    # Busca itens se houver orçamento de origem
-    itens = []
-    if os_obj.orcamento_origem:
-        itens = os_obj.orcamento_origem.itens.all()
-
-    context = {
-        'os': os_obj,
-        'itens': itens,
-        'config': config,
-        'request': request
-    }
-
-    html_string = render_to_string('servicos/os_pdf.html', context)
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
-
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    filename = f"os_{os_obj.id}.pdf"
-    response['Content-Disposition'] = f'inline; filename="{filename}"'
-    return response
+    return _resposta_documento(request, TipoDocumento.OS, pk)
 
 
 @staff_member_required
@@ -82,30 +81,36 @@ def gerar_garantia_pdf(request, pk):
     Gera o Termo de Garantia com base na OS finalizada.
     Lista os produtos e seus respectivos prazos de garantia cadastrados no Estoque.
     """
-    os_obj = get_object_or_404(OrdemServico, pk=pk)
-    config = ConfiguracaoSistema.objects.first()
-
-    if not config:
-        config = {'nome_empresa': 'Configure no Admin', 'endereco_completo': ''}
-
-    # Busca itens do orçamento de origem
-    itens = []
-    if os_obj.orcamento_origem:
-        itens = os_obj.orcamento_origem.itens.all()
-
-    context = {
-        'os': os_obj,
-        'itens': itens,
-        'config': config,
-        'request': request
-    }
+    return _resposta_documento(request, TipoDocumento.GARANTIA, pk)
 
-    html_string = render_to_string('servicos/garantia_pdf.html', context)
-    pdf_file = HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
 
-    response = HttpResponse(pdf_file, content_type='application/pdf')
-    filename = f"garantia_os_{os_obj.id}.pdf"
-    response['Content-Disposition'] = f'inline; filename="{filename}"'
+@staff_member_required
+def tarefa_pdf_status(request, pk):
+    """
+    Consulta o andamento de uma renderização assíncrona.
+    """
+    tarefa = get_object_or_404(TarefaPDF, pk=pk)
+    return JsonResponse(_dados_tarefa(tarefa))
 
-    return response
 
+@staff_member_required
+def tarefa_pdf_download(request, pk):
+    tarefa = get_object_or_404(TarefaPDF, pk=pk)
+    if tarefa.status != TarefaPDF.Status.CONCLUIDO or not tarefa.arquivo:
+        raise Http404("Documento ainda não está pronto.")
+
+    # O nome no storage pode ter sufixo (arquivo repetido); o download usa o do documento
+    filename = pdf.nome_arquivo(tarefa.tipo, tarefa.objeto_id)
+    return FileResponse(tarefa.arquivo.open('rb'), content_type='application/pdf', filename=filename)
+
+
+@staff_member_required
+def exportar_ordens(request, formato):
+    """Todas as OS em CSV ou NDJSON (streaming)."""
+    return exportacao.exportar_ordens(None, formato)
+
+
+@staff_member_required
+def exportar_orcamentos(request, formato):
+    """Todos os orçamentos, com itens, em CSV ou NDJSON (streaming)."""
+    return exportacao.exportar_orcamentos(None, formato)